@@ -0,0 +1,302 @@
+"""
+Versioned JSON API (/api/v1) for automation.
+
+  GET /api/v1/snapshots                          snapshot files, newest first
+  GET /api/v1/snapshots/<name>                   snapshot content (fields= picks top-level keys)
+  GET /api/v1/snapshots/<name>/<section>         one section's records, paged (resource= picks one)
+  GET /api/v1/diffs?snapshot=<name>[&base=...]   structured changes between two snapshots
+  GET /api/v1/comparisons                        stored compare results (monitor + manual)
+  GET /api/v1/comparisons/<id>/correlations      CloudTrail events correlated with a comparison
+  GET /api/v1/drift-items                        stored drift items (section/resource/since/until filters)
+  GET /api/v1/resources/<id>/history            one resource's change timeline with CloudTrail events
+  GET /api/v1/jobs                               recent background jobs (snapshot / compare)
+  GET /api/v1/jobs/<id>                          one job's status, progress and result
+  GET /api/v1/stream                             Server-Sent Events: drift, snapshot, monitor (see stream.py)
+
+List endpoints take limit= and cursor= (pass back "next_cursor" from the previous
+page) and fields=a,b to return only those keys of each item. Snapshot, diff and
+store responses carry a strong ETag: snapshot-backed ones derive it from the files' sha256
+content hashes, store-backed ones from the store version, so a client polling
+with If-None-Match gets 304 without the body being built.
+"""
+import base64
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import Blueprint, Response, abort, jsonify, request
+
+from diff_cache import DiffCache, cached_diff, file_hash
+from drift_store import DriftStore
+from jobs import QUEUE as JOBS
+from resource_history import RECORDS, HistoryIndex
+from snapshot_index import open_snapshot
+from stream import Broadcaster, Producer
+
+APP_DIR = Path(__file__).parent.resolve()
+BASELINE_NAME = "Baseline.json"
+SNAP_GLOB = "baseline_*.json"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+api = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+BROADCASTER = Broadcaster()
+PRODUCER = Producer(BROADCASTER, APP_DIR)
+
+def snapshot_path(name: str) -> Path:
+    """Resolve a snapshot name inside APP_DIR (no paths, .json only) or 404."""
+    if not name or Path(name).name != name or not name.endswith(".json"):
+        abort(404)
+    p = APP_DIR / name
+    if not p.is_file():
+        abort(404)
+    return p
+
+
+# --- request helpers ---
+def _limit() -> int:
+    try:
+        return max(1, min(MAX_LIMIT, int(request.args.get("limit", DEFAULT_LIMIT))))
+    except ValueError:
+        abort(400, "limit must be an integer")
+
+
+def _fields() -> Optional[List[str]]:
+    raw = request.args.get("fields")
+    return [f.strip() for f in raw.split(",") if f.strip()] if raw else None
+
+
+def _select(items: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if not fields:
+        return items
+    return [{k: it[k] for k in fields if k in it} for it in items]
+
+
+def encode_cursor(value: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def decode_cursor(kind: type) -> Any:
+    """The ?cursor= value, which must decode to a kind (str: a file name, int: a non-negative id / offset)."""
+    raw = request.args.get("cursor")
+    if not raw:
+        return None
+    try:
+        value = json.loads(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)))
+    except ValueError:
+        abort(400, "invalid cursor")
+    if not isinstance(value, kind) or isinstance(value, bool) or (kind is int and value < 0):
+        abort(400, "invalid cursor")
+    return value
+
+
+def _etag(*parts: str) -> str:
+    # Same data but a different page / field selection is a different representation
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return hashlib.sha256("|".join(parts + (request.path, query)).encode()).hexdigest()
+
+
+def conditional(etag: str, build: Callable[[], Any]) -> Response:
+    """304 if the client already has this ETag, else the JSON body built by build()."""
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+    else:
+        resp = jsonify(build())
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
+def page(items: List[Dict[str, Any]], limit: int, cursor_of: Callable[[Dict[str, Any]], Any]) -> Dict[str, Any]:
+    """items holds up to limit + 1 rows; the extra one only signals that there is a next page."""
+    more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": _select(items, _fields()),
+        "next_cursor": encode_cursor(cursor_of(items[-1])) if more and items else None,
+    }
+
+
+# --- snapshots ---
+def _snapshot_files() -> List[Path]:
+    return sorted(APP_DIR.glob(SNAP_GLOB), key=lambda p: p.name, reverse=True)
+
+
+@api.get("/snapshots")
+def snapshots():
+    files = _snapshot_files()
+    limit, after = _limit(), decode_cursor(str)
+    if after:
+        files = [p for p in files if p.name < after]
+    files = files[:limit + 1]
+    hashes = [(p, file_hash(p)) for p in files]
+
+    def build():
+        rows = [{"name": p.name, "size": p.stat().st_size, "sha256": h, "mtime": int(p.stat().st_mtime)}
+                for p, h in hashes]
+        return page(rows, limit, lambda r: r["name"])
+
+    return conditional(_etag(*(h for _, h in hashes)), build)
+
+
+@api.get("/snapshots/<name>")
+def snapshot(name):
+    p = snapshot_path(name)
+
+    def build():
+        # Sections are parsed from their byte spans (snapshot_index), so fields= only pays for what it picks
+        snap = open_snapshot(p)
+        fields = _fields()
+        return {k: snap[k] for k in snap if not fields or k in fields}
+
+    return conditional(_etag(file_hash(p)), build)
+
+
+@api.get("/snapshots/<name>/<section>")
+def snapshot_section(name, section):
+    if section not in RECORDS:
+        abort(404)
+    p = snapshot_path(name)
+    key, id_field = RECORDS[section]
+    limit, offset = _limit(), decode_cursor(int) or 0
+    resource = request.args.get("resource")
+
+    def build():
+        snap = open_snapshot(p)
+        if resource:
+            rec = snap.record(section, resource)
+            if rec is None:
+                abort(404)
+            recs, total = [rec], 1
+        else:
+            # Only this page's records are read and parsed
+            recs, total = snap.records(section, offset, offset + limit + 1), snap.count(section)
+        body = page(recs, limit, lambda r: offset + limit)
+        body.update(snapshot=name, section=section, total=total)
+        return body
+
+    return conditional(_etag(file_hash(p)), build)
+
+
+# --- diffs ---
+@api.get("/diffs")
+def diffs():
+    base = snapshot_path(request.args.get("base") or BASELINE_NAME)
+    snap = snapshot_path(request.args.get("snapshot") or "")
+    limit, offset = _limit(), decode_cursor(int) or 0
+
+    def build():
+        cache = DiffCache()
+        try:
+            diff = cached_diff(cache, base, snap)[2]["diff"]
+        finally:
+            cache.close()
+        changes = [dict(c, index=i) for i, c in enumerate(diff["changes"])][offset:offset + limit + 1]
+        body = page(changes, limit, lambda c: c["index"] + 1)
+        body.update(base=base.name, snapshot=snap.name, account_mismatch=diff["account_mismatch"],
+                    total=len(diff["changes"]))
+        return body
+
+    return conditional(_etag(file_hash(base), file_hash(snap)), build)
+
+
+# --- store-backed ---
+def _store_view(build_with: Callable[[DriftStore], Any]) -> Response:
+    store = DriftStore()
+    try:
+        return conditional(_etag(store.version()), lambda: build_with(store))
+    finally:
+        store.close()
+
+
+@api.get("/comparisons")
+def comparisons():
+    limit, before = _limit(), decode_cursor(int)
+    args = request.args
+    return _store_view(lambda store: page(
+        store.comparisons(start=args.get("since"), end=args.get("until"), account=args.get("account"),
+                          limit=limit + 1, before=before),
+        limit, lambda r: r["id"],
+    ))
+
+
+@api.get("/comparisons/<int:cid>/correlations")
+def correlations(cid):
+    def build(store):
+        rows = store.comparisons(limit=1, before=cid + 1)
+        if not rows or rows[0]["id"] != cid:
+            abort(404)
+        return {"comparison_id": cid, "items": _select(store.enrichment(cid), _fields())}
+    return _store_view(build)
+
+
+@api.get("/drift-items")
+def drift_items():
+    limit, before = _limit(), decode_cursor(int)
+    args = request.args
+
+    def build(store):
+        rows = store.items(
+            comparison_id=args.get("comparison", type=int),
+            section=args.get("section"),
+            resource=args.get("resource"),
+            start=args.get("since"),
+            end=args.get("until"),
+            limit=limit + 1,
+            before=before,
+        )
+        for r in rows:
+            r["old"], r["new"] = json.loads(r["old"] or "null"), json.loads(r["new"] or "null")
+        return page(rows, limit, lambda r: r["id"])
+
+    return _store_view(build)
+
+
+@api.get("/resources/<path:resource>/history")
+def resource_history(resource):
+    index = HistoryIndex()
+    try:
+        rows = index.timeline(resource, request.args.get("account"))
+    finally:
+        index.close()
+    if not rows:
+        abort(404)
+    return jsonify(resource=resource, items=_select(rows, _fields()))
+
+
+@api.get("/jobs")
+def jobs():
+    return jsonify(items=_select([j.to_dict() for j in JOBS.recent(_limit())], _fields()))
+
+
+@api.get("/jobs/<job_id>")
+def job_status(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job.to_dict())
+
+
+@api.get("/stream")
+def stream():
+    PRODUCER.ensure_started()
+    raw = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(raw) if raw else None
+    except ValueError:
+        last_id = None
+    # The monitor status only changes on up / down: send the current one so a new client needn't wait for it
+    monitor = PRODUCER.monitor
+    return Response(
+        BROADCASTER.subscribe(last_id, initial=("monitor", monitor) if monitor is not None else None),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api.errorhandler(400)
+@api.errorhandler(404)
+def _json_error(e):
+    return jsonify(error=e.name, detail=e.description), e.code
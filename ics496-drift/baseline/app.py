@@ -1,14 +1,27 @@
 #!/usr/bin/env python3
-import os, sys, json, glob, subprocess, threading, signal, re
+import os, sys, copy, json, glob, socket, subprocess, threading, signal, time, codecs, html, mimetypes, zlib
 from pathlib import Path
-from datetime import datetime, timedelta, timezone
-from flask import Flask, render_template_string, request, redirect, url_for, send_from_directory, flash
+from datetime import datetime, timezone
+from flask import Flask, Response, jsonify, render_template_string, request, redirect, url_for, send_from_directory, flash, g
 
-# Try to import cloudtrail_fetch
+import boto3
+
+from compare_baseline import render_report, SECTION_TITLES
+from diff_cache import DiffCache, cached_diff
+from drift_store import DriftStore
+from enumerate_baseline import build_snapshot, write_snapshot
+from jobs import QUEUE as JOBS, QueueFull
+from leases import holder as lease_holder
+from resource_history import index_snapshot
+from columnar_export import export_snapshot
+import metrics
+from api import api
+
+# Try to import the CloudTrail correlation engine
 try:
-    from cloudtrail_fetch import find_events_for_keywords
+    from correlate import correlate, capture_window, format_event
 except ImportError:
-    find_events_for_keywords = None
+    correlate = None
 
 UTC = timezone.utc
 
@@ -22,6 +35,25 @@ MONITOR_POPEN = {"proc": None}                     # track running monitor
 
 app = Flask(__name__)
 app.secret_key = "dev-demo-only"                   # for flash(); replace for real use
+app.register_blueprint(api)                        # JSON API under /api/v1 (see api.py)
+
+# Count CloudTrail lookups made from the compare endpoints
+try:
+    metrics.instrument_default_session()
+except Exception:
+    pass
+
+@app.before_request
+def _start_timer():
+    g.t0 = time.perf_counter()
+
+@app.after_request
+def _observe_request(resp):
+    t0 = g.pop("t0", None)
+    if t0 is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=request.endpoint or "?",
+                                             method=request.method, status=resp.status_code)
+    return resp
 
 # --- HTML (simple, no external deps) ---
 PAGE = """
@@ -115,6 +147,51 @@ PAGE = """
     
     // Initialize on page load
     document.addEventListener('DOMContentLoaded', initDarkMode);
+
+    // Live events (SSE); the browser resends Last-Event-ID when it reconnects
+    function addLive(text, cls) {
+      const list = document.getElementById('live-events');
+      if (!list) return;
+      const empty = document.getElementById('live-empty');
+      if (empty) empty.remove();
+      const div = document.createElement('div');
+      div.className = 'change-item ' + (cls || '');
+      div.style.fontSize = '13px';
+      div.textContent = new Date().toLocaleTimeString() + '  ' + text;
+      list.prepend(div);
+      while (list.children.length > 50) list.lastChild.remove();
+    }
+    // Reload once the queued jobs shown on the page have finished
+    document.addEventListener('DOMContentLoaded', function () {
+      const active = Array.from(document.querySelectorAll('.job-row[data-active="1"]')).map(r => r.dataset.job);
+      if (!active.length) return;
+      const timer = setInterval(function () {
+        Promise.all(active.map(id => fetch('{{ url_for("api_v1.jobs") }}/' + id).then(r => r.json())))
+          .then(function (js) {
+            if (js.every(j => j.status === 'done' || j.status === 'failed')) { clearInterval(timer); location.reload(); }
+          });
+      }, 2000);
+    });
+    document.addEventListener('DOMContentLoaded', function () {
+      if (!window.EventSource) return;
+      const es = new EventSource('{{ url_for("api_v1.stream") }}');
+      es.addEventListener('drift', function (e) {
+        const d = JSON.parse(e.data);
+        const status = (d.kind === 'added' || d.kind === 'removed') ? d.kind : 'modified';
+        addLive('[' + d.account + '] ' + (d.transition ? d.transition + ': ' : '') + d.text, status);
+      });
+      es.addEventListener('snapshot', function (e) {
+        addLive('Snapshot captured: ' + JSON.parse(e.data).name);
+      });
+      es.addEventListener('monitor', function (e) {
+        const d = JSON.parse(e.data);
+        const el = document.getElementById('live-monitor');
+        if (el) el.textContent = d.running ? ('running' + (d.workers ? ' (' + d.workers + ' workers)' : '')) : 'stopped';
+      });
+      es.addEventListener('reset', function () {
+        addLive('Missed some events; reload for the full picture.');
+      });
+    });
   </script>
 </head>
 <body>
@@ -161,6 +238,20 @@ PAGE = """
     <form method="post" action="{{ url_for('take_snapshot') }}"><button class="btn btn-primary">Take Snapshot</button></form>
     <form method="post" action="{{ url_for('compare_latest') }}"><button class="btn">Compare Latest vs Baseline</button></form>
     <p class="muted">Keeps last 10 snapshots (monitor handles rotation)</p>
+    {% if jobs %}
+    <table>
+      <thead><tr><th>Job</th><th>Status</th><th>Progress</th></tr></thead>
+      <tbody>
+      {% for j in jobs %}
+        <tr class="job-row" data-job="{{ j.id }}" data-active="{{ 1 if j.active else 0 }}">
+          <td>{{ j.description }}</td>
+          <td class="{{ 'bad' if j.status == 'failed' else ('good' if j.status == 'done' else 'muted') }}">{{ j.status }}</td>
+          <td class="muted">{{ (j.progress * 100)|round|int }}% {{ j.error or j.message }}</td>
+        </tr>
+      {% endfor %}
+      </tbody>
+    </table>
+    {% endif %}
     <table>
       <thead><tr><th>File</th><th>Time</th><th>Actions</th></tr></thead>
       <tbody>
@@ -263,6 +354,15 @@ PAGE = """
     <p class="muted">Full monitoring and comparison log</p>
     <pre style="max-height:300px; overflow:auto;">{{ drift or "No drift output yet." }}</pre>
     <a class="btn" href="{{ url_for('view_text', name='realtime_monitor.log') }}">Open full log</a>
+    <a class="btn" href="{{ url_for('drift_history') }}">Drift history</a>
+  </div>
+
+  <div class="card">
+    <h3>Live</h3>
+    <p class="muted">Monitor: <span id="live-monitor">…</span></p>
+    <div id="live-events" style="max-height:300px; overflow:auto;">
+      <p id="live-empty" class="muted">Waiting for new drift and snapshots…</p>
+    </div>
   </div>
 
 <footer class="muted" style="margin-top:24px">
@@ -272,6 +372,48 @@ PAGE = """
 </html>
 """
 
+DRIFT_PAGE = """
+<!doctype html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>Drift history</title>
+  <style>
+    body{font-family:system-ui,Arial,sans-serif; max-width:1200px; margin:40px auto; line-height:1.4}
+    table{width:100%; border-collapse:collapse} th, td{border-bottom:1px solid #eee; padding:6px; text-align:left; font-size:13px}
+    .added{color:#0a7a2f} .removed{color:#b00020} .modified{color:#b45309} .muted{color:#666}
+    input, select{padding:4px}
+  </style>
+</head>
+<body>
+<h2>Drift history</h2>
+<form method="get">
+  <select name="section">
+    <option value="">All sections</option>
+    {% for k, title in sections.items() %}<option value="{{ k }}" {% if k == args.section %}selected{% endif %}>{{ title }}</option>{% endfor %}
+  </select>
+  <input name="resource" placeholder="resource id / name" value="{{ args.resource or '' }}">
+  <input name="since" placeholder="since (YYYY-MM-DDTHH:MM:SSZ)" value="{{ args.since or '' }}">
+  <input name="until" placeholder="until" value="{{ args.until or '' }}">
+  <button>Filter</button> <a href="{{ url_for('index') }}">Back</a>
+</form>
+<table>
+  <thead><tr><th>Recorded</th><th>Snapshot</th><th>Section</th><th>Change</th><th>Transition</th></tr></thead>
+  <tbody>
+  {% for it in items %}
+    <tr>
+      <td class="muted">{{ it.created_at }}</td><td>{{ it.snapshot }}</td><td>{{ it.section }}</td>
+      <td class="{{ it.kind }}">{{ it.text }}</td><td class="muted">{{ it.transition or '' }}</td>
+    </tr>
+  {% else %}
+    <tr><td colspan="5" class="muted">No drift recorded.</td></tr>
+  {% endfor %}
+  </tbody>
+</table>
+</body>
+</html>
+"""
+
 def list_snapshots():
     files = []
     for p in sorted(APP_DIR.glob(SNAP_GLOB), key=lambda x: x.stat().st_mtime, reverse=True):
@@ -280,196 +422,273 @@ def list_snapshots():
     return files
 
 def get_latest_comparison():
-    """Extract the most recent comparison block from the log with structured data."""
-    if not LOGFILE.exists():
-        return None
+    """Most recent comparison from the drift store; falls back to parsing the log (pre-store history)."""
     try:
-        with open(LOGFILE, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # Find the last "[manual compare]" block
-        if "[manual compare]" not in content:
-            return None
-        
-        # Split by "[manual compare]" and take the last block
-        blocks = content.split("[manual compare]")
-        latest_block = blocks[-1].strip()
-        
-        if not latest_block:
+        store = DriftStore()
+        try:
+            latest = store.latest()
+        finally:
+            store.close()
+        if latest:
+            return latest
+    except Exception as e:
+        print(f"Error reading drift store: {e}")
+    return parse_latest_comparison_from_log()
+
+SECTION_KEYWORDS = ['IAM', 'S3', 'EC2', 'WARNING', 'changes']
+MARKER = b"[manual compare]"
+TAIL_CHUNK = 64 * 1024                             # bytes read per step when scanning the log backwards
+STREAM_CHUNK = 64 * 1024                           # bytes per chunk when streaming /view and /files
+
+class _BlockParser:
+    """
+    Parser for one "[manual compare]" log block, fed a line at a time so
+    parsing can resume from where it stopped when the log grows.
+    """
+
+    def __init__(self):
+        self.first_line = None
+        self.snapshot_name = ""
+        self.changes = []
+        self.current_section = None
+        self.current_items = []
+        self.warning_text = None
+        self.in_cloudtrail_section = False
+        self.cloudtrail_events = []
+
+    def feed(self, line):
+        if self.first_line is None:
+            # Leading blank lines after the marker don't count
+            if not line.strip():
+                return
+            # Extract snapshot filename from the first line
+            self.first_line = line.strip()
+            if "vs" in self.first_line:
+                parts = self.first_line.split("vs")
+                if len(parts) > 1:
+                    self.snapshot_name = parts[1].strip()
+        self._change_line(line.strip())
+        self._event_line(line)
+
+    def _change_line(self, stripped):
+        # Detect section headers (contains many =)
+        if '==========' in stripped:
+            return
+
+        # Check for warning content
+        if 'WARNING' in stripped or 'Snapshots are from different' in stripped:
+            if not self.warning_text and 'Snapshots are from different' in stripped:
+                self.warning_text = stripped.replace('- ', '')
+            return
+
+        # Check if this is a section name
+        if stripped and not stripped.startswith('-'):
+            is_section = any(kw in stripped for kw in SECTION_KEYWORDS)
+            if is_section and stripped not in ('Done.', 'Baseline.json'):
+                if self.current_section and self.current_items:
+                    self.changes.append({"type": self.current_section, "items": self.current_items})
+                # Skip WARNING section in changes
+                if 'WARNING' not in stripped:
+                    self.current_section = stripped
+                    self.current_items = []
+                return
+
+        # Parse change items (lines starting with "- ")
+        # BUT skip CloudTrail event lines (which have timestamps and " by " and " from ")
+        if stripped.startswith('- '):
+            item_text = stripped[2:].strip()
+            if ' by ' in item_text and ' from ' in item_text and 'T' in item_text[:20]:
+                return
+            if "added" in item_text.lower():
+                status = "added"
+            elif "removed" in item_text.lower():
+                status = "removed"
+            else:
+                status = "modified"
+            if self.current_section:  # Only add if we're in a valid section
+                self.current_items.append({"text": item_text, "status": status})
+
+    def _event_line(self, line):
+        # CloudTrail events follow "Found X CloudTrail event(s)" as
+        # "  - 2025-11-19T00:24:50Z DescribeSecurityGroups by Test from 141.239.161.203"
+        if "Found" in line and "CloudTrail event" in line:
+            self.in_cloudtrail_section = True
+            return
+        stripped = line.strip()
+        if not (self.in_cloudtrail_section and stripped.startswith('- ') and ' by ' in stripped and ' from ' in stripped):
+            return
+        parts = stripped[2:].strip().split(' by ')
+        if len(parts) != 2:
+            return
+        user_and_ip = parts[1].split(' from ')
+        event_parts = parts[0].strip().rsplit(' ', 1)
+        if len(user_and_ip) == 2 and len(event_parts) == 2:
+            self.cloudtrail_events.append({
+                "time": event_parts[0].strip(),
+                "name": event_parts[1].strip(),
+                "user": user_and_ip[0].strip(),
+                "ip": user_and_ip[1].strip(),
+            })
+
+    def result(self):
+        if self.first_line is None:
             return None
-        
-        # Extract snapshot filename from the first line
-        first_line = latest_block.split('\n')[0]
-        snapshot_name = ""
+        changes = list(self.changes)
+        if self.current_section and self.current_items:
+            changes.append({"type": self.current_section, "items": self.current_items})
+
         snapshot_date = "Unknown"
-        
-        if "vs" in first_line:
-            parts = first_line.split("vs")
-            if len(parts) > 1:
-                snapshot_name = parts[1].strip()
-                snap_path = APP_DIR / snapshot_name
-                if snap_path.exists():
-                    ts = datetime.fromtimestamp(snap_path.stat().st_mtime)
-                    snapshot_date = ts.strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Parse changes from the comparison output
-        changes = []
-        lines = latest_block.split('\n')
-        current_section = None
-        current_items = []
-        section_keywords = ['IAM', 'S3', 'EC2', 'WARNING', 'changes']
-        warning_text = None
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Detect section headers (contains many =)
-            if '==========' in stripped:
-                continue
-            
-            # Check for warning content
-            if 'WARNING' in stripped or 'Snapshots are from different' in stripped:
-                if not warning_text and 'Snapshots are from different' in stripped:
-                    warning_text = stripped.replace('- ', '')
-                continue
-            
-            # Check if this is a section name
-            if stripped and not stripped.startswith('-'):
-                is_section = any(kw in stripped for kw in section_keywords)
-                if is_section and stripped not in ('Done.', 'Baseline.json'):
-                    if current_section and current_items:
-                        changes.append({"type": current_section, "items": current_items})
-                    # Skip WARNING section in changes
-                    if 'WARNING' not in stripped:
-                        current_section = stripped
-                        current_items = []
-                    continue
-            
-            # Parse change items (lines starting with "- ")
-            # BUT skip CloudTrail event lines (which have timestamps and " by " and " from ")
-            if stripped.startswith('- '):
-                item_text = stripped[2:].strip()
-                # Skip if this looks like a CloudTrail event
-                if ' by ' in item_text and ' from ' in item_text and 'T' in item_text[:20]:
-                    # This is a CloudTrail event, skip it
-                    continue
-                # Otherwise, it's a change item
-                # Determine status
-                if "added" in item_text.lower():
-                    status = "added"
-                elif "removed" in item_text.lower():
-                    status = "removed"
-                else:
-                    status = "modified"
-                if current_section:  # Only add if we're in a valid section
-                    current_items.append({"text": item_text, "status": status})
-        
-        if current_section and current_items:
-            changes.append({"type": current_section, "items": current_items})
-        
-        # Extract CloudTrail events from the latest block
-        cloudtrail_events = []
-        try:
-            # Look through all lines in the latest block for CloudTrail events
-            # They appear after "Found X CloudTrail event(s)" with format: "  - 2025-11-19T00:24:50Z DescribeSecurityGroups by Test from 141.239.161.203"
-            in_cloudtrail_section = False
-            for line in lines:
-                # Check if we're entering the CloudTrail section
-                if "Found" in line and "CloudTrail event" in line:
-                    in_cloudtrail_section = True
-                    continue
-                
-                # Once in CloudTrail section, parse event lines
-                if in_cloudtrail_section:
-                    stripped = line.strip()
-                    # CloudTrail events start with "- " and have the pattern: "- TIME EVENTNAME by USER from IP"
-                    if stripped.startswith('- ') and ' by ' in stripped and ' from ' in stripped:
-                        try:
-                            event_line = stripped[2:].strip()  # Remove "- "
-                            
-                            # Format: "2025-11-19T00:24:50Z DescribeSecurityGroups by Test from 141.239.161.203"
-                            # Split by " by " first
-                            parts = event_line.split(' by ')
-                            if len(parts) == 2:
-                                time_and_event = parts[0].strip()
-                                rest = parts[1]
-                                
-                                # Split rest by " from "
-                                user_and_ip = rest.split(' from ')
-                                if len(user_and_ip) == 2:
-                                    user = user_and_ip[0].strip()
-                                    ip = user_and_ip[1].strip()
-                                    
-                                    # Split time_and_event to get timestamp and event name
-                                    # "2025-11-19T00:24:50Z DescribeSecurityGroups"
-                                    event_parts = time_and_event.rsplit(' ', 1)
-                                    if len(event_parts) == 2:
-                                        event_time = event_parts[0].strip()
-                                        event_name = event_parts[1].strip()
-                                        
-                                        cloudtrail_events.append({
-                                            "time": event_time,
-                                            "name": event_name,
-                                            "user": user,
-                                            "ip": ip
-                                        })
-                        except Exception as e:
-                            pass
-                    elif not stripped or not stripped.startswith('-'):
-                        # End of CloudTrail section when we hit a blank line or non-event line
-                        if stripped and not stripped.startswith('-'):
-                            pass  # Continue looking
-        except Exception as e:
-            print(f"Error extracting CloudTrail events: {e}")
-        
+        if self.snapshot_name:
+            snap_path = APP_DIR / self.snapshot_name
+            if snap_path.exists():
+                snapshot_date = datetime.fromtimestamp(snap_path.stat().st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+
         # Ensure all three main sections are present (even if empty)
         section_names = {item['type']: item for item in changes}
-        final_changes = []
-        for section_name in ['IAM users', 'S3 changes', 'EC2 Security Group changes']:
-            if section_name in section_names:
-                final_changes.append(section_names[section_name])
-            else:
-                final_changes.append({"type": section_name, "items": []})
-        
-        # Return as dict-like object
+        final_changes = [
+            section_names.get(name, {"type": name, "items": []})
+            for name in ['IAM changes', 'S3 changes', 'EC2 Security Group changes']
+        ]
         return {
-            "snapshot_name": snapshot_name,
+            "snapshot_name": self.snapshot_name,
             "snapshot_date": snapshot_date,
             "changes": final_changes,
-            "cloudtrail_events": cloudtrail_events,
-            "warning": warning_text
+            "cloudtrail_events": list(self.cloudtrail_events),
+            "warning": self.warning_text,
         }
+
+class LogCache:
+    """
+    Latest "[manual compare]" block of the log, cached on the file's
+    (inode, size, mtime). When the file has only grown, parsing resumes at the
+    last byte offset; otherwise (new file, truncation) the last marker is
+    found by scanning backwards from EOF, so cost tracks the last block, not
+    the log size.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._reset(None, None)
+
+    def _reset(self, path, ino):
+        self.path = path
+        self.ino = ino
+        self.key = None
+        self.offset = 0                     # bytes consumed (always at a line boundary)
+        self.parser = None
+        self.value = None
+
+    def latest(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self.lock:
+            if path == self.path and key == self.key:
+                return self.value
+            with open(path, "rb") as f:
+                if path != self.path or st.st_ino != self.ino or st.st_size < self.offset:
+                    self._reset(path, st.st_ino)
+                    self.offset = _last_marker_offset(f, st.st_size)
+                f.seek(self.offset)
+                data = f.read(st.st_size - self.offset)
+            lines = data.split(b"\n")
+            partial = lines.pop()
+            for line in lines:
+                self._feed(line)
+            self.offset += len(data) - len(partial)
+            self.key = key
+            self.value = self._result(partial)
+            return self.value
+
+    def _feed(self, line, parser=None):
+        if MARKER in line:
+            parser = self.parser = _BlockParser()
+            line = line.rsplit(MARKER, 1)[1]
+        parser = parser or self.parser
+        if parser:
+            parser.feed(line.decode("utf-8", "replace"))
+
+    def _result(self, partial):
+        # A trailing line without its newline yet is parsed into a copy, not consumed
+        if not partial:
+            return self.parser.result() if self.parser else None
+        if MARKER in partial:
+            parser = _BlockParser()
+            parser.feed(partial.rsplit(MARKER, 1)[1].decode("utf-8", "replace"))
+            return parser.result()
+        if not self.parser:
+            return None
+        parser = copy.deepcopy(self.parser)
+        parser.feed(partial.decode("utf-8", "replace"))
+        return parser.result()
+
+def _last_marker_offset(f, size):
+    """Offset of the last MARKER (searching backwards from EOF), else of the last line start."""
+    pos, carry = size, b""
+    last_line = None
+    while pos > 0:
+        step = min(TAIL_CHUNK, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + carry
+        i = buf.rfind(MARKER)
+        if i != -1:
+            return pos + i
+        if last_line is None and b"\n" in buf:
+            last_line = pos + buf.rfind(b"\n") + 1
+        carry = buf[:len(MARKER) - 1]
+    return last_line or 0
+
+def tail_text(path, n=200):
+    """Last n lines of a text file, read by seeking backwards from EOF."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos, buf = f.tell(), b""
+        while pos > 0 and buf.count(b"\n") <= n:
+            step = min(TAIL_CHUNK, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+    lines = buf.splitlines(keepends=True)
+    if pos > 0:
+        lines = lines[1:]                   # first line may be cut off
+    return b"".join(lines[-n:]).decode("utf-8", "replace").replace("\r\n", "\n")
+
+LOG_CACHE = LogCache()
+
+def parse_latest_comparison_from_log():
+    """Extract the most recent comparison block from the log with structured data (cached)."""
+    try:
+        return LOG_CACHE.latest(LOGFILE)
     except Exception as e:
         print(f"Error in get_latest_comparison: {e}")
         import traceback
         traceback.print_exc()
     return None
 
-def run_script(args, timeout=300):
-    """Run a python script and return (rc, stdout, stderr)."""
-    try:
-        proc = subprocess.run([PY] + args, cwd=APP_DIR, capture_output=True, text=True, timeout=timeout)
-        return proc.returncode, proc.stdout, proc.stderr
-    except subprocess.TimeoutExpired:
-        return 1, "", "Script execution timed out after 5 minutes"
-    except Exception as e:
-        return 1, "", str(e)
-
-def parse_wrote(stdout: str):
-    # enumerate prints: "Wrote <filename>"
-    words = stdout.strip().split()
-    if len(words) >= 2 and words[0] == "Wrote":
-        return words[1]
-    return None
-
 def monitor_start():
+    """Spawn the monitor unless one is already running (in this or any other app worker). Returns False if so."""
     if MONITOR_POPEN["proc"] and MONITOR_POPEN["proc"].poll() is None:
-        return
+        return False
+    if lease_holder():
+        # Another app worker (or a manual run) holds the single-monitor lease
+        return False
     MONITOR_POPEN["proc"] = subprocess.Popen([PY, "realtime_monitor.py"], cwd=APP_DIR)
+    return True
 
 def monitor_stop():
     p = MONITOR_POPEN["proc"]
-    if not p: return
+    if not p:
+        # Started by another app worker: signal the lease holder if it runs on this host
+        held = lease_holder()
+        if held and held.get("host") == socket.gethostname() and held.get("pid"):
+            try:
+                os.kill(held["pid"], signal.SIGTERM)
+            except OSError:
+                pass
+        return
     if p.poll() is None:
         try:
             if os.name == "nt":
@@ -484,9 +703,7 @@ def index():
     drift_tail = ""
     if LOGFILE.exists():
         try:
-            with open(LOGFILE, "r", encoding="utf-8") as f:
-                # last block is fine for demo
-                drift_tail = "".join(f.readlines()[-200:])
+            drift_tail = tail_text(LOGFILE, 200)
         except Exception:
             pass
     return render_template_string(
@@ -495,19 +712,113 @@ def index():
         snapshots=list_snapshots(),
         drift=drift_tail,
         latest_comparison=get_latest_comparison(),
+        jobs=JOBS.recent(5),
         monitor_running=(MONITOR_POPEN["proc"] and MONITOR_POPEN["proc"].poll() is None),
     )
 
 @app.post("/snapshot")
 def take_snapshot():
-    rc, out, err = run_script(["enumerate_baseline.py"])
-    if rc != 0:
-        flash(f"enumerate_baseline.py failed: {err.strip() or rc}")
+    job, err = submit("snapshot", "snapshot", snapshot_job, "Take snapshot", aws=True)
+    if err:
+        flash(err)
         return redirect(url_for("index"))
-    fname = parse_wrote(out) or "(unknown)"
-    flash(f"Snapshot created: {fname}")
+    return queued(job, "Snapshot")
+
+def compare_and_log(name, progress=None):
+    """
+    Compare Baseline.json against snapshot `name`, append the report and correlated
+    CloudTrail events to the log. progress(fraction, message) is optional (jobs).
+    Both the diff and the CloudTrail lookup are reused for a pair of files already
+    compared (diff_cache.py).
+    """
+    progress = progress or (lambda *_: None)
+    progress(0.1, f"comparing Baseline.json vs {name}")
+    cache = DiffCache()
+    store = DriftStore()
+    try:
+        with metrics.timer(metrics.CYCLE_PHASE_SECONDS, phase="compare", account="manual"):
+            base_hash, snap_hash, entry, hit = cached_diff(cache, BASELINE, APP_DIR / name)
+            diff = entry["diff"]
+            out = render_report(diff)
+        metrics.DIFF_CACHE_LOOKUPS.inc(kind="diff", result="hit" if hit else "miss")
+        metrics.DIFF_CHANGES.observe(len(diff["changes"]), account="manual")
+        cid = store.record_comparison("Baseline.json", name, diff, source="manual",
+                                      captured_at=(entry["snap_meta"] or {}).get("captured_at_utc"))
+        progress(0.4, "searching CloudTrail")
+        events = _log_compare(name, entry, out, lambda evs, end: cache.put_events(base_hash, snap_hash, evs, end))
+        if events:
+            store.add_enrichment(cid, events)
+    finally:
+        store.close()
+        cache.close()
+    return diff
+
+def _log_compare(name, entry, out, remember):
+    """
+    Append a manual compare and its CloudTrail correlation to the log; returns the
+    events found. Settled lookups are taken from / handed to the cache (remember).
+    """
+    diff, events = entry["diff"], []
+    lines = [f"\n[manual compare] Baseline.json vs {name}\n", out]
+
+    # Try to fetch CloudTrail events for exactly the drifted resources
+    if correlate and diff["changes"]:
+        try:
+            if entry["events"] is not None:
+                metrics.DIFF_CACHE_LOOKUPS.inc(kind="events", result="hit")
+                events = entry["events"]
+            else:
+                metrics.DIFF_CACHE_LOOKUPS.inc(kind="events", result="miss")
+                start_t, end_t = capture_window({"meta": entry["base_meta"]}, {"meta": entry["snap_meta"]})
+                events = correlate(diff["changes"], start_t, end_t)
+                remember(events, end_t)
+            if events:
+                lines.append(f"\nFound {len(events)} CloudTrail event(s) related to the drift:\n")
+                for ev in events[:10]:
+                    lines.append(f"  - {format_event(ev)}\n")
+            else:
+                lines.append("\nNo matching CloudTrail events found in the capture window\n")
+        except Exception as e:
+            lines.append(f"\nCloudTrail lookup failed: {e}\n")
+
+    # One append after the (slow) lookup, so concurrent compare jobs don't interleave blocks
+    with open(LOGFILE, "a", encoding="utf-8") as f:
+        f.write("".join(lines))
+    return events
+
+def snapshot_job(job):
+    """Capture a snapshot in-process (job function); returns the new file name."""
+    session = metrics.instrument_session(boto3.session.Session())
+    snap = build_snapshot(session, progress=lambda i, n, section: job.update(i / n, f"collecting {section}"))
+    job.update(0.95, "writing snapshot")
+    fname = write_snapshot(snap, str(APP_DIR))
+    index_snapshot(snap, fname)
+    export_snapshot(snap, fname)
+    return fname
+
+def compare_job(name):
+    def run(job):
+        diff = compare_and_log(name, progress=job.update)
+        return {"snapshot": name, "changes": len(diff["changes"]), "account_mismatch": diff["account_mismatch"]}
+    return run
+
+def queued(job, what):
+    """Response for a route that queued a job: 202 JSON for API clients, else flash + redirect."""
+    if request.accept_mimetypes.best == "application/json":
+        resp = jsonify(job.to_dict())
+        resp.status_code = 202
+        resp.headers["Location"] = url_for("api_v1.job_status", job_id=job.id)
+        return resp
+    flash(f"{what} queued as job {job.id} ({job.status}).")
     return redirect(url_for("index"))
 
+def submit(kind, key, fn, description, aws=False):
+    """Queue a job; aws=True for jobs that call AWS (they share the queue's AWS slots)."""
+    try:
+        return JOBS.submit(kind, key, fn, description=description, aws=aws), None
+    except QueueFull as e:
+        return None, f"Too many jobs in progress ({e}); try again shortly."
+
 @app.post("/compare/latest")
 def compare_latest():
     snaps = list_snapshots()
@@ -518,98 +829,47 @@ def compare_latest():
         flash("Baseline.json not found. Upload a baseline first.")
         return redirect(url_for("index"))
     latest = snaps[0].name
-    rc, out, err = run_script(["compare_baseline.py", "Baseline.json", latest])
-    if out.strip():
-        with open(LOGFILE, "a", encoding="utf-8") as f:
-            f.write(f"\n[manual compare] Baseline.json vs {latest}\n")
-            f.write(out)
-            
-            # Try to fetch CloudTrail events
-            if find_events_for_keywords:
-                try:
-                    # Extract keywords from the comparison output
-                    keywords = set()
-                    for m in re.findall(r"sg-[0-9a-fA-F]+", out):
-                        keywords.add(m)
-                    for line in out.splitlines():
-                        for token in line.split():
-                            if 'bucket' in token.lower() or token.startswith('arn:aws:s3'):
-                                kw = token.strip('[],()"')
-                                keywords.add(kw)
-                    for m in re.findall(r"[A-Za-z0-9_\-]+", out):
-                        if len(m) > 2 and m.lower() not in ('added','removed','was','now','sg','bucket','s3','iam','ec2','aws'):
-                            keywords.add(m)
-                    
-                    kws = [k for k in keywords if k]
-                    if kws:
-                        end_t = datetime.now(UTC)
-                        start_t = end_t - timedelta(minutes=10)
-                        events = find_events_for_keywords(kws[:20], start_t, end_t)
-                        if events:
-                            f.write(f"\nFound {len(events)} CloudTrail event(s) related to the drift:\n")
-                            for ev in events[:10]:
-                                u = ev.get('userIdentity') or {}
-                                uname = (u.get('userName') or u.get('arn') or str(u))
-                                ip = ev.get('sourceIPAddress')
-                                en = ev.get('eventName')
-                                et = ev.get('eventTime')
-                                f.write(f"  - {et} {en} by {uname} from {ip}\n")
-                        else:
-                            f.write("\nNo matching CloudTrail events found in the recent window\n")
-                except Exception as e:
-                    f.write(f"\nCloudTrail lookup failed: {e}\n")
-    
-    flash(f"Compared Baseline.json vs {latest} (see drift panel).")
-    return redirect(url_for("index"))
+    job, err = submit("compare", f"compare:{latest}", compare_job(latest), f"Compare Baseline.json vs {latest}",
+                      aws=correlate is not None)
+    if err:
+        flash(err)
+        return redirect(url_for("index"))
+    return queued(job, f"Compare Baseline.json vs {latest}")
 
 @app.get("/compare/<name>")
 def compare_to(name):
     if not BASELINE.exists():
         flash("Baseline.json not found. Upload a baseline first.")
         return redirect(url_for("index"))
-    rc, out, err = run_script(["compare_baseline.py", "Baseline.json", name])
-    if out.strip():
-        with open(LOGFILE, "a", encoding="utf-8") as f:
-            f.write(f"\n[manual compare] Baseline.json vs {name}\n")
-            f.write(out)
-            
-            # Try to fetch CloudTrail events
-            if find_events_for_keywords:
-                try:
-                    # Extract keywords from the comparison output
-                    keywords = set()
-                    for m in re.findall(r"sg-[0-9a-fA-F]+", out):
-                        keywords.add(m)
-                    for line in out.splitlines():
-                        for token in line.split():
-                            if 'bucket' in token.lower() or token.startswith('arn:aws:s3'):
-                                kw = token.strip('[],()"')
-                                keywords.add(kw)
-                    for m in re.findall(r"[A-Za-z0-9_\-]+", out):
-                        if len(m) > 2 and m.lower() not in ('added','removed','was','now','sg','bucket','s3','iam','ec2','aws'):
-                            keywords.add(m)
-                    
-                    kws = [k for k in keywords if k]
-                    if kws:
-                        end_t = datetime.now(UTC)
-                        start_t = end_t - timedelta(minutes=10)
-                        events = find_events_for_keywords(kws[:20], start_t, end_t)
-                        if events:
-                            f.write(f"\nFound {len(events)} CloudTrail event(s) related to the drift:\n")
-                            for ev in events[:10]:
-                                u = ev.get('userIdentity') or {}
-                                uname = (u.get('userName') or u.get('arn') or str(u))
-                                ip = ev.get('sourceIPAddress')
-                                en = ev.get('eventName')
-                                et = ev.get('eventTime')
-                                f.write(f"  - {et} {en} by {uname} from {ip}\n")
-                        else:
-                            f.write("\nNo matching CloudTrail events found in the recent window\n")
-                except Exception as e:
-                    f.write(f"\nCloudTrail lookup failed: {e}\n")
-    
-    flash(f"Compared Baseline.json vs {name} (see drift panel).")
-    return redirect(url_for("index"))
+    if not (APP_DIR / name).is_file():
+        flash(f"Snapshot not found: {name}")
+        return redirect(url_for("index"))
+    job, err = submit("compare", f"compare:{name}", compare_job(name), f"Compare Baseline.json vs {name}",
+                      aws=correlate is not None)
+    if err:
+        flash(err)
+        return redirect(url_for("index"))
+    return queued(job, f"Compare Baseline.json vs {name}")
+
+@app.get("/drift")
+def drift_history():
+    args = request.args
+    store = DriftStore()
+    try:
+        items = store.items(
+            section=args.get("section") or None,
+            resource=args.get("resource") or None,
+            start=args.get("since") or None,
+            end=args.get("until") or None,
+            limit=500,
+        )
+    finally:
+        store.close()
+    return render_template_string(DRIFT_PAGE, items=items, args=args, sections=SECTION_TITLES)
+
+@app.get("/metrics")
+def metrics_text():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.post("/baseline/upload")
 def upload_baseline():
@@ -617,12 +877,56 @@ def upload_baseline():
     if not file:
         flash("No file provided.")
         return redirect(url_for("index"))
-    file.save(BASELINE)
+    # Save beside it, then rename: the monitor never reads a half-uploaded baseline
+    tmp = BASELINE.with_name(f"{BASELINE.name}.{os.getpid()}.tmp")
+    try:
+        file.save(tmp)
+        os.replace(tmp, BASELINE)
+    finally:
+        tmp.unlink(missing_ok=True)
     flash("Baseline.json uploaded.")
     return redirect(url_for("index"))
 
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks as one gzip member, flushing per chunk so the browser renders as it arrives."""
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = z.compress(chunk) + z.flush(zlib.Z_SYNC_FLUSH)
+        if out:
+            yield out
+    yield z.flush()
+
+def streamed(chunks, mimetype, headers=None):
+    """Chunked response, gzip-encoded when the client accepts it."""
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    if request.accept_encodings["gzip"]:
+        headers["Content-Encoding"] = "gzip"
+        chunks = gzip_chunks(chunks)
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+def read_chunks(f):
+    with f:
+        yield from iter(lambda: f.read(STREAM_CHUNK), b"")
+
+def escaped_chunks(f):
+    """HTML-escaped <pre> of a file, one chunk at a time (UTF-8 split across chunks is handled by the decoder)."""
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    yield b"<pre>"
+    for block in read_chunks(f):
+        yield html.escape(decoder.decode(block), quote=False).encode("utf-8")
+    yield html.escape(decoder.decode(b"", final=True), quote=False).encode("utf-8") + b"</pre>"
+
 @app.get("/files/<name>")
 def download_file(name):
+    p = APP_DIR / name
+    # Range (resume / partial) requests get the identity bytes from send_from_directory,
+    # which answers 206 / If-Range itself; whole-file downloads are gzip-streamed
+    if request.range is None and request.accept_encodings["gzip"] and p.is_file():
+        return streamed(
+            read_chunks(open(p, "rb")),
+            mimetypes.guess_type(name)[0] or "application/octet-stream",
+            {"Content-Disposition": f'attachment; filename="{name}"', "Accept-Ranges": "bytes"},
+        )
     return send_from_directory(APP_DIR, name, as_attachment=True)
 
 @app.get("/view/<name>")
@@ -631,15 +935,17 @@ def view_text(name):
     if not p.exists():
         return "Not found", 404
     try:
-        text = p.read_text(encoding="utf-8")
+        f = open(p, "rb")
     except Exception as e:
-        text = f"(unable to read) {e}"
-    return f"<pre>{text.replace('<','&lt;').replace('>','&gt;')}</pre>"
+        return f"<pre>(unable to read) {html.escape(str(e))}</pre>"
+    return streamed(escaped_chunks(f), "text/html")
 
 @app.post("/monitor/start")
 def start_monitor():
-    monitor_start()
-    flash("Monitor started.")
+    if monitor_start():
+        flash("Monitor started.")
+    else:
+        flash("Monitor is already running.")
     return redirect(url_for("index"))
 
 @app.post("/monitor/stop")
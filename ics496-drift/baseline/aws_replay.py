@@ -0,0 +1,697 @@
+#!/usr/bin/env python3
+"""
+Offline AWS backend for enumeration / CloudTrail performance tests.
+
+Hooks into botocore's event system: `before-parameter-build` stashes the API
+parameters, `before-call` picks them up for the call, and `before-send` answers
+each HTTP attempt with a response serialized in the service's wire protocol
+(query / ec2 / rest-xml / json / rest-json), so nothing is sent. Responses come
+from a responder:
+
+  - SnapshotResponder: synthesizes IAM / S3 / EC2 / STS responses from a
+    snapshot (Baseline.json, or bench.synth_snapshot at any scale) and
+    CloudTrail LookupEvents from a list of events;
+  - RecordedResponder: replays responses captured from a live account with
+    `Recorder` (python aws_replay.py record --out rec.json).
+
+Per operation ("service.Operation", or "default") a profile sets:
+  latency     {"median_ms": 80, "sigma": 0.5} (lognormal) or {"fixed_ms": 20}
+  throttle    probability that an attempt is throttled
+  rate/burst  token bucket (requests per second); attempts beyond it are throttled
+  page_size   items per page for paginated operations when the caller doesn't ask for fewer
+
+A throttled attempt is answered with a real Throttling error response, so
+botocore parses it and its own retry handler (legacy / standard / adaptive,
+max_attempts, the needs-retry metrics hook) decides whether to retry. Random
+draws are seeded per (operation, parameters, occurrence, attempt), so a run is
+reproducible regardless of thread scheduling (token buckets, by nature, depend
+on timing). time_scale shrinks the simulated latency; botocore's retry
+backoff sleeps in real time. The collectors' own client-side rate limits
+(collectors.RATE_LIMITS) are quotas in simulated seconds: the enumerate
+command scales them with scale_rate_limits (time scale 0 turns them off).
+
+Usage:
+  python aws_replay.py enumerate --snapshot Baseline.json [--profile latency.json] [--time-scale 0.1]
+  python aws_replay.py enumerate --synth large --profile latency.json --time-scale 0.01
+  python aws_replay.py enumerate --recording rec.json
+  python aws_replay.py record --out rec.json [--aws-profile prod]
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+DEFAULT_REGION = "us-east-1"
+DEFAULT_PROFILE = {"default": {"latency": {"median_ms": 40, "sigma": 0.4}, "throttle": 0.0}}
+# Service defaults when the caller passes no page size (None = everything in one page)
+DEFAULT_PAGE_SIZES = {"iam.ListUsers": 100, "cloudtrail.LookupEvents": 50}
+# ------------------------------------------
+
+_PARAMS_KEY = "replay_params"
+# rest-xml operations whose body is one bare element botocore reads in an after-call handler
+_BARE_XML = {"s3.GetBucketLocation": "LocationConstraint"}
+
+
+class ReplayError(Exception):
+    """Raised by a responder to return an AWS error response."""
+
+    def __init__(self, code: str, message: str = "", status: int = 400):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+def _key(service: str, operation: str, params: Dict[str, Any]) -> str:
+    return f"{service}.{operation}:" + json.dumps(params, sort_keys=True, default=str)
+
+
+def _page(items: List[Any], params: Dict[str, Any], page_size: Optional[int],
+          size_param: str, token_in: str) -> Tuple[List[Any], Optional[str]]:
+    """Slice one page of items; returns (page, next token or None). Tokens are offsets."""
+    start = int(params.get(token_in) or 0)
+    size = params.get(size_param) or page_size
+    if page_size and size:
+        size = min(size, page_size)
+    if not size:
+        return items[start:], None
+    end = start + size
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+# --- responders ---
+class SnapshotResponder:
+    """Answers enumerate_baseline's and CloudTrail's calls from a snapshot dict and an event list."""
+
+    def __init__(self, snapshot: Dict[str, Any], events: Optional[List[Dict[str, Any]]] = None):
+        self.snapshot = snapshot
+        self.users = {u["UserName"]: u for u in (snapshot.get("iam") or {}).get("Users", [])}
+        self.buckets = {b["Name"]: b for b in (snapshot.get("s3") or {}).get("Buckets", [])}
+        self.events = sorted(events or [], key=lambda e: e["EventTime"], reverse=True)
+
+    def __call__(self, service: str, operation: str, params: Dict[str, Any], page_size: Optional[int]) -> Dict[str, Any]:
+        fn = getattr(self, f"{service}_{operation}".replace("-", "_"), None)
+        if fn is None:
+            raise ReplayError("UnsupportedOperation", f"{service}.{operation} is not synthesized", 400)
+        return fn(params, page_size)
+
+    # sts
+    def sts_GetCallerIdentity(self, params, page_size):
+        ident = self.snapshot.get("identity") or {}
+        return {"Account": ident.get("account_id"), "Arn": ident.get("arn"), "UserId": ident.get("user_id")}
+
+    # iam
+    def _user(self, params):
+        u = self.users.get(params.get("UserName"))
+        if u is None:
+            raise ReplayError("NoSuchEntity", f"The user with name {params.get('UserName')} cannot be found.", 404)
+        return u
+
+    def iam_ListUsers(self, params, page_size):
+        users = [
+            {"UserName": u["UserName"], "Arn": u.get("Arn"), "Path": "/", "UserId": f"AIDA{i:016d}",
+             "CreateDate": datetime.strptime(u.get("CreateDate") or "2025-01-01T00:00:00Z", "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=UTC)}
+            for i, u in enumerate(self.users.values())
+        ]
+        page, marker = _page(users, params, page_size, "MaxItems", "Marker")
+        out = {"Users": page, "IsTruncated": marker is not None}
+        if marker:
+            out["Marker"] = marker
+        return out
+
+    def iam_ListGroupsForUser(self, params, page_size):
+        return {"Groups": [{"GroupName": g} for g in self._user(params).get("Groups", [])], "IsTruncated": False}
+
+    def iam_ListAttachedUserPolicies(self, params, page_size):
+        return {"AttachedPolicies": [{"PolicyArn": a, "PolicyName": a.rsplit("/", 1)[-1]}
+                                     for a in self._user(params).get("AttachedPolicies", [])], "IsTruncated": False}
+
+    def iam_ListUserPolicies(self, params, page_size):
+        return {"PolicyNames": list(self._user(params).get("InlinePolicies", [])), "IsTruncated": False}
+
+    # s3
+    def _bucket(self, params):
+        b = self.buckets.get(params.get("Bucket"))
+        if b is None:
+            raise ReplayError("NoSuchBucket", "The specified bucket does not exist", 404)
+        return b
+
+    def s3_ListBuckets(self, params, page_size):
+        return {"Buckets": [{"Name": n, "CreationDate": datetime(2025, 1, 1, tzinfo=UTC)} for n in self.buckets]}
+
+    def s3_GetBucketLocation(self, params, page_size):
+        return {"LocationConstraint": self._bucket(params).get("Location")}
+
+    def s3_GetBucketEncryption(self, params, page_size):
+        enc = self._bucket(params).get("Encryption")
+        if not enc:
+            raise ReplayError("ServerSideEncryptionConfigurationNotFoundError", "not found", 404)
+        return {"ServerSideEncryptionConfiguration": enc}
+
+    def s3_GetBucketPolicy(self, params, page_size):
+        pol = self._bucket(params).get("Policy")
+        if not pol:
+            raise ReplayError("NoSuchBucketPolicy", "The bucket policy does not exist", 404)
+        return {"Policy": json.dumps(pol)}
+
+    def s3_GetPublicAccessBlock(self, params, page_size):
+        pab = self._bucket(params).get("PublicAccessBlock")
+        if not pab:
+            raise ReplayError("NoSuchPublicAccessBlockConfiguration", "not found", 404)
+        return {"PublicAccessBlockConfiguration": pab}
+
+    def s3_GetBucketVersioning(self, params, page_size):
+        ver = dict(self._bucket(params).get("Versioning") or {})
+        ver.pop("ResponseMetadata", None)
+        return ver
+
+    # ec2
+    @staticmethod
+    def _permissions(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        perms = []
+        for r in rules:
+            p = {"IpProtocol": r.get("Protocol"), "IpRanges": [], "Ipv6Ranges": [], "UserIdGroupPairs": []}
+            for k in ("FromPort", "ToPort"):
+                if r.get(k) is not None:
+                    p[k] = r[k]
+            desc = {"Description": r["Desc"]} if r.get("Desc") else {}
+            if r.get("CidrIp"):
+                p["IpRanges"].append({"CidrIp": r["CidrIp"], **desc})
+            elif r.get("CidrIpv6"):
+                p["Ipv6Ranges"].append({"CidrIpv6": r["CidrIpv6"], **desc})
+            elif r.get("SourceGroupId"):
+                p["UserIdGroupPairs"].append({"GroupId": r["SourceGroupId"], **desc})
+            perms.append(p)
+        return perms
+
+    def ec2_DescribeSecurityGroups(self, params, page_size):
+        sgs = [
+            {"GroupId": sg.get("GroupId"), "GroupName": sg.get("GroupName"), "Description": sg.get("Description"),
+             "VpcId": sg.get("VpcId"), "IpPermissions": self._permissions(sg.get("InboundRules", [])),
+             "IpPermissionsEgress": self._permissions(sg.get("OutboundRules", [])),
+             "Tags": [{"Key": k, "Value": v} for k, v in (sg.get("Tags") or {}).items()]}
+            for sg in (self.snapshot.get("ec2") or {}).get("SecurityGroups", [])
+        ]
+        # Without MaxResults, DescribeSecurityGroups returns every group in one response
+        page, token = _page(sgs, params, page_size if params.get("MaxResults") else None, "MaxResults", "NextToken")
+        return {"SecurityGroups": page, **({"NextToken": token} if token else {})}
+
+    # cloudtrail
+    def cloudtrail_LookupEvents(self, params, page_size):
+        start, end = params.get("StartTime"), params.get("EndTime")
+        attrs = params.get("LookupAttributes") or []
+        evs = [e for e in self.events if (not start or e["EventTime"] >= start) and (not end or e["EventTime"] <= end)]
+        for a in attrs:
+            if a["AttributeKey"] == "EventName":
+                evs = [e for e in evs if e["EventName"] == a["AttributeValue"]]
+            elif a["AttributeKey"] == "ResourceName":
+                evs = [e for e in evs if any(r.get("ResourceName") == a["AttributeValue"] for r in e.get("Resources", []))]
+        page, token = _page(evs, params, page_size, "MaxResults", "NextToken")
+        return {"Events": page, **({"NextToken": token} if token else {})}
+
+
+def synth_events(snapshot: Dict[str, Any], count: int, start: datetime, end: datetime, seed: int = 0) -> List[Dict[str, Any]]:
+    """CloudTrail LookupEvents records spread over [start, end] touching the snapshot's resources."""
+    rnd = random.Random(seed)
+    targets = (
+        [("AWS::IAM::User", u["UserName"], ("AttachUserPolicy", "PutUserPolicy", "CreateUser"))
+         for u in (snapshot.get("iam") or {}).get("Users", [])]
+        + [("AWS::S3::Bucket", b["Name"], ("PutBucketPolicy", "PutBucketEncryption", "PutBucketVersioning"))
+           for b in (snapshot.get("s3") or {}).get("Buckets", [])]
+        + [("AWS::EC2::SecurityGroup", sg["GroupId"], ("AuthorizeSecurityGroupIngress", "RevokeSecurityGroupIngress"))
+           for sg in (snapshot.get("ec2") or {}).get("SecurityGroups", [])]
+    )
+    span = (end - start).total_seconds()
+    events = []
+    for i in range(count if targets else 0):
+        rtype, rname, names = rnd.choice(targets)
+        name = rnd.choice(names)
+        when = start + timedelta(seconds=rnd.random() * span)
+        eid = f"replay-{seed}-{i:08d}"
+        raw = {"eventID": eid, "eventName": name, "eventTime": when.strftime("%Y-%m-%dT%H:%M:%SZ"),
+               "userIdentity": {"type": "IAMUser", "userName": "replay-user"}, "sourceIPAddress": "10.0.0.1",
+               "requestParameters": {"resourceName": rname}}
+        events.append({"EventId": eid, "EventName": name, "EventTime": when, "Username": "replay-user",
+                       "Resources": [{"ResourceType": rtype, "ResourceName": rname}], "CloudTrailEvent": json.dumps(raw)})
+    return events
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {"__datetime__"}:
+            return datetime.fromisoformat(value["__datetime__"])
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class RecordedResponder:
+    """Replays responses captured by Recorder, matched on operation + exact parameters."""
+
+    def __init__(self, path: str):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.responses: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for rec in data["calls"]:
+            self.responses[_key(rec["service"], rec["operation"], rec["params"])].append(rec)
+        self.served: Dict[str, int] = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def __call__(self, service: str, operation: str, params: Dict[str, Any], page_size: Optional[int]) -> Dict[str, Any]:
+        key = _key(service, operation, _encode(params))
+        recs = self.responses.get(key)
+        if not recs:
+            raise ReplayError("NotRecorded", f"no recorded response for {key}", 400)
+        with self.lock:
+            # Repeated identical calls cycle through what was recorded for them
+            rec = recs[self.served[key] % len(recs)]
+            self.served[key] += 1
+        if rec.get("error"):
+            raise ReplayError(rec["error"]["Code"], rec["error"].get("Message", ""), rec["status"])
+        return _decode(rec["parsed"])
+
+
+class Recorder:
+    """Captures every call made through a live session for later replay."""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def install(self, session):
+        session.events.register("before-parameter-build", _stash_params, unique_id="replay-stash")
+        session.events.register("after-call", self._after_call, unique_id="replay-record")
+        return session
+
+    def _after_call(self, event_name=None, http_response=None, parsed=None, model=None, context=None, **kwargs):
+        service = event_name.split(".")[1]
+        parsed = dict(parsed or {})
+        parsed.pop("ResponseMetadata", None)
+        status = getattr(http_response, "status_code", 200)
+        rec = {"service": service, "operation": model.name, "params": _encode((context or {}).get(_PARAMS_KEY, {})),
+               "status": status}
+        if status >= 300:
+            rec["error"] = parsed.get("Error", {})
+        else:
+            rec["parsed"] = _encode(parsed)
+        with self.lock:
+            self.calls.append(rec)
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"recorded_at": datetime.now(UTC).isoformat(), "calls": self.calls}, f, indent=1)
+
+
+def _stash_params(params=None, context=None, **kwargs):
+    if context is not None and params is not None:
+        context[_PARAMS_KEY] = dict(params)
+
+
+# --- wire serialization ---
+def _scalar(shape, value) -> str:
+    if shape.type_name == "timestamp" and isinstance(value, datetime):
+        return value.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    if shape.type_name == "boolean":
+        return "true" if value else "false"
+    if shape.type_name == "blob":
+        return base64.b64encode(value if isinstance(value, bytes) else str(value).encode()).decode()
+    return str(value)
+
+
+def _body_members(shape):
+    return [(name, m) for name, m in shape.members.items() if not m.serialization.get("location")]
+
+
+def _xml(parent, shape, value, tag: str):
+    """Append value as the XML botocore's query / ec2 / rest-xml parsers read back."""
+    if shape.type_name == "list" and shape.serialization.get("flattened"):
+        for v in value:
+            _xml(parent, shape.member, v, shape.member.serialization.get("name", tag))
+        return
+    node = ElementTree.SubElement(parent, tag)
+    if shape.type_name == "structure":
+        for name, m in _body_members(shape):
+            if value.get(name) is not None:
+                _xml(node, m, value[name], m.serialization.get("name", name))
+    elif shape.type_name == "list":
+        for v in value:
+            _xml(node, shape.member, v, shape.member.serialization.get("name", "member"))
+    elif shape.type_name == "map":
+        for k, v in value.items():
+            entry = ElementTree.SubElement(node, "entry")
+            ElementTree.SubElement(entry, shape.key.serialization.get("name", "key")).text = str(k)
+            _xml(entry, shape.value, v, shape.value.serialization.get("name", "value"))
+    else:
+        node.text = _scalar(shape, value)
+
+
+def _json(shape, value) -> Any:
+    if shape.type_name == "structure":
+        return {m.serialization.get("name", name): _json(m, value[name])
+                for name, m in _body_members(shape) if value.get(name) is not None}
+    if shape.type_name == "list":
+        return [_json(shape.member, v) for v in value]
+    if shape.type_name == "map":
+        return {str(k): _json(shape.value, v) for k, v in value.items()}
+    if shape.type_name == "timestamp" and isinstance(value, datetime):
+        return value.timestamp()
+    if shape.type_name == "blob":
+        return _scalar(shape, value)
+    return value
+
+
+def serialize_response(model, parsed: Dict[str, Any], request_id: str) -> Tuple[Dict[str, str], bytes]:
+    """(headers, body) of a successful response to operation `model` carrying `parsed`."""
+    protocol = model.service_model.resolved_protocol
+    shape = model.output_shape
+    headers = {"x-amzn-requestid": request_id, "x-amz-request-id": request_id}
+    if shape is None:
+        return headers, b"{}" if protocol in ("json", "rest-json") else b""
+    for name, m in shape.members.items():
+        loc = m.serialization.get("location")
+        if loc == "header" and parsed.get(name) is not None:
+            headers[m.serialization.get("name", name)] = _scalar(m, parsed[name])
+        elif loc == "headers":
+            for k, v in (parsed.get(name) or {}).items():
+                headers[m.serialization.get("name", "") + k] = str(v)
+    op = f"{model.service_model.endpoint_prefix}.{model.name}"
+    payload = shape.serialization.get("payload")
+    if payload and shape.members[payload].type_name in ("string", "blob"):
+        value = parsed.get(payload) or b""
+        return headers, value if isinstance(value, bytes) else str(value).encode()
+    if protocol in ("json", "rest-json"):
+        body = _json(shape.members[payload], parsed.get(payload) or {}) if payload else _json(shape, parsed)
+        return headers, json.dumps(body).encode()
+    if op in _BARE_XML:
+        root = ElementTree.Element(_BARE_XML[op])
+        root.text = parsed.get(_BARE_XML[op])
+    elif protocol == "rest-xml":
+        member = shape.members[payload] if payload else shape
+        wrapper = ElementTree.Element("_")
+        _xml(wrapper, member, parsed.get(payload) or {} if payload else parsed,
+             member.serialization.get("name", payload or shape.name))
+        root = wrapper[0]
+    else:
+        root = ElementTree.Element(f"{model.name}Response")
+        if protocol == "query":
+            _xml(root, shape, parsed, shape.serialization.get("resultWrapper", f"{model.name}Result"))
+            ElementTree.SubElement(ElementTree.SubElement(root, "ResponseMetadata"), "RequestId").text = request_id
+        else:
+            for name, m in _body_members(shape):
+                if parsed.get(name) is not None:
+                    _xml(root, m, parsed[name], m.serialization.get("name", name))
+            ElementTree.SubElement(root, "requestId").text = request_id
+    return headers, ElementTree.tostring(root, encoding="utf-8")
+
+
+def serialize_error(model, code: str, message: str, request_id: str) -> Tuple[Dict[str, str], bytes]:
+    """(headers, body) of an error response in the service's protocol."""
+    protocol = model.service_model.resolved_protocol
+    headers = {"x-amzn-requestid": request_id, "x-amz-request-id": request_id}
+    if protocol in ("json", "rest-json"):
+        headers["x-amzn-errortype"] = code
+        return headers, json.dumps({"__type": code, "message": message}).encode()
+    error = f"<Code>{code}</Code><Message>{message}</Message>"
+    if protocol == "query":
+        body = f"<ErrorResponse><Error><Type>Sender</Type>{error}</Error><RequestId>{request_id}</RequestId></ErrorResponse>"
+    elif protocol == "ec2":
+        body = f"<Response><Errors><Error>{error}</Error></Errors><RequestID>{request_id}</RequestID></Response>"
+    else:
+        body = f"<Error>{error}<RequestId>{request_id}</RequestId></Error>"
+    return headers, body.encode()
+
+
+class _Raw:
+    """Minimal urllib3-style body for AWSResponse."""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def stream(self, *args, **kwargs):
+        yield self.body
+
+
+# --- the backend ---
+class _Bucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.capacity = rate, max(1.0, burst)
+        self.tokens, self.at = self.capacity, time.monotonic()
+
+    def take(self, time_scale: float) -> bool:
+        now = time.monotonic()
+        # Rates are in unscaled (simulated) seconds
+        self.tokens = min(self.capacity, self.tokens + (now - self.at) * self.rate / (time_scale or 1))
+        self.at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class ReplayBackend:
+    """Serves AWS calls from a responder with profile-driven latency, throttling and paging."""
+
+    def __init__(self, responder: Callable, profile: Optional[Dict[str, Any]] = None, seed: int = 0,
+                 time_scale: float = 1.0):
+        self.responder = responder
+        self.profile = profile or DEFAULT_PROFILE
+        self.seed = seed
+        self.time_scale = time_scale
+        self.lock = threading.Lock()
+        self.occurrences: Dict[str, int] = defaultdict(int)
+        self.buckets: Dict[str, _Bucket] = {}
+        self.counts: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.local = threading.local()    # the call in progress on this thread (botocore retries synchronously)
+
+    def settings(self, op: str) -> Dict[str, Any]:
+        merged = dict(self.profile.get("default", {}))
+        merged.update(self.profile.get(op, {}))
+        return merged
+
+    def install(self, session):
+        """Answer every call made through this boto3 session (or any client created from it)."""
+        events = session.events
+        events.register("before-parameter-build", _stash_params, unique_id="replay-stash")
+        events.register("before-call", self._before_call, unique_id="replay-call")
+        events.register("before-send", self._before_send, unique_id="replay-respond")
+        return session
+
+    def session(self, region: str = DEFAULT_REGION) -> boto3.session.Session:
+        """A fresh session with dummy credentials, already wired to this backend."""
+        return self.install(boto3.session.Session(
+            aws_access_key_id="REPLAY", aws_secret_access_key="REPLAY", region_name=region))
+
+    def install_default(self, region: str = DEFAULT_REGION):
+        """Route bare boto3.client(...) calls (cloudtrail_fetch, event_store) through the backend."""
+        boto3.setup_default_session(aws_access_key_id="REPLAY", aws_secret_access_key="REPLAY", region_name=region)
+        return self.install(boto3.DEFAULT_SESSION)
+
+    def _sleep(self, seconds: float):
+        if seconds > 0:
+            time.sleep(seconds * self.time_scale)
+
+    def _latency(self, cfg: Dict[str, Any], rnd: random.Random) -> float:
+        lat = cfg.get("latency") or {}
+        if "fixed_ms" in lat:
+            return lat["fixed_ms"] / 1000
+        if "median_ms" in lat:
+            return rnd.lognormvariate(0, lat.get("sigma", 0.5)) * lat["median_ms"] / 1000
+        return 0.0
+
+    def _throttled(self, op: str, cfg: Dict[str, Any], rnd: random.Random) -> bool:
+        if cfg.get("rate"):
+            with self.lock:
+                bucket = self.buckets.get(op)
+                if bucket is None:
+                    bucket = self.buckets[op] = _Bucket(cfg["rate"], cfg.get("burst", cfg["rate"]))
+                if not bucket.take(self.time_scale):
+                    return True
+        return rnd.random() < cfg.get("throttle", 0.0)
+
+    def _before_call(self, event_name=None, model=None, context=None, **kwargs):
+        service = event_name.split(".")[1]
+        op = f"{service}.{model.name}"
+        params = (context or {}).get(_PARAMS_KEY, {})
+        key = _key(service, model.name, params)
+        with self.lock:
+            n = self.occurrences[key]
+            self.occurrences[key] += 1
+            self.counts[op]["calls"] += 1
+        self.local.call = {"service": service, "op": op, "model": model, "params": params,
+                           "key": key, "n": n, "attempt": 0, "result": None}
+
+    def _before_send(self, event_name=None, request=None, **kwargs):
+        call = getattr(self.local, "call", None)
+        if call is None:
+            return None
+        op, model = call["op"], call["model"]
+        cfg = self.settings(op)
+        rnd = random.Random(f"{self.seed}:{call['key']}:{call['n']}:{call['attempt']}")
+        request_id = f"replay-{call['n']}-{call['attempt']}"
+        call["attempt"] += 1
+        wait = self._latency(cfg, rnd)
+        self._count(op, attempts=1, latency_s=wait)
+        self._sleep(wait)
+        if self._throttled(op, cfg, rnd):
+            self._count(op, throttles=1)
+            return self._response(op, 400, *serialize_error(model, "Throttling", "Rate exceeded", request_id))
+
+        if call["result"] is None:
+            # Once per call: a recording's served counter must not advance on retried attempts
+            page_size = cfg.get("page_size", DEFAULT_PAGE_SIZES.get(op))
+            try:
+                parsed = self.responder(call["service"], model.name, call["params"], page_size)
+                call["result"] = (200, serialize_response(model, parsed, request_id))
+            except ReplayError as e:
+                self._count(op, errors=1)
+                call["result"] = (e.status, serialize_error(model, e.code, e.message, request_id))
+        status, (headers, body) = call["result"]
+        return self._response(op, status, headers, body)
+
+    def _count(self, op: str, **deltas: float):
+        with self.lock:
+            stats = self.counts[op]
+            for k, v in deltas.items():
+                stats[k] += v
+
+    def _response(self, op: str, status: int, headers: Dict[str, str], body: bytes) -> AWSResponse:
+        return AWSResponse(f"replay://{op}", status, headers, _Raw(body))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per operation: calls, attempts, throttles, errors, simulated latency seconds (unscaled)."""
+        with self.lock:
+            return {op: dict(v) for op, v in sorted(self.counts.items())}
+
+
+def scale_rate_limits(time_scale: float):
+    """
+    Run the collectors' token buckets on the replay clock: a rate of r/s becomes
+    r / time_scale per real second (time_scale 0 = unlimited). Process-wide;
+    the limiters built so far are dropped so the next client picks this up.
+    """
+    import collectors
+    collectors.RATE_LIMITS = {svc: (rate / time_scale if rate and time_scale else None)
+                              for svc, rate in collectors.RATE_LIMITS.items()}
+    with collectors._LIMITERS_LOCK:
+        collectors._LIMITERS.clear()
+
+
+def _comparable(snapshot: Dict[str, Any], section: str) -> Any:
+    # get_bucket_versioning's ResponseMetadata (request ids) ends up in snapshots; it never matches
+    data = json.loads(json.dumps(snapshot.get(section), default=str))
+    if section == "s3":
+        for b in (data or {}).get("Buckets", []):
+            (b.get("Versioning") or {}).pop("ResponseMetadata", None)
+    return data
+
+
+def load_profile(path: Optional[str]) -> Dict[str, Any]:
+    if not path:
+        return DEFAULT_PROFILE
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run enumeration against a replayed AWS backend, or record one")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("enumerate", help="build a snapshot against the replay backend and report timings")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--snapshot", help="synthesize responses from this snapshot file")
+    src.add_argument("--synth", help="synthesize from bench.py's generator at this scale (small/medium/large)")
+    src.add_argument("--recording", help="replay a Recorder capture")
+    p.add_argument("--profile", help="latency / throttle / paging profile (JSON)")
+    p.add_argument("--time-scale", type=float, default=1.0, help="multiply every simulated sleep (default 1.0)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", action="store_true", help="print stats as JSON")
+    p = sub.add_parser("record", help="enumerate a live account and save every response")
+    p.add_argument("--out", required=True)
+    p.add_argument("--aws-profile")
+    args = ap.parse_args()
+
+    from enumerate_baseline import build_snapshot
+
+    if args.cmd == "record":
+        recorder = Recorder()
+        session = boto3.session.Session(profile_name=args.aws_profile) if args.aws_profile else boto3.session.Session()
+        build_snapshot(recorder.install(session))
+        recorder.save(args.out)
+        print(f"Recorded {len(recorder.calls)} call(s) to {args.out}")
+        return
+
+    source = None
+    if args.recording:
+        responder = RecordedResponder(args.recording)
+    else:
+        if args.synth:
+            from bench import SCALES, synth_snapshot
+            source = synth_snapshot(seed=args.seed, **SCALES[args.synth])
+        else:
+            with open(args.snapshot, "r", encoding="utf-8") as f:
+                source = json.load(f)
+        responder = SnapshotResponder(source)
+
+    backend = ReplayBackend(responder, load_profile(args.profile), seed=args.seed, time_scale=args.time_scale)
+    scale_rate_limits(args.time_scale)
+    t0 = time.perf_counter()
+    try:
+        snap = build_snapshot(backend.session())
+    except ClientError as e:
+        # Retries exhausted (or a fatal error) on a call the collectors don't tolerate
+        snap, failed = None, e
+    else:
+        failed = None
+    wall = time.perf_counter() - t0
+    stats = backend.stats()
+
+    if failed is not None:
+        same = None
+        print(f"Enumeration failed after {wall:.2f}s: {failed}")
+    elif source is not None:
+        # Round trip: what enumeration rebuilt must match what the responses were made from
+        same = all(_comparable(snap, k) == _comparable(source, k) for k in ("identity", "iam", "s3", "ec2"))
+    else:
+        same = None
+    if args.json:
+        print(json.dumps({"wall_s": wall, "time_scale": args.time_scale, "round_trip_ok": same,
+                          "error": failed and str(failed), "operations": stats}, indent=2))
+    else:
+        if failed is None:
+            print(f"Enumerated in {wall:.2f}s (time scale {args.time_scale})"
+                  + ("" if same is None else f", round trip {'OK' if same else 'MISMATCH'}"))
+        print(f"{'operation':<36} {'calls':>7} {'attempts':>9} {'throttles':>9} {'errors':>7} {'latency s':>10}")
+        for op, s in stats.items():
+            print(f"{op:<36} {s.get('calls', 0):>7.0f} {s.get('attempts', 0):>9.0f} {s.get('throttles', 0):>9.0f} "
+                  f"{s.get('errors', 0):>7.0f} {s.get('latency_s', 0):>10.2f}")
+    if failed is not None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Warm, pre-indexed Baseline.json for long-running processes.
+
+Baseline.json rarely changes, but a compare against it used to re-read and
+re-parse the file and rebuild the baseline side of every section diff
+({UserName: ...} maps, SG rule tuple sets) every cycle. IndexedBaseline keeps
+the parsed baseline and its compare_baseline.INDEXED form in memory, so a
+cycle only indexes the new snapshot:
+
+  - refresh() is a stat() per call; the file is re-hashed only when its size
+    or mtime changed and re-parsed only when its content hash did. Sections
+    whose content is unchanged keep their index.
+
+Promotion (promote_baseline.py) and uploads from the web app always run in
+another process than the monitor, so there is no in-memory copy to patch:
+they rewrite the file and the monitor's next refresh() re-indexes just the
+sections that changed (a promote of "s3" re-indexes s3 only).
+
+The monitor holds one per account directory via get().
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from compare_baseline import INDEXED, _traced
+from diff_cache import file_hash
+
+_LOADED: Dict[str, "IndexedBaseline"] = {}
+_LOADED_LOCK = threading.Lock()
+
+
+class IndexedBaseline:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data: Dict[str, Any] = {}
+        self.sections: Dict[str, Any] = {}            # section -> compare_baseline.INDEXED index
+        self.stamp: Optional[Tuple[int, int]] = None  # (size, mtime_ns) the index reflects
+        self.digest: Optional[str] = None
+        self.loads = 0                                # full parses, for tests / metrics
+        self.lock = threading.RLock()
+
+    def _index(self, names: Iterable[str]):
+        for name in names:
+            if name in INDEXED:
+                self.sections[name] = INDEXED[name][0](self.data.get(name, {}))
+
+    def refresh(self) -> bool:
+        """Pick up on-disk changes; returns True if anything was re-indexed."""
+        with self.lock:
+            st = self.path.stat()
+            stamp = (st.st_size, st.st_mtime_ns)
+            if stamp == self.stamp:
+                return False
+            digest = file_hash(self.path)
+            if digest == self.digest:
+                self.stamp = stamp                    # touched / rewritten with the same content
+                return False
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.loads += 1
+            changed = [k for k in set(data) | set(self.data) if data.get(k) != self.data.get(k)]
+            self.data = data
+            self._index(changed if self.stamp else INDEXED)
+            self.stamp, self.digest = stamp, digest
+            return bool(changed)
+
+    def diff(self, new: Dict[str, Any], sections: Iterable[str] = tuple(INDEXED)) -> Dict[str, Any]:
+        """compare_baseline.diff_snapshots(baseline, new), indexing only the new side."""
+        with self.lock:
+            self.refresh()
+            changes: List[Dict[str, Any]] = []
+            for section in sections:
+                index, diff_indexed = INDEXED[section]
+                changes += _traced(section, lambda _, b: diff_indexed(self.sections[section], index(b)),
+                                   self.data, new)
+            return {
+                "account_mismatch": self.data.get("identity", {}).get("account_id")
+                                    != new.get("identity", {}).get("account_id"),
+                "changes": changes,
+            }
+
+
+def get(path) -> IndexedBaseline:
+    """The process-wide IndexedBaseline for a file (created on first use)."""
+    key = str(Path(path).resolve())
+    with _LOADED_LOCK:
+        if key not in _LOADED:
+            _LOADED[key] = IndexedBaseline(key)
+        return _LOADED[key]
+
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the snapshot / compare / log pipeline.
+
+Synthetic snapshots are generated at a configurable scale (users, buckets with
+policies, security group rules) and a drifted copy is made with a controlled
+drift rate, so every run works on the same data for the same seed. For each
+step we record wall time (min / median over --repeat runs), peak Python
+memory (tracemalloc, one separate run) and throughput, and write the results
+as JSON tagged with the git commit so runs can be compared across commits.
+
+Usage:
+  python bench.py run [--scale large] [--users 10000 --buckets 5000 --sg-rules 100000] [--drift 0.01]
+  python bench.py generate --scale large --out /tmp/synth      # just write the two snapshots
+  python bench.py compare bench_results/<old>.json bench_results/<new>.json [--threshold 10]
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from compare_baseline import diff_snapshots, load, render_report
+from enumerate_baseline import write_snapshot
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+RESULTS_DIR = "bench_results"
+RULES_PER_SG = 20
+LOG_BLOCKS = 200                      # "[manual compare]" blocks in the synthetic log
+SCALES = {
+    "small": {"users": 200, "buckets": 100, "sg_rules": 2000},
+    "medium": {"users": 2000, "buckets": 1000, "sg_rules": 20000},
+    "large": {"users": 10000, "buckets": 5000, "sg_rules": 100000},
+}
+# ------------------------------------------
+
+ACCOUNT = "123456789012"
+POLICIES = [f"arn:aws:iam::aws:policy/{p}" for p in (
+    "ReadOnlyAccess", "SecurityAudit", "AmazonS3FullAccess", "AmazonEC2ReadOnlyAccess", "PowerUserAccess")]
+
+
+# --- synthetic data ---
+def _rule(rnd: random.Random, gid: str) -> Dict[str, Any]:
+    if rnd.random() < 0.2:
+        return {"Desc": None, "FromPort": None, "Protocol": "-1", "SourceGroupId": gid, "ToPort": None}
+    port = rnd.choice((22, 80, 443, 3306, 5432, 6379, 8080)) if rnd.random() < 0.7 else rnd.randrange(1024, 65535)
+    return {
+        "CidrIp": f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.0/24", "Desc": None,
+        "FromPort": port, "Protocol": "tcp", "ToPort": port,
+    }
+
+
+def _bucket(rnd: random.Random, i: int) -> Dict[str, Any]:
+    name = f"synthetic-bucket-{i:06d}"
+    return {
+        "Encryption": {"Rules": [{"ApplyServerSideEncryptionByDefault": {"SSEAlgorithm": "AES256"},
+                                  "BucketKeyEnabled": True}]},
+        "Location": rnd.choice(("us-east-1", "us-east-2", "us-west-2", "eu-west-1")),
+        "Name": name,
+        "Policy": {
+            "Statement": [
+                {
+                    "Action": rnd.choice(("s3:GetObject", "s3:PutObject", "s3:*")),
+                    "Effect": "Allow",
+                    "Principal": {"AWS": f"arn:aws:iam::{ACCOUNT}:user/user-{rnd.randrange(10 ** 5):05d}"},
+                    "Resource": [f"arn:aws:s3:::{name}", f"arn:aws:s3:::{name}/*"],
+                    "Sid": f"Stmt{s}",
+                }
+                for s in range(rnd.randint(1, 4))
+            ],
+            "Version": "2012-10-17",
+        },
+        "PublicAccessBlock": {"BlockPublicAcls": True, "BlockPublicPolicy": True,
+                              "IgnorePublicAcls": True, "RestrictPublicBuckets": True},
+        "Versioning": {"Status": rnd.choice(("Enabled", "Suspended"))},
+    }
+
+
+def synth_snapshot(users: int, buckets: int, sg_rules: int, seed: int = 0) -> Dict[str, Any]:
+    """A snapshot shaped like enumerate_baseline output, at the given scale."""
+    rnd = random.Random(seed)
+    sgs = []
+    for g in range(max(1, sg_rules // RULES_PER_SG)):
+        gid = f"sg-{g:017x}"
+        n = min(RULES_PER_SG, sg_rules - g * RULES_PER_SG)
+        sgs.append({
+            "Description": f"synthetic group {g}", "GroupId": gid, "GroupName": f"group-{g}",
+            "InboundRules": [_rule(rnd, gid) for _ in range(max(0, n - 1))],
+            "OutboundRules": [{"CidrIp": "0.0.0.0/0", "Desc": None, "FromPort": None, "Protocol": "-1", "ToPort": None}],
+            "Tags": {}, "VpcId": f"vpc-{g % 16:017x}",
+        })
+    return {
+        "ec2": {"SecurityGroups": sgs},
+        "iam": {"Users": [
+            {
+                "Arn": f"arn:aws:iam::{ACCOUNT}:user/user-{u:05d}",
+                "AttachedPolicies": sorted(rnd.sample(POLICIES, rnd.randint(0, 2))),
+                "CreateDate": "2025-01-01T00:00:00Z",
+                "Groups": [],
+                "InlinePolicies": [f"inline-{u}"] if rnd.random() < 0.1 else [],
+                "UserName": f"user-{u:05d}",
+            }
+            for u in range(users)
+        ]},
+        "identity": {"account_id": ACCOUNT, "arn": f"arn:aws:iam::{ACCOUNT}:user/bench", "user_id": "AIDABENCH"},
+        "meta": {"captured_at_utc": "2026-01-01T00-00-00Z", "service_versions": {"boto3": "synthetic"}},
+        "s3": {"Buckets": [_bucket(rnd, b) for b in range(buckets)]},
+    }
+
+
+def drift(snapshot: Dict[str, Any], rate: float, seed: int = 1) -> Dict[str, Any]:
+    """
+    Copy of snapshot where about `rate` of the resources in each section are
+    modified, plus rate/10 added and rate/10 removed.
+    """
+    rnd = random.Random(seed)
+    new = copy.deepcopy(snapshot)
+    new["meta"]["captured_at_utc"] = "2026-01-01T01-00-00Z"
+
+    users = new["iam"]["Users"]
+    for u in users:
+        if rnd.random() < rate:
+            u["AttachedPolicies"] = sorted(set(u["AttachedPolicies"]) ^ {rnd.choice(POLICIES)})
+    buckets = new["s3"]["Buckets"]
+    for b in buckets:
+        if rnd.random() < rate:
+            b["Policy"]["Statement"][0]["Action"] = "s3:*" if b["Policy"]["Statement"][0]["Action"] != "s3:*" else "s3:GetObject"
+    sgs = new["ec2"]["SecurityGroups"]
+    for sg in sgs:
+        if rnd.random() < rate:
+            sg["InboundRules"].append({"CidrIp": "0.0.0.0/0", "Desc": None, "FromPort": 22, "Protocol": "tcp", "ToPort": 22})
+
+    for items, make in ((users, lambda i: {**users[0], "UserName": f"new-user-{i}"}),
+                        (buckets, lambda i: _bucket(rnd, 900000 + i)),
+                        (sgs, lambda i: {**sgs[0], "GroupId": f"sg-new{i:013x}"})):
+        if not items:
+            continue
+        n = int(len(items) * rate / 10)
+        for i in sorted(rnd.sample(range(len(items)), min(n, len(items))), reverse=True):
+            del items[i]
+        items.extend(make(i) for i in range(n))
+    return new
+
+
+def resource_count(snapshot: Dict[str, Any]) -> int:
+    return (len(snapshot["iam"]["Users"]) + len(snapshot["s3"]["Buckets"])
+            + sum(1 + len(sg["InboundRules"]) + len(sg["OutboundRules"]) for sg in snapshot["ec2"]["SecurityGroups"]))
+
+
+# --- measurement ---
+def measure(fn: Callable[[], Any], repeat: int, setup: Callable[[], None] = None) -> Dict[str, Any]:
+    """Wall time over `repeat` runs, then one more run under tracemalloc for the peak."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"wall_s": {"min": min(times), "median": statistics.median(times), "runs": len(times)}, "peak_bytes": peak}
+
+
+def with_throughput(result: Dict[str, Any], amount: float, unit: str) -> Dict[str, Any]:
+    result["throughput"] = {"unit": unit, "value": amount / result["wall_s"]["min"] if result["wall_s"]["min"] else None}
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synth_log(path: str, report: str, blocks: int):
+    """A realtime_monitor.log with `blocks` manual compare blocks separated by monitor chatter."""
+    chatter = "".join(f"[2026-01-01 00:00:{s:02d}] Captured snapshot: baseline_2026-01-01T00-00-{s:02d}Z.json\n"
+                      for s in range(20))
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(blocks):
+            f.write(chatter)
+            f.write(f"\n[manual compare] Baseline.json vs baseline_synthetic_{i:04d}.json\n")
+            f.write(report)
+            f.write("\nFound 1 CloudTrail event(s) related to the drift:\n"
+                    "  - 2026-01-01 00:30:00+00:00 AuthorizeSecurityGroupIngress by bench from 10.0.0.1\n")
+
+
+def run(args) -> Dict[str, Any]:
+    scale = dict(SCALES[args.scale])
+    for k in scale:
+        if getattr(args, k) is not None:
+            scale[k] = getattr(args, k)
+    results: Dict[str, Any] = {}
+
+    def bench(name: str, fn, setup=None) -> Dict[str, Any]:
+        print(f"  {name} ...", end="", flush=True)
+        results[name] = measure(fn, args.repeat, setup)
+        print(f" {results[name]['wall_s']['min'] * 1000:.1f} ms, peak {results[name]['peak_bytes'] / 1e6:.1f} MB")
+        return results[name]
+
+    print(f"Generating {scale} (drift {args.drift}, seed {args.seed})")
+    t0 = time.perf_counter()
+    old = synth_snapshot(seed=args.seed, **scale)
+    new = drift(old, args.drift, seed=args.seed + 1)
+    n = resource_count(old)
+    print(f"  {n} resources in {time.perf_counter() - t0:.1f}s")
+
+    with tempfile.TemporaryDirectory(prefix="drift-bench-") as tmp:
+        written = {}
+
+        def save():
+            written["name"] = write_snapshot(new, tmp)
+
+        def clean():
+            for f in os.listdir(tmp):
+                os.remove(os.path.join(tmp, f))
+
+        with_throughput(bench("snapshot_save", save, setup=clean), n, "resources/s")
+        new_path = os.path.join(tmp, written["name"])
+        size = os.path.getsize(new_path)
+        with_throughput(bench("snapshot_load", lambda: load(new_path)), size / 1e6, "MB/s")
+        results["snapshot_load"]["bytes"] = size
+
+        diff = diff_snapshots(old, new)
+        with_throughput(bench("diff", lambda: diff_snapshots(old, new)), n, "resources/s")
+        results["diff"]["changes"] = len(diff["changes"])
+        report = render_report(diff)
+        with_throughput(bench("render_report", lambda: render_report(diff)), len(diff["changes"]), "changes/s")
+
+        # Log parsing goes through the app's parser (needs Flask importable)
+        try:
+            import app as webapp
+        except ImportError as e:
+            print(f"  log parsing skipped: {e}")
+        else:
+            log_path = os.path.join(tmp, "realtime_monitor.log")
+            synth_log(log_path, report, args.log_blocks)
+            log_size = os.path.getsize(log_path)
+            with_throughput(bench("log_latest_cold", lambda: webapp.LogCache().latest(log_path)),
+                            log_size / 1e6, "MB/s")
+            with_throughput(bench("log_tail", lambda: webapp.tail_text(log_path, 200)), 200, "lines/s")
+            results["log_latest_cold"]["bytes"] = log_size
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "scale": scale, "drift": args.drift, "seed": args.seed, "repeat": args.repeat,
+            "resources": n,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float) -> int:
+    """Print min wall time / peak memory deltas; returns 1 if any step regressed beyond threshold %."""
+    with open(old_path, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        b = json.load(f)
+    if a["meta"]["scale"] != b["meta"]["scale"]:
+        print(f"warning: different scales {a['meta']['scale']} vs {b['meta']['scale']}")
+    regressed = False
+    print(f"{'step':<18} {'old ms':>10} {'new ms':>10} {'time':>8} {'old MB':>9} {'new MB':>9} {'mem':>8}")
+    for name in sorted(set(a["results"]) & set(b["results"])):
+        ra, rb = a["results"][name], b["results"][name]
+        ta, tb = ra["wall_s"]["min"], rb["wall_s"]["min"]
+        ma, mb = ra["peak_bytes"], rb["peak_bytes"]
+        dt = (tb - ta) / ta * 100 if ta else 0.0
+        dm = (mb - ma) / ma * 100 if ma else 0.0
+        flag = " <-- regression" if dt > threshold or dm > threshold else ""
+        regressed = regressed or bool(flag)
+        print(f"{name:<18} {ta * 1000:>10.1f} {tb * 1000:>10.1f} {dt:>+7.1f}% {ma / 1e6:>9.1f} {mb / 1e6:>9.1f} {dm:>+7.1f}%{flag}")
+    return 1 if regressed else 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark snapshot save/load, diff and log parsing on synthetic data")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("run", "generate"):
+        p = sub.add_parser(name)
+        p.add_argument("--scale", choices=sorted(SCALES), default="small")
+        p.add_argument("--users", type=int)
+        p.add_argument("--buckets", type=int)
+        p.add_argument("--sg-rules", dest="sg_rules", type=int)
+        p.add_argument("--drift", type=float, default=0.01, help="fraction of resources modified (default 0.01)")
+        p.add_argument("--seed", type=int, default=0)
+    run_p = sub.choices["run"]
+    run_p.add_argument("--repeat", type=int, default=3)
+    run_p.add_argument("--log-blocks", type=int, default=LOG_BLOCKS)
+    run_p.add_argument("--out", default=RESULTS_DIR, help="directory for the results JSON")
+    sub.choices["generate"].add_argument("--out", required=True, help="directory for the two snapshots")
+    p = sub.add_parser("compare")
+    p.add_argument("old")
+    p.add_argument("new")
+    p.add_argument("--threshold", type=float, default=10.0, help="percent slower / larger that counts as a regression")
+    args = ap.parse_args()
+
+    if args.cmd == "compare":
+        sys.exit(compare(args.old, args.new, args.threshold))
+
+    if args.cmd == "generate":
+        scale = {k: getattr(args, k) if getattr(args, k) is not None else v for k, v in SCALES[args.scale].items()}
+        os.makedirs(args.out, exist_ok=True)
+        old = synth_snapshot(seed=args.seed, **scale)
+        for fname, snap in (("Baseline.json", old), ("baseline_synthetic.json", drift(old, args.drift, args.seed + 1))):
+            with open(os.path.join(args.out, fname), "w", encoding="utf-8") as f:
+                json.dump(snap, f, indent=2, sort_keys=True)
+            print(f"Wrote {os.path.join(args.out, fname)}")
+        return
+
+    result = run(args)
+    os.makedirs(args.out, exist_ok=True)
+    commit = (result["meta"]["commit"] or "nocommit")[:10]
+    path = os.path.join(args.out, f"{result['meta']['created_at'].replace(':', '-')}_{commit}_{args.scale}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
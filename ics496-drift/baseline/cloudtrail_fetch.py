@@ -1,7 +1,117 @@
 import boto3
 import json
+from itertools import islice
 from botocore.exceptions import ClientError
-from typing import List, Dict
+from typing import Callable, Dict, Iterator, List
+
+def iter_events(
+    start_time,
+    end_time,
+    keywords: List[str] = None,
+    event_names: List[str] = None,
+    resource_names: List[str] = None,
+    region_name: str = None,
+    page_size: int = 50,
+    next_token: str = None,
+    on_page: Callable[[Dict], None] = None,
+) -> Iterator[Dict]:
+    """
+    Lazily yield CloudTrail events in the given time window, one page at a time.
+    - keywords: optional strings to search for (case-insensitive) in the raw CloudTrailEvent JSON;
+      events that don't match are skipped without being parsed
+    - event_names: optional event names (e.g., ["PutUserPolicy"])
+    - resource_names: optional exact resource names/ids (e.g., ["sg-0123"]); when given together
+      with event_names, the lookup is by resource and event names are filtered client-side
+    - region_name: optional AWS region override (e.g., "us-east-2")
+    - next_token: resume token previously reported to on_page (opaque)
+    - on_page: called after each page's matches have been yielded, with {"page", "events",
+      "matched", "resume"}; "resume" is None once the last page has been read
+
+    Matches are deduplicated by eventID as they arrive. Stop iterating to stop paging.
+    """
+    ct = boto3.client("cloudtrail", region_name=region_name)
+    kwords_lower = [k.lower() for k in (keywords or []) if k]
+    wanted_names = set(event_names or [])
+
+    # Build attribute batches; CloudTrail accepts only one LookupAttribute per call
+    if resource_names:
+        attr_batches = [{"AttributeKey": "ResourceName", "AttributeValue": r} for r in resource_names if r]
+        name_filter = wanted_names
+    else:
+        attr_batches = (
+            [{"AttributeKey": "EventName", "AttributeValue": en} for en in (event_names or [])]
+            or [None]
+        )
+        name_filter = set()
+
+    first_batch, token = 0, None
+    if next_token:
+        idx, _, token = next_token.partition(":")
+        first_batch, token = int(idx), (token or None)
+
+    seen = set()
+    page_no = 0
+    for b in range(first_batch, len(attr_batches)):
+        attr = attr_batches[b]
+        while True:
+            kwargs = {"StartTime": start_time, "EndTime": end_time, "MaxResults": page_size}
+            if attr:
+                kwargs["LookupAttributes"] = [attr]
+            if token:
+                kwargs["NextToken"] = token
+            page = ct.lookup_events(**kwargs)
+            token = page.get("NextToken")
+            page_no += 1
+
+            matched = []
+            for ev in page.get("Events", []):
+                if name_filter and ev.get("EventName") not in name_filter:
+                    continue
+                raw = ev.get("CloudTrailEvent", "{}")
+                # Case-insensitive contains, checked before paying for json.loads
+                if kwords_lower:
+                    blob = raw.lower()
+                    if not any(kw in blob for kw in kwords_lower):
+                        continue
+                # LookupEvents always carries EventId: a repeat is dropped before it is parsed
+                key = ev.get("EventId")
+                if key and key in seen:
+                    continue
+                m = _to_match(ev, raw)
+                key = key or m.get("eventID") or (m.get("eventTime"), m.get("eventName"), m.get("sourceIPAddress"))
+                if key in seen:
+                    continue
+                seen.add(key)
+                matched.append(m)
+
+            for m in matched:
+                yield m
+            # Only once the page's matches have all been consumed: a caller that saved an
+            # earlier token and stopped mid-page re-reads this page instead of skipping it
+            if on_page:
+                more = token or b + 1 < len(attr_batches)
+                resume = f"{b if token else b + 1}:{token or ''}" if more else None
+                on_page({"page": page_no, "events": len(page.get("Events", [])), "matched": len(matched), "resume": resume})
+            if not token:
+                break
+
+
+def _to_match(ev: Dict, raw: str) -> Dict:
+    try:
+        ev_json = json.loads(raw)
+    except Exception:
+        ev_json = {}
+    return {
+        "eventID": ev_json.get("eventID") or ev.get("EventId"),
+        "eventTime": ev_json.get("eventTime") or ev.get("EventTime"),
+        "eventName": ev_json.get("eventName") or ev.get("EventName"),
+        "userIdentity": ev_json.get("userIdentity"),
+        "sourceIPAddress": ev_json.get("sourceIPAddress"),
+        "userAgent": ev_json.get("userAgent"),
+        "resources": ev_json.get("resources") or ev.get("Resources"),
+        "raw": ev_json or raw,  # keep parsed if possible
+    }
+
 
 def find_events_for_keywords(
     keywords: List[str],
@@ -19,68 +129,35 @@ def find_events_for_keywords(
     - max_results: soft cap on returned matches
     - region_name: optional AWS region override (e.g., "us-east-2")
     """
-    ct = boto3.client("cloudtrail", region_name=region_name)
-    matches: List[Dict] = []
-
-    # Normalize keywords (case-insensitive match)
-    kwords = [k for k in (keywords or []) if k]
-    kwords_lower = [k.lower() for k in kwords]
-
-    # Build attribute batches; CloudTrail accepts only one LookupAttribute per call
-    attr_batches = (
-        [{"AttributeKey": "EventName", "AttributeValue": en} for en in (event_names or [])]
-        or [None]
-    )
-
+    if not any(keywords or []):
+        return []
     try:
-        for attr in attr_batches:
-            # Use paginator so we don't manually juggle NextToken
-            paginator = ct.get_paginator("lookup_events")
-            page_iter = paginator.paginate(
-                StartTime=start_time,
-                EndTime=end_time,
-                **({"LookupAttributes": [attr]} if attr else {}),
-                PaginationConfig={"PageSize": 50},
-            )
-
-            for page in page_iter:
-                for ev in page.get("Events", []):
-                    raw = ev.get("CloudTrailEvent", "{}")
-                    try:
-                        ev_json = json.loads(raw)
-                    except Exception:
-                        ev_json = {}
-
-                    # Case-insensitive contains
-                    blob = raw.lower()
-                    if any(kw in blob for kw in kwords_lower):
-                        matches.append({
-                            "eventTime": ev_json.get("eventTime") or ev.get("EventTime"),
-                            "eventName": ev_json.get("eventName") or ev.get("EventName"),
-                            "userIdentity": ev_json.get("userIdentity"),
-                            "sourceIPAddress": ev_json.get("sourceIPAddress"),
-                            "userAgent": ev_json.get("userAgent"),
-                            "resources": ev_json.get("resources") or ev.get("Resources"),
-                            "raw": ev_json or raw,  # keep parsed if possible
-                        })
-                        if len(matches) >= max_results:
-                            return _dedupe_matches(matches)
-
+        return list(islice(
+            iter_events(start_time, end_time, keywords=keywords, event_names=event_names, region_name=region_name),
+            max_results,
+        ))
     except ClientError as e:
         # Re-raise so caller can log/handle
         raise
 
-    return _dedupe_matches(matches)
 
+def find_events_for_resources(
+    resources: List[str],
+    start_time,
+    end_time,
+    event_names: List[str] = None,
+    max_results: int = 200,
+    region_name: str = None,
+) -> List[Dict]:
+    """
+    Lookup CloudTrail events by exact ResourceName (one LookupEvents query per
+    resource) and keep only the given event names, if any.
+    """
+    resources = [r for r in (resources or []) if r]
+    if not resources:
+        return []
+    return list(islice(
+        iter_events(start_time, end_time, event_names=event_names, resource_names=resources, region_name=region_name),
+        max_results,
+    ))
 
-def _dedupe_matches(matches: List[Dict]) -> List[Dict]:
-    """Deduplicate by (eventTime, eventName, sourceIPAddress)."""
-    seen = set()
-    out = []
-    for m in matches:
-        key = (m.get("eventTime"), m.get("eventName"), m.get("sourceIPAddress"))
-        if key in seen:
-            continue
-        seen.add(key)
-        out.append(m)
-    return out
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Offline CloudTrail log archive ingestion.
+
+Walks a directory tree of CloudTrail log files synced from the delivery bucket
+(`AWSLogs/<account>/CloudTrail/<region>/YYYY/MM/DD/*.json.gz`), decodes files
+in parallel worker processes, keeps only security-relevant write events and
+loads them into the local event store (event_store.py).
+
+Files already ingested (same path, size and mtime) are skipped, so re-running
+against the same tree only picks up newly synced files. Ingested events are
+marked as archive history, so the live cache's retention
+(DRIFT_EVENT_RETENTION_DAYS) doesn't apply to them: they are kept for
+DRIFT_ARCHIVE_RETENTION_DAYS (forever by default). With an archive retention
+set, records already past it are skipped at decode time rather than stored
+and then pruned.
+
+Usage:
+  python cloudtrail_ingest.py <log_dir> [--workers 4] [--all-events]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from event_store import EventStore, fmt_time
+
+log = logging.getLogger("drift.ingest")
+
+UTC = timezone.utc
+
+# Services whose write calls can change the posture we snapshot
+SECURITY_SOURCES = {
+    "iam.amazonaws.com",
+    "s3.amazonaws.com",
+    "ec2.amazonaws.com",
+    "sts.amazonaws.com",
+    "kms.amazonaws.com",
+    "cloudtrail.amazonaws.com",
+    "lambda.amazonaws.com",
+    "rds.amazonaws.com",
+    "organizations.amazonaws.com",
+    "config.amazonaws.com",
+    "guardduty.amazonaws.com",
+}
+READ_PREFIXES = ("Get", "List", "Describe", "Lookup", "Head", "Search", "Check")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ct_ingested_files (
+    path        TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    events      INTEGER NOT NULL,
+    ingested_at TEXT NOT NULL
+);
+"""
+
+
+def is_security_write(rec: Dict) -> bool:
+    """True for write (non read-only) calls against security-relevant services."""
+    if rec.get("eventSource") not in SECURITY_SOURCES:
+        return False
+    ro = rec.get("readOnly")
+    if ro is not None:
+        return not ro
+    return not (rec.get("eventName") or "").startswith(READ_PREFIXES)
+
+
+def decode_file(path: str, all_events: bool = False, cutoff: str = None) -> Tuple[str, List[Dict]]:
+    """Worker: decompress one log file and return (path, kept records); records before cutoff are dropped."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        doc = json.load(f)
+    recs = doc.get("Records") or []
+    if not all_events:
+        recs = [r for r in recs if is_security_write(r)]
+    if cutoff:
+        # Same string comparison EventStore.prune uses (eventTime is ISO 8601 UTC)
+        recs = [r for r in recs if (r.get("eventTime") or "") >= cutoff]
+    return path, recs
+
+
+def iter_log_files(root: str) -> Iterator[Path]:
+    """Yield every *.json.gz under root (streamed, not collected up front)."""
+    for dirpath, _dirs, files in os.walk(root):
+        for fn in files:
+            if fn.endswith(".json.gz"):
+                yield Path(dirpath) / fn
+
+
+def pending_files(store: EventStore, root: str) -> Iterator[Tuple[str, int, float]]:
+    """Yield (path, size, mtime) for files not ingested yet, or changed since."""
+    store.conn.executescript(SCHEMA)
+    seen = {
+        row["path"]: (row["size"], row["mtime"])
+        for row in store.conn.execute("SELECT path, size, mtime FROM ct_ingested_files")
+    }
+    for p in iter_log_files(root):
+        st = p.stat()
+        key = str(p.resolve())
+        if seen.get(key) == (st.st_size, st.st_mtime):
+            continue
+        yield key, st.st_size, st.st_mtime
+
+
+def ingest(root: str, workers: int = None, all_events: bool = False, store: EventStore = None) -> Dict[str, int]:
+    """Ingest new archive files under root. Returns counters for reporting."""
+    own_store = store is None
+    store = store or EventStore()
+    stats = {"files": 0, "records": 0, "new_events": 0, "errors": 0}
+    workers = workers or os.cpu_count() or 1
+    # Records past the archive retention would be deleted by the next prune, and
+    # the file is never re-read once marked, so they are not stored in the first place
+    days = store.archive_retention_days
+    cutoff = fmt_time(datetime.now(UTC) - timedelta(days=days)) if days else None
+
+    def load(fut, path, size, mtime):
+        try:
+            path, recs = fut.result()
+        except Exception as e:
+            log.warning("Failed to decode log file %s: %s", path, e)
+            stats["errors"] += 1
+            return
+        added = store.add_records(recs, archive=True)
+        with store.conn:
+            store.conn.execute(
+                "INSERT INTO ct_ingested_files(path, size, mtime, events, ingested_at) "
+                "VALUES(?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET size = excluded.size, "
+                "mtime = excluded.mtime, events = excluded.events, ingested_at = excluded.ingested_at",
+                (path, size, mtime, len(recs), fmt_time(datetime.now(UTC))),
+            )
+        stats["files"] += 1
+        stats["records"] += len(recs)
+        stats["new_events"] += added
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Bounded number of files in flight so decoded records don't pile up
+            # faster than the single SQLite writer can load them.
+            inflight = deque()
+            for path, size, mtime in pending_files(store, root):
+                inflight.append((pool.submit(decode_file, path, all_events, cutoff), path, size, mtime))
+                if len(inflight) >= workers * 4:
+                    load(*inflight.popleft())
+            while inflight:
+                load(*inflight.popleft())
+        return stats
+    finally:
+        if own_store:
+            store.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ingest CloudTrail *.json.gz archives into the local event store")
+    ap.add_argument("log_dir")
+    ap.add_argument("--workers", type=int, default=None, help="decoder processes (default: CPU count)")
+    ap.add_argument("--all-events", action="store_true", help="keep read-only and non-security events too")
+    args = ap.parse_args()
+
+    if not Path(args.log_dir).is_dir():
+        print(f"Not a directory: {args.log_dir}")
+        raise SystemExit(1)
+    stats = ingest(args.log_dir, workers=args.workers, all_events=args.all_events)
+    print(
+        f"Ingested {stats['files']} file(s): {stats['records']} relevant record(s), "
+        f"{stats['new_events']} new event(s), {stats['errors']} error(s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
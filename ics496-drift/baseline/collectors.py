@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Declarative collectors and the engine that runs them.
+
+A collector (`Spec`) says what to call, not how: the list operation and the
+key its items come back under, how each item projects into a snapshot
+record, its identity field, and the per-item `Describe` calls that fill in
+the rest of the record. `run()` executes any spec the same way:
+
+  - pagination through botocore paginators, for the list call and for
+    paginated describe calls alike;
+  - per-item describe calls fanned out over a thread pool (one client per
+    service, shared; boto3 clients are thread-safe, sessions are not);
+  - a per-service token bucket (RATE_LIMITS) in front of every HTTP request
+    (each page, each botocore retry), hooked into the client's before-send;
+  - error classification: "missing" codes mean "not configured" and give the
+    describe's default, throttling is retried with backoff after botocore's
+    own retries, access denied / other errors either fail the collector
+    (required describes) or give the default and are reported.
+
+enumerate_baseline's IAM / S3 / EC2 collectors are specs; the extra ones
+below (IAM roles, KMS keys, CloudTrail trails, Lambda and RDS exposure) are
+opt-in via DRIFT_EXTRA_COLLECTORS=iam_roles,kms_keys,... since they need
+more permissions and make snapshots larger.
+
+Usage:
+  python collectors.py list
+  python collectors.py run kms_keys [--aws-profile prod] [--workers 16]
+"""
+import argparse
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+from tracing import span
+
+# ----------------- CONFIG -----------------
+DEFAULT_WORKERS = 8                   # concurrent describe calls per collector
+RATE_LIMITS = {                       # requests / second per service (None or absent = unlimited);
+    "iam": 40,                        # kept under the documented control-plane quotas so a
+    "kms": 50,                        # wide fan-out doesn't turn into a throttling storm
+    "lambda": 25,
+    "rds": 25,
+    "cloudtrail": 10,
+}
+THROTTLE_RETRIES = 2                  # engine-level retries after botocore gave up on a throttle
+EXTRA_COLLECTORS = [n for n in os.environ.get("DRIFT_EXTRA_COLLECTORS", "").split(",") if n]
+# ------------------------------------------
+
+MISSING, THROTTLED, DENIED, ERROR = "missing", "throttled", "denied", "error"
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "RequestLimitExceeded", "SlowDown", "RequestThrottled",
+}
+DENIED_CODES = {"AccessDenied", "AccessDeniedException", "UnauthorizedOperation", "AuthorizationError"}
+
+
+class Describe:
+    """One per-item call: record[field] = project(client.<op>(**params(item))), or default."""
+
+    def __init__(self, field: str, op: str, params: Callable[[Dict], Dict], project: Callable[[Dict], Any],
+                 default: Any = None, missing: Sequence[str] = (), paginate_key: str = None, required: bool = False):
+        self.field = field
+        self.op = op
+        self.params = params
+        self.project = project
+        self.default = default
+        self.missing = set(missing)
+        self.paginate_key = paginate_key       # result key merged across pages (paginated describes)
+        self.required = required               # errors other than "missing" fail the collector
+
+
+class Spec:
+    """A collector: section[key] = [project(item) + describes for item in <list_op> pages]."""
+
+    def __init__(self, name: str, section: str, key: str, service: str, list_op: str, list_key: str,
+                 id_field: str, project: Callable[[Dict], Dict], describes: Sequence[Describe] = (),
+                 finalize: Callable[[Dict], Dict] = None, list_params: Dict = None, optional: bool = False):
+        self.name = name
+        self.section = section
+        self.key = key
+        self.service = service
+        self.list_op = list_op
+        self.list_key = list_key
+        self.id_field = id_field
+        self.project = project
+        self.describes = list(describes)
+        self.finalize = finalize               # derived fields once every describe is in
+        self.list_params = list_params or {}
+        self.optional = optional               # a denied list call gives an empty section instead of failing
+
+
+def classify(e: ClientError, missing: Sequence[str] = ()) -> str:
+    code = e.response.get("Error", {}).get("Code", "")
+    if code in missing:
+        return MISSING
+    if code in THROTTLE_CODES:
+        return THROTTLED
+    if code in DENIED_CODES:
+        return DENIED
+    return ERROR
+
+
+class RateLimiter:
+    """Token bucket shared by every thread calling one service."""
+
+    def __init__(self, rate: Optional[float], burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = max(1.0, burst or rate or 1)
+        self.tokens = self.capacity
+        self.at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.at) * self.rate)
+                self.at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def limiter(service: str) -> RateLimiter:
+    with _LIMITERS_LOCK:
+        if service not in _LIMITERS:
+            _LIMITERS[service] = RateLimiter(RATE_LIMITS.get(service))
+        return _LIMITERS[service]
+
+
+def limited_client(session, service: str):
+    """A client whose every request (pages and retries included) first takes a token from limiter(service)."""
+    client = (session or boto3).client(service)
+    limit = limiter(service)
+    client.meta.events.register_first(f"before-send.{client.meta.service_model.service_id.hyphenize()}",
+                                      lambda **kwargs: limit.acquire(), unique_id="drift-rate-limit")
+    return client
+
+
+def _call(client, service: str, op: str, params: Dict, paginate_key: str = None) -> Dict:
+    """One logical call (all pages when paginate_key is set), throttles retried."""
+    for attempt in range(THROTTLE_RETRIES + 1):
+        try:
+            if paginate_key and client.can_paginate(op):
+                merged: List[Any] = []
+                for page in client.get_paginator(op).paginate(**params):
+                    merged.extend(page.get(paginate_key, []))
+                return {paginate_key: merged}
+            return getattr(client, op)(**params)
+        except ClientError as e:
+            if classify(e) != THROTTLED or attempt == THROTTLE_RETRIES:
+                raise
+            time.sleep(random.random() * 2 ** (attempt + 1))
+
+
+def _list(client, spec: Spec) -> List[Dict]:
+    if client.can_paginate(spec.list_op):
+        items: List[Dict] = []
+        for page in client.get_paginator(spec.list_op).paginate(**spec.list_params):
+            items.extend(page.get(spec.list_key, []))
+        return items
+    return _call(client, spec.service, spec.list_op, spec.list_params).get(spec.list_key, [])
+
+
+def run(spec: Spec, session=None, workers: int = DEFAULT_WORKERS,
+        errors: Optional[List[Dict]] = None) -> List[Dict[str, Any]]:
+    """
+    Execute a collector and return its records in list order. Non-fatal
+    problems are appended to `errors` as {collector, resource, op, class, code}.
+    """
+    errors = errors if errors is not None else []
+    client = limited_client(session, spec.service)
+    with span(f"list.{spec.name}"):
+        try:
+            items = _list(client, spec)
+        except ClientError as e:
+            if not spec.optional or classify(e) not in (DENIED, ERROR):
+                raise
+            errors.append({"collector": spec.name, "resource": None, "op": spec.list_op, "class": classify(e),
+                           "code": e.response.get("Error", {}).get("Code")})
+            return []
+    records = [spec.project(it) for it in items]
+
+    def describe(i: int, d: Describe) -> Tuple[int, str, Any]:
+        item, rid = items[i], records[i].get(spec.id_field)
+        with span(f"{spec.name}.{d.op}", resource=rid):
+            try:
+                resp = _call(client, spec.service, d.op, d.params(item), d.paginate_key)
+            except ClientError as e:
+                kind = classify(e, d.missing)
+                if kind == MISSING:
+                    return i, d.field, d.default
+                if d.required:
+                    raise
+                errors.append({"collector": spec.name, "resource": rid, "op": d.op, "class": kind,
+                               "code": e.response.get("Error", {}).get("Code")})
+                return i, d.field, d.default
+            return i, d.field, d.project(resp)
+
+    tasks = [(i, d) for i in range(len(items)) for d in spec.describes]
+    if tasks:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"collect-{spec.name}") as pool:
+            # Each task runs in a copy of our context so tracing spans land in the active trace
+            futures = [pool.submit(contextvars.copy_context().run, describe, i, d) for i, d in tasks]
+            for f in futures:
+                i, field, value = f.result()
+                records[i][field] = value
+    if spec.finalize:
+        records = [spec.finalize(r) for r in records]
+    return records
+
+
+# --- projections shared by the specs ---
+def _without_metadata(resp: Dict) -> Dict:
+    return {k: v for k, v in resp.items() if k != "ResponseMetadata"}
+
+
+def _policy(text: Optional[str]) -> Any:
+    return json.loads(text) if text else None
+
+
+def sg_rules(perms: List[Dict]) -> List[Dict]:
+    """Flatten EC2 IpPermissions into one rule per CIDR / IPv6 CIDR / referenced group."""
+    rules = []
+    for p in perms:
+        base = {"Protocol": p.get("IpProtocol"), "FromPort": p.get("FromPort"), "ToPort": p.get("ToPort")}
+        for r in p.get("IpRanges", []):
+            rules.append({**base, "CidrIp": r.get("CidrIp"), "Desc": r.get("Description")})
+        for r in p.get("Ipv6Ranges", []):
+            rules.append({**base, "CidrIpv6": r.get("CidrIpv6"), "Desc": r.get("Description")})
+        for r in p.get("UserIdGroupPairs", []):
+            rules.append({**base, "SourceGroupId": r.get("GroupId"), "Desc": r.get("Description")})
+    return rules
+
+
+def _public_statement(policy: Any) -> bool:
+    for st in (policy or {}).get("Statement", []):
+        principal = st.get("Principal")
+        if st.get("Effect") == "Allow" and (principal == "*" or (isinstance(principal, dict) and principal.get("AWS") == "*")):
+            return True
+    return False
+
+
+# --- core collectors (always on; see enumerate_baseline.COLLECTORS) ---
+IAM_USERS = Spec(
+    "iam_users", "iam", "Users", "iam", "list_users", "Users", "UserName",
+    project=lambda u: {
+        "UserName": u["UserName"],
+        "CreateDate": u["CreateDate"].strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "Arn": u["Arn"],
+    },
+    describes=[
+        Describe("Groups", "list_groups_for_user", lambda u: {"UserName": u["UserName"]},
+                 lambda r: [g["GroupName"] for g in r["Groups"]], [], paginate_key="Groups", required=True),
+        Describe("AttachedPolicies", "list_attached_user_policies", lambda u: {"UserName": u["UserName"]},
+                 lambda r: [p["PolicyArn"] for p in r["AttachedPolicies"]], [],
+                 paginate_key="AttachedPolicies", required=True),
+        Describe("InlinePolicies", "list_user_policies", lambda u: {"UserName": u["UserName"]},
+                 lambda r: list(r["PolicyNames"]), [], paginate_key="PolicyNames", required=True),
+    ],
+)
+
+S3_BUCKETS = Spec(
+    "s3_buckets", "s3", "Buckets", "s3", "list_buckets", "Buckets", "Name",
+    project=lambda b: {"Name": b["Name"]},
+    describes=[
+        Describe("Location", "get_bucket_location", lambda b: {"Bucket": b["Name"]},
+                 lambda r: r.get("LocationConstraint")),
+        Describe("Encryption", "get_bucket_encryption", lambda b: {"Bucket": b["Name"]},
+                 lambda r: r.get("ServerSideEncryptionConfiguration"),
+                 missing=["ServerSideEncryptionConfigurationNotFoundError"]),
+        Describe("Policy", "get_bucket_policy", lambda b: {"Bucket": b["Name"]},
+                 lambda r: _policy(r.get("Policy")), missing=["NoSuchBucketPolicy"]),
+        Describe("PublicAccessBlock", "get_public_access_block", lambda b: {"Bucket": b["Name"]},
+                 lambda r: r.get("PublicAccessBlockConfiguration"),
+                 missing=["NoSuchPublicAccessBlockConfiguration"]),
+        Describe("Versioning", "get_bucket_versioning", lambda b: {"Bucket": b["Name"]},
+                 _without_metadata, default={}),
+    ],
+)
+
+EC2_SECURITY_GROUPS = Spec(
+    "ec2_security_groups", "ec2", "SecurityGroups", "ec2", "describe_security_groups", "SecurityGroups", "GroupId",
+    project=lambda sg: {
+        "GroupId": sg.get("GroupId"),
+        "GroupName": sg.get("GroupName"),
+        "Description": sg.get("Description"),
+        "VpcId": sg.get("VpcId"),
+        "InboundRules": sg_rules(sg.get("IpPermissions", [])),
+        "OutboundRules": sg_rules(sg.get("IpPermissionsEgress", [])),
+        "Tags": {t["Key"]: t["Value"] for t in sg.get("Tags", [])} if sg.get("Tags") else {},
+    },
+)
+
+
+# --- extra collectors (opt-in) ---
+IAM_ROLES = Spec(
+    "iam_roles", "iam", "Roles", "iam", "list_roles", "Roles", "RoleName", optional=True,
+    project=lambda r: {
+        "RoleName": r["RoleName"],
+        "Arn": r["Arn"],
+        "CreateDate": r["CreateDate"].strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "AssumeRolePolicy": r.get("AssumeRolePolicyDocument"),
+    },
+    describes=[
+        Describe("AttachedPolicies", "list_attached_role_policies", lambda r: {"RoleName": r["RoleName"]},
+                 lambda resp: [p["PolicyArn"] for p in resp["AttachedPolicies"]], [], paginate_key="AttachedPolicies"),
+        Describe("InlinePolicies", "list_role_policies", lambda r: {"RoleName": r["RoleName"]},
+                 lambda resp: list(resp["PolicyNames"]), [], paginate_key="PolicyNames"),
+    ],
+)
+
+KMS_KEYS = Spec(
+    "kms_keys", "kms", "Keys", "kms", "list_keys", "Keys", "KeyId", optional=True,
+    project=lambda k: {"KeyId": k["KeyId"], "Arn": k.get("KeyArn")},
+    describes=[
+        Describe("Metadata", "describe_key", lambda k: {"KeyId": k["KeyId"]},
+                 lambda r: {f: r["KeyMetadata"].get(f) for f in
+                            ("Description", "Enabled", "KeyState", "KeyManager", "KeyUsage", "KeySpec")}),
+        Describe("Policy", "get_key_policy", lambda k: {"KeyId": k["KeyId"], "PolicyName": "default"},
+                 lambda r: _policy(r.get("Policy"))),
+        Describe("RotationEnabled", "get_key_rotation_status", lambda k: {"KeyId": k["KeyId"]},
+                 lambda r: r.get("KeyRotationEnabled"), missing=["UnsupportedOperationException"]),
+    ],
+)
+
+CLOUDTRAIL_TRAILS = Spec(
+    "cloudtrail_trails", "cloudtrail", "Trails", "cloudtrail", "describe_trails", "trailList", "TrailARN",
+    optional=True,
+    project=lambda t: {f: t.get(f) for f in (
+        "Name", "TrailARN", "HomeRegion", "S3BucketName", "IsMultiRegionTrail", "IncludeGlobalServiceEvents",
+        "LogFileValidationEnabled", "KmsKeyId", "IsOrganizationTrail")},
+    describes=[
+        Describe("IsLogging", "get_trail_status", lambda t: {"Name": t["TrailARN"]}, lambda r: r.get("IsLogging")),
+        Describe("EventSelectors", "get_event_selectors", lambda t: {"TrailName": t["TrailARN"]},
+                 lambda r: r.get("AdvancedEventSelectors") or r.get("EventSelectors") or []),
+    ],
+)
+
+LAMBDA_FUNCTIONS = Spec(
+    "lambda_functions", "lambda", "Functions", "lambda", "list_functions", "Functions", "FunctionName",
+    optional=True,
+    project=lambda f: {"FunctionName": f["FunctionName"], "Arn": f.get("FunctionArn"), "Runtime": f.get("Runtime"),
+                       "Role": f.get("Role")},
+    describes=[
+        Describe("Policy", "get_policy", lambda f: {"FunctionName": f["FunctionName"]},
+                 lambda r: _policy(r.get("Policy")), missing=["ResourceNotFoundException"]),
+        Describe("UrlAuthType", "get_function_url_config", lambda f: {"FunctionName": f["FunctionName"]},
+                 lambda r: r.get("AuthType"), missing=["ResourceNotFoundException"]),
+    ],
+    finalize=lambda f: dict(f, Public=_public_statement(f["Policy"]) or f["UrlAuthType"] == "NONE"),
+)
+
+RDS_INSTANCES = Spec(
+    "rds_instances", "rds", "DBInstances", "rds", "describe_db_instances", "DBInstances", "DBInstanceIdentifier",
+    optional=True,
+    project=lambda d: {
+        "DBInstanceIdentifier": d["DBInstanceIdentifier"],
+        "Engine": d.get("Engine"),
+        "PubliclyAccessible": d.get("PubliclyAccessible"),
+        "StorageEncrypted": d.get("StorageEncrypted"),
+        "VpcSecurityGroups": sorted(g["VpcSecurityGroupId"] for g in d.get("VpcSecurityGroups", [])),
+    },
+)
+
+EXTRAS = {s.name: s for s in (IAM_ROLES, KMS_KEYS, CLOUDTRAIL_TRAILS, LAMBDA_FUNCTIONS, RDS_INSTANCES)}
+SPECS = {s.name: s for s in (IAM_USERS, S3_BUCKETS, EC2_SECURITY_GROUPS)}
+SPECS.update(EXTRAS)
+
+
+def collect_extras(snapshot: Dict[str, Any], session=None, names: Sequence[str] = None, errors: List[Dict] = None):
+    """Run the opt-in collectors (EXTRA_COLLECTORS by default) into snapshot[section][key]."""
+    for name in (EXTRA_COLLECTORS if names is None else names):
+        spec = EXTRAS.get(name)
+        if spec is None:
+            raise ValueError(f"unknown collector {name!r} (choose from {', '.join(EXTRAS)})")
+        snapshot.setdefault(spec.section, {})[spec.key] = run(spec, session, errors=errors)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run declarative collectors")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    p = sub.add_parser("run")
+    p.add_argument("name", choices=sorted(SPECS))
+    p.add_argument("--aws-profile")
+    p.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = ap.parse_args()
+
+    if args.cmd == "list":
+        for name, spec in SPECS.items():
+            kind = "extra" if name in EXTRAS else "core"
+            calls = ", ".join([spec.list_op] + [d.op for d in spec.describes])
+            print(f"{name:<22} {kind:<6} {spec.section + '.' + spec.key:<22} {calls}")
+        return
+
+    session = boto3.session.Session(profile_name=args.aws_profile) if args.aws_profile else boto3.session.Session()
+    errors: List[Dict] = []
+    t0 = time.perf_counter()
+    records = run(SPECS[args.name], session, workers=args.workers, errors=errors)
+    print(json.dumps({"records": records, "errors": errors}, indent=2, default=str))
+    print(f"{len(records)} record(s) in {time.perf_counter() - t0:.2f}s", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Columnar export of snapshot history (Parquet, via pyarrow).
+
+Fleet-wide questions ("how many buckets across all accounts lost
+versioning this month?") shouldn't mean loading and walking every JSON
+snapshot. Each snapshot is flattened into four typed tables:
+
+  users              one row per IAM user
+  attached_policies  one row per (user, attached managed policy)
+  buckets            one row per S3 bucket (encryption, policy, PAB, versioning)
+  sg_rules           one row per security group rule, inbound and outbound
+
+written as one Parquet file per snapshot under a hive-style layout
+
+  <out>/<table>/account=<account>/date=<YYYY-MM-DD>/<snapshot>.parquet
+
+so a scan reads only the partitions and columns it needs. Exports are
+incremental: the monitor and the app export each snapshot as it is
+captured (when DRIFT_EXPORT_DIR is set), and `export` backfills whatever
+the manifest table hasn't seen. Most captures change nothing, so a snapshot
+whose rows hash the same as the account's previous export on the same day
+writes no files (its manifest row names the snapshot that holds the data in
+`same_as`); otherwise a 20-second monitor would leave thousands of tiny files
+a day. The first capture of each day is always written in full, so every
+date partition holds the account's complete state. The manifest is also
+exported, as a fifth table rewritten with each capture:
+
+  captures           one row per snapshot (content_hash, same_as, rows written)
+
+pyarrow is optional: without it the hooks are no-ops and the CLI says so.
+
+Usage:
+  python columnar_export.py export [--dir accounts/prod --account prod] [--out exports]
+  python columnar_export.py status [--out exports]
+  python columnar_export.py scan buckets --columns name,versioning --where account=prod [--limit 20]
+  python columnar_export.py scan sg_rules --where from_port=22 --where open_to_world=true
+  python columnar_export.py versioning-lost [--since 2025-11-01]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from db import connect
+from resource_history import SNAP_GLOBS
+
+# ----------------- CONFIG -----------------
+EXPORT_DIR = os.environ.get("DRIFT_EXPORT_DIR")     # unset = don't export as snapshots arrive
+DEFAULT_OUT = "exports"                             # CLI default
+COMPRESSION = "zstd"
+# ------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS columnar_exports (
+    out_dir     TEXT NOT NULL,
+    account     TEXT NOT NULL,
+    snapshot    TEXT NOT NULL,
+    captured_at TEXT,
+    rows        INTEGER NOT NULL,
+    content_hash TEXT,
+    same_as     TEXT,
+    exported_at REAL NOT NULL,
+    PRIMARY KEY (out_dir, account, snapshot)
+);
+"""
+
+TABLES = ("users", "attached_policies", "buckets", "sg_rules")
+CAPTURES = "captures"
+
+
+def _schemas() -> Dict[str, "pa.Schema"]:
+    ts = pa.timestamp("s", tz="UTC")
+    common = [("snapshot", pa.string()), ("captured_at", ts)]
+    return {
+        "users": pa.schema(common + [
+            ("user_name", pa.string()), ("arn", pa.string()), ("create_date", ts),
+            ("groups", pa.list_(pa.string())), ("attached_policy_count", pa.int32()),
+            ("inline_policies", pa.list_(pa.string())),
+        ]),
+        "attached_policies": pa.schema(common + [
+            ("user_name", pa.string()), ("policy_arn", pa.string()), ("aws_managed", pa.bool_()),
+        ]),
+        "buckets": pa.schema(common + [
+            ("name", pa.string()), ("location", pa.string()), ("sse_algorithm", pa.string()),
+            ("has_policy", pa.bool_()), ("public_policy", pa.bool_()),
+            ("block_public_acls", pa.bool_()), ("block_public_policy", pa.bool_()),
+            ("ignore_public_acls", pa.bool_()), ("restrict_public_buckets", pa.bool_()),
+            ("versioning", pa.string()), ("mfa_delete", pa.string()),
+        ]),
+        "sg_rules": pa.schema(common + [
+            ("group_id", pa.string()), ("group_name", pa.string()), ("vpc_id", pa.string()),
+            ("direction", pa.string()), ("protocol", pa.string()),
+            ("from_port", pa.int32()), ("to_port", pa.int32()),
+            ("cidr", pa.string()), ("cidr_ipv6", pa.string()), ("source_group_id", pa.string()),
+            ("description", pa.string()), ("open_to_world", pa.bool_()),
+        ]),
+        CAPTURES: pa.schema(common + [
+            ("content_hash", pa.string()), ("same_as", pa.string()), ("rows", pa.int64()),
+        ]),
+    }
+
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    """Snapshot timestamps ("2025-11-19T00-24-23Z") and IAM dates ("2025-09-17T20:11:05Z")."""
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%dT%H-%M-%SZ", "%Y-%m-%dT%H:%M:%SZ"):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+
+def _public(policy: Any) -> bool:
+    for st in (policy or {}).get("Statement", []):
+        principal = st.get("Principal")
+        if st.get("Effect") == "Allow" and (principal == "*" or (isinstance(principal, dict) and principal.get("AWS") == "*")):
+            return True
+    return False
+
+
+def flatten(snapshot: Dict[str, Any], name: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Snapshot -> {table: rows}; every row carries the snapshot name and capture time."""
+    captured = _parse_ts((snapshot.get("meta") or {}).get("captured_at_utc"))
+    base = {"snapshot": name, "captured_at": captured}
+    out: Dict[str, List[Dict[str, Any]]] = {t: [] for t in TABLES}
+
+    for u in (snapshot.get("iam") or {}).get("Users", []):
+        attached = u.get("AttachedPolicies") or []
+        out["users"].append(dict(base, user_name=u.get("UserName"), arn=u.get("Arn"),
+                                 create_date=_parse_ts(u.get("CreateDate")), groups=u.get("Groups") or [],
+                                 attached_policy_count=len(attached), inline_policies=u.get("InlinePolicies") or []))
+        for arn in attached:
+            out["attached_policies"].append(dict(base, user_name=u.get("UserName"), policy_arn=arn,
+                                                 aws_managed=arn.startswith("arn:aws:iam::aws:policy/")))
+
+    for b in (snapshot.get("s3") or {}).get("Buckets", []):
+        rules = (b.get("Encryption") or {}).get("Rules") or [{}]
+        pab = b.get("PublicAccessBlock") or {}
+        ver = b.get("Versioning") or {}
+        out["buckets"].append(dict(
+            base, name=b.get("Name"), location=b.get("Location"),
+            sse_algorithm=(rules[0].get("ApplyServerSideEncryptionByDefault") or {}).get("SSEAlgorithm"),
+            has_policy=b.get("Policy") is not None, public_policy=_public(b.get("Policy")),
+            block_public_acls=pab.get("BlockPublicAcls"), block_public_policy=pab.get("BlockPublicPolicy"),
+            ignore_public_acls=pab.get("IgnorePublicAcls"), restrict_public_buckets=pab.get("RestrictPublicBuckets"),
+            versioning=ver.get("Status"), mfa_delete=ver.get("MFADelete"),
+        ))
+
+    for sg in (snapshot.get("ec2") or {}).get("SecurityGroups", []):
+        for direction, key in (("in", "InboundRules"), ("out", "OutboundRules")):
+            for r in sg.get(key) or []:
+                out["sg_rules"].append(dict(
+                    base, group_id=sg.get("GroupId"), group_name=sg.get("GroupName"), vpc_id=sg.get("VpcId"),
+                    direction=direction, protocol=r.get("Protocol"), from_port=r.get("FromPort"),
+                    to_port=r.get("ToPort"), cidr=r.get("CidrIp"), cidr_ipv6=r.get("CidrIpv6"),
+                    source_group_id=r.get("SourceGroupId"), description=r.get("Desc"),
+                    open_to_world=r.get("CidrIp") == "0.0.0.0/0" or r.get("CidrIpv6") == "::/0",
+                ))
+    return out
+
+
+def content_hash(tables: Dict[str, List[Dict[str, Any]]]) -> str:
+    """Hash of flattened rows, ignoring which snapshot (and when) they came from."""
+    h = hashlib.sha256()
+    for table in TABLES:
+        for row in tables.get(table, []):
+            h.update(json.dumps([table, {k: v for k, v in row.items() if k not in ("snapshot", "captured_at")}],
+                                sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class ColumnarExporter:
+    def __init__(self, out_dir: str = DEFAULT_OUT, path=None):
+        if pa is None:
+            raise RuntimeError("columnar export needs pyarrow (pip install pyarrow)")
+        self.out_dir = os.path.abspath(out_dir)
+        self.schemas = _schemas()
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def exported(self, name: str, account: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM columnar_exports WHERE out_dir = ? AND account = ? AND snapshot = ?",
+            (self.out_dir, account, name)).fetchone() is not None
+
+    def add(self, snapshot: Dict[str, Any], name: str, account: str = "default") -> Optional[int]:
+        """
+        Write one snapshot's partitions; returns rows written (0 if its content is
+        unchanged since the account's previous export), or None if it was already exported.
+        """
+        if self.exported(name, account):
+            return None
+        captured_raw = (snapshot.get("meta") or {}).get("captured_at_utc")
+        captured = _parse_ts(captured_raw)
+        day = (captured.date() if captured else date.today()).isoformat()
+        stem = os.path.splitext(os.path.basename(name))[0]
+        tables = flatten(snapshot, name)
+        digest = content_hash(tables)
+        prev = self.conn.execute(
+            "SELECT captured_at, exported_at, content_hash, COALESCE(same_as, snapshot) AS holder "
+            "FROM columnar_exports WHERE out_dir = ? AND account = ? ORDER BY exported_at DESC LIMIT 1",
+            (self.out_dir, account)).fetchone()
+        # Only within a day: each date partition starts with a full export
+        same_as = prev["holder"] if prev and prev["content_hash"] == digest and _day(prev) == day else None
+        total = 0
+        for table, rows in tables.items() if same_as is None else ():
+            if rows:
+                self._write(table, account, day, stem, rows)
+                total += len(rows)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO columnar_exports(out_dir, account, snapshot, captured_at, rows, content_hash, "
+                "same_as, exported_at) VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.out_dir, account, name, captured_raw, total, digest, same_as, time.time()))
+        day_rows = [r for r in self.conn.execute(
+            "SELECT * FROM columnar_exports WHERE out_dir = ? AND account = ? AND (captured_at IS NULL "
+            "OR substr(captured_at, 1, 10) = ?) ORDER BY exported_at", (self.out_dir, account, day)) if _day(r) == day]
+        self._write(CAPTURES, account, day, CAPTURES, [
+            {"snapshot": r["snapshot"], "captured_at": _parse_ts(r["captured_at"]), "content_hash": r["content_hash"],
+             "same_as": r["same_as"], "rows": r["rows"]} for r in day_rows])
+        return total
+
+    def _write(self, table: str, account: str, day: str, stem: str, rows: List[Dict[str, Any]]):
+        part = os.path.join(self.out_dir, table, f"account={account}", f"date={day}")
+        os.makedirs(part, exist_ok=True)
+        dest = os.path.join(part, f"{stem}.parquet")
+        # Write then rename, so a concurrent scan never sees a half-written file
+        tmp = dest + ".tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=self.schemas[table]), tmp, compression=COMPRESSION)
+        os.replace(tmp, dest)
+
+    def export_dir(self, directory: str = ".", account: str = "default") -> Dict[str, Optional[int]]:
+        """Backfill every snapshot file in a directory not exported yet."""
+        paths = [p for pattern in SNAP_GLOBS for p in glob.glob(os.path.join(directory, pattern))]
+        done = {}
+        for path in sorted(paths, key=lambda p: os.path.basename(p).split("_", 1)[-1]):
+            name = os.path.basename(path)
+            if self.exported(name, account):
+                done[name] = None
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                done[name] = self.add(json.load(f), name, account)
+        return done
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [dict(r) for r in self.conn.execute(
+            "SELECT account, COUNT(*) AS snapshots, SUM(same_as IS NOT NULL) AS unchanged, SUM(rows) AS rows, "
+            "MIN(captured_at) AS first, "
+            "MAX(captured_at) AS last FROM columnar_exports WHERE out_dir = ? GROUP BY account ORDER BY account",
+            (self.out_dir,))]
+
+
+def _day(row) -> str:
+    """Date partition of a manifest row (capture date, else the local export date)."""
+    captured = _parse_ts(row["captured_at"])
+    return (captured.date() if captured else date.fromtimestamp(row["exported_at"])).isoformat()
+
+
+def dataset(out_dir: str, table: str) -> "ds.Dataset":
+    """A table as a hive-partitioned dataset (account and date become filterable columns)."""
+    if pa is None:
+        raise RuntimeError("columnar export needs pyarrow (pip install pyarrow)")
+    partitioning = ds.partitioning(pa.schema([("account", pa.string()), ("date", pa.string())]), flavor="hive")
+    return ds.dataset(os.path.join(out_dir, table), format="parquet", partitioning=partitioning,
+                      exclude_invalid_files=True)
+
+
+def where(d: "ds.Dataset", conditions: List[str]) -> Optional["pc.Expression"]:
+    """"col=value" conditions ANDed, each value cast to the column's type (account / date are strings)."""
+    flt = None
+    for cond in conditions:
+        col, sep, raw = cond.partition("=")
+        if not sep or col not in d.schema.names:
+            raise ValueError(f"bad condition {cond!r}: expected column=value with one of {', '.join(d.schema.names)}")
+        typ = d.schema.field(col).type
+        try:
+            value = pa.scalar(raw).cast(typ)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+            raise ValueError(f"bad condition {cond!r}: {raw!r} is not a {typ}: {e}")
+        expr = pc.field(col) == value
+        flt = expr if flt is None else flt & expr
+    return flt
+
+
+def versioning_lost(out_dir: str, since: Optional[str] = None) -> "pa.Table":
+    """
+    Buckets whose versioning was Enabled in an earlier snapshot and is not in
+    their latest one. With `since` (a YYYY-MM-DD), only the window from that
+    date on is walked, starting from each bucket's last state before it (read
+    from the account's last date partition before `since`, which holds a full export).
+    """
+    d = dataset(out_dir, "buckets")
+    flt = None
+    if since:
+        before: Dict[str, str] = {}
+        for frag in d.get_fragments(filter=pc.field("date") < since):
+            keys = ds.get_partition_keys(frag.partition_expression)
+            before[keys["account"]] = max(before.get(keys["account"], ""), keys["date"])
+        flt = pc.field("date") >= since
+        for account, day in before.items():
+            flt = flt | ((pc.field("account") == account) & (pc.field("date") == day))
+    t = d.to_table(columns=["account", "name", "captured_at", "versioning", "date"], filter=flt)
+    t = t.sort_by([("account", "ascending"), ("name", "ascending"), ("captured_at", "ascending")])
+    lost, was_enabled, prev = [], False, None
+    accounts, names, states, days = (t.column(c).to_pylist() for c in ("account", "name", "versioning", "date"))
+    captured = t.column("captured_at").to_pylist()
+    for i, key in enumerate(zip(accounts, names)):
+        if key != prev:
+            was_enabled, prev = False, key
+        if since and days[i] < since:
+            was_enabled = states[i] == "Enabled"       # starting point: the last state before the window
+        else:
+            was_enabled = was_enabled or states[i] == "Enabled"
+        last = i + 1 == len(names) or (accounts[i + 1], names[i + 1]) != key
+        if last and was_enabled and states[i] != "Enabled":
+            lost.append({"account": key[0], "name": key[1], "versioning": states[i], "captured_at": captured[i]})
+    return pa.Table.from_pylist(lost) if lost else pa.table({"account": [], "name": []})
+
+
+def export_snapshot(snapshot: Dict[str, Any], name: str, account: str = "default") -> Optional[int]:
+    """Export a freshly captured snapshot if DRIFT_EXPORT_DIR is set and pyarrow is available."""
+    if not EXPORT_DIR or pa is None:
+        return None
+    exporter = ColumnarExporter(EXPORT_DIR)
+    try:
+        return exporter.add(snapshot, name, account)
+    finally:
+        exporter.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Columnar (Parquet) export of snapshot history")
+    ap.add_argument("--out", default=EXPORT_DIR or DEFAULT_OUT)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("export", help="export snapshot files not exported yet")
+    p.add_argument("--dir", default=".")
+    p.add_argument("--account", default="default")
+    sub.add_parser("status", help="exported snapshots per account")
+    p = sub.add_parser("scan", help="read selected columns of one table")
+    p.add_argument("table", choices=TABLES + (CAPTURES,))
+    p.add_argument("--columns", help="comma-separated (default: all)")
+    p.add_argument("--where", action="append", default=[], help="column=value (repeatable)")
+    p.add_argument("--limit", type=int, default=20)
+    p = sub.add_parser("versioning-lost", help="buckets that had versioning enabled and no longer do")
+    p.add_argument("--since", help="YYYY-MM-DD (partition date)")
+    args = ap.parse_args()
+
+    if pa is None:
+        raise SystemExit("columnar export needs pyarrow (pip install pyarrow)")
+
+    if args.cmd in ("export", "status"):
+        exporter = ColumnarExporter(args.out)
+        try:
+            if args.cmd == "export":
+                for name, n in exporter.export_dir(args.dir, args.account).items():
+                    print(f"{name}: {'skipped' if n is None else f'{n} row(s)'}")
+            else:
+                for r in exporter.status():
+                    print(f"{r['account']:<16} {r['snapshots']:>5} snapshot(s) ({r['unchanged']} unchanged) "
+                          f"{r['rows']:>9} row(s)  {r['first']} .. {r['last']}")
+        finally:
+            exporter.close()
+        return
+
+    if args.cmd == "scan":
+        d = dataset(args.out, args.table)
+        try:
+            flt = where(d, args.where)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        columns = args.columns.split(",") if args.columns else None
+        t0 = time.perf_counter()
+        t = d.to_table(columns=columns, filter=flt)
+        for row in t.slice(0, args.limit).to_pylist():
+            print(row)
+        print(f"{t.num_rows} row(s) in {time.perf_counter() - t0:.3f}s")
+    elif args.cmd == "versioning-lost":
+        t = versioning_lost(args.out, args.since)
+        for row in t.to_pylist():
+            print(f"{row['account']:<16} {row['name']:<48} now {row['versioning'] or 'never set'} ({row['captured_at']})")
+        print(f"{t.num_rows} bucket(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,38 @@
+import argparse
 import json
+import os
 import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+from tracing import span
 
 def load(p: str) -> Dict[str, Any]:
     with open(p, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def header(t: str):
-    print("\n" + "="*80)
-    print(t)
-    print("="*80)
-
-def bullet(msg: str, level=1):
-    print(("  " * level) + f"- {msg}")
+def header(t: str, out: List[str] = None):
+    lines = ["", "="*80, t, "="*80]
+    if out is None:
+        print("\n".join(lines))
+    else:
+        out.extend(lines)
+
+def bullet(msg: str, level=1, out: List[str] = None):
+    line = ("  " * level) + f"- {msg}"
+    if out is None:
+        print(line)
+    else:
+        out.append(line)
+
+def change(section: str, resource: str, kind: str, field: str = None, old=None, new=None, **extra) -> Dict[str, Any]:
+    """One structured drift item. kind is added / removed / modified."""
+    rec = {"section": section, "resource": resource, "kind": kind, "field": field, "old": old, "new": new}
+    rec.update(extra)
+    return rec
 
 def to_tuple_rule(r: Dict[str, Any]) -> Tuple:
     # Normalize SG rules into comparable tuples
@@ -36,150 +55,342 @@ def compare_sets(name: str, a: List[Any], b: List[Any]):
         if added:  bullet(f"Added: {added}", level=0)
         if removed: bullet(f"Removed: {removed}", level=0)
 
-def compare_iam(a: dict, b: dict):
-    a_users = {u["UserName"]: u for u in a.get("Users", [])}
-    b_users = {u["UserName"]: u for u in b.get("Users", [])}
+def index_iam(a: dict) -> Dict[str, Tuple[frozenset, frozenset]]:
+    """{UserName: (attached policy set, inline policy set)} - the part of a user diff_iam compares."""
+    return {u["UserName"]: (frozenset(u.get("AttachedPolicies", [])), frozenset(u.get("InlinePolicies", [])))
+            for u in a.get("Users", [])}
 
-    added_users = sorted(set(b_users) - set(a_users))
-    removed_users = sorted(set(a_users) - set(b_users))
+def diff_iam_indexed(a_users: Dict[str, Tuple], b_users: Dict[str, Tuple]) -> List[Dict[str, Any]]:
+    changes = [change("iam", u, "added") for u in sorted(set(b_users) - set(a_users))]
+    changes += [change("iam", u, "removed") for u in sorted(set(a_users) - set(b_users))]
     changed_attached = []
     changed_inline = []
 
-    for uname in set(a_users) & set(b_users):
-        ap = set(a_users[uname].get("AttachedPolicies", []))
-        bp = set(b_users[uname].get("AttachedPolicies", []))
+    for uname in sorted(set(a_users) & set(b_users)):
+        ap, ai = a_users[uname]
+        bp, bi = b_users[uname]
         if ap != bp:
-            changed_attached.append((uname, sorted(list(ap)), sorted(list(bp))))
-
-        ai = set(a_users[uname].get("InlinePolicies", []))
-        bi = set(b_users[uname].get("InlinePolicies", []))
+            changed_attached.append(change("iam", uname, "modified", "AttachedPolicies", sorted(ap), sorted(bp)))
         if ai != bi:
-            changed_inline.append((uname, sorted(list(ai)), sorted(list(bi))))
-
-    if added_users or removed_users or changed_attached or changed_inline:
-        header("IAM changes")
-        for u in added_users:  bullet(f"User added: {u}")
-        for u in removed_users: bullet(f"User removed: {u}")
-        for uname, ap, bp in changed_attached:
-            bullet(f"Attached policies changed for {uname}:")
-            bullet(f"was: {ap}", level=2)
-            bullet(f"now: {bp}", level=2)
-        for uname, ai, bi in changed_inline:
-            bullet(f"Inline policies changed for {uname}:")
-            bullet(f"was: {ai}", level=2)
-            bullet(f"now: {bi}", level=2)
+            changed_inline.append(change("iam", uname, "modified", "InlinePolicies", sorted(ai), sorted(bi)))
+
+    return changes + changed_attached + changed_inline
+
+def diff_iam(a: dict, b: dict) -> List[Dict[str, Any]]:
+    return diff_iam_indexed(index_iam(a), index_iam(b))
+
+def render_iam(changes: List[Dict[str, Any]], out: List[str] = None):
+    if not changes:
+        return
+    header("IAM changes", out)
+    for c in changes:
+        if c["kind"] == "added":
+            bullet(f"User added: {c['resource']}", out=out)
+        elif c["kind"] == "removed":
+            bullet(f"User removed: {c['resource']}", out=out)
+        else:
+            label = "Attached" if c["field"] == "AttachedPolicies" else "Inline"
+            bullet(f"{label} policies changed for {c['resource']}:", out=out)
+            bullet(f"was: {c['old']}", level=2, out=out)
+            bullet(f"now: {c['new']}", level=2, out=out)
 
+def compare_iam(a: dict, b: dict):
+    changes = diff_iam(a, b)
+    render_iam(changes)
+    return changes
 
-def compare_s3(a: Dict[str, Any], b: Dict[str, Any]):
-    a_buckets = {x["Name"]: x for x in a.get("Buckets", [])}
-    b_buckets = {x["Name"]: x for x in b.get("Buckets", [])}
-
-    added = sorted(set(b_buckets) - set(a_buckets))
-    removed = sorted(set(a_buckets) - set(b_buckets))
-    changed = []
 
-    for name in set(a_buckets) & set(b_buckets):
-        A = a_buckets[name]; B = b_buckets[name]
+def index_s3(a: Dict[str, Any]) -> Dict[str, Tuple]:
+    """{Name: (encryption, public access block, versioning status, policy)}, normalized as diff_s3 compares them."""
+    return {
+        x["Name"]: (x.get("Encryption") or {}, x.get("PublicAccessBlock") or {},
+                    (x.get("Versioning") or {}).get("Status", None), x.get("Policy"))
+        for x in a.get("Buckets", [])
+    }
 
-        # Helpers
-        a_enc = (A.get("Encryption") or {})
-        b_enc = (B.get("Encryption") or {})
-        a_pab = (A.get("PublicAccessBlock") or {})
-        b_pab = (B.get("PublicAccessBlock") or {})
-        a_ver = (A.get("Versioning") or {})
-        b_ver = (B.get("Versioning") or {})
+def diff_s3_indexed(a_buckets: Dict[str, Tuple], b_buckets: Dict[str, Tuple]) -> List[Dict[str, Any]]:
+    changes = [change("s3", n, "added") for n in sorted(set(b_buckets) - set(a_buckets))]
+    changes += [change("s3", n, "removed") for n in sorted(set(a_buckets) - set(b_buckets))]
 
-        diffs = []
+    for name in sorted(set(a_buckets) & set(b_buckets)):
+        a_enc, a_pab, a_status, a_pol = a_buckets[name]
+        b_enc, b_pab, b_status, b_pol = b_buckets[name]
 
         if a_enc != b_enc:
-            diffs.append(("Encryption", a_enc, b_enc))
+            changes.append(change("s3", name, "modified", "Encryption", a_enc, b_enc))
 
         if a_pab != b_pab:
-            diffs.append(("PublicAccessBlock", a_pab, b_pab))
+            changes.append(change("s3", name, "modified", "PublicAccessBlock", a_pab, b_pab))
 
         # Versioning normalizing (Status may be missing)
-        a_status = a_ver.get("Status", None)
-        b_status = b_ver.get("Status", None)
         if a_status != b_status:
-            diffs.append(("Versioning.Status", a_status, b_status))
+            changes.append(change("s3", name, "modified", "Versioning.Status", a_status, b_status))
 
         # Bucket policy can be large; compare structurally
-        a_pol = A.get("Policy")
-        b_pol = B.get("Policy")
         if a_pol != b_pol:
-            diffs.append(("BucketPolicy", a_pol, b_pol))
-
-        if diffs:
-            changed.append((name, diffs))
-
-    if added or removed or changed:
-        header("S3 changes")
-        for n in added:  bullet(f"Bucket added: {n}")
-        for n in removed: bullet(f"Bucket removed: {n}")
-        for name, diffs in changed:
-            bullet(f"Bucket modified: {name}")
-            for (field, old, new) in diffs:
-                bullet(f"{field} changed", level=2)
-                bullet(f"was: {old}", level=3)
-                bullet(f"now: {new}", level=3)
+            changes.append(change("s3", name, "modified", "BucketPolicy", a_pol, b_pol))
+
+    return changes
+
+def diff_s3(a: Dict[str, Any], b: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return diff_s3_indexed(index_s3(a), index_s3(b))
+
+def render_s3(changes: List[Dict[str, Any]], out: List[str] = None):
+    if not changes:
+        return
+    header("S3 changes", out)
+    current = None
+    for c in changes:
+        if c["kind"] == "added":
+            bullet(f"Bucket added: {c['resource']}", out=out)
+        elif c["kind"] == "removed":
+            bullet(f"Bucket removed: {c['resource']}", out=out)
+        else:
+            if c["resource"] != current:
+                current = c["resource"]
+                bullet(f"Bucket modified: {current}", out=out)
+            bullet(f"{c['field']} changed", level=2, out=out)
+            bullet(f"was: {c['old']}", level=3, out=out)
+            bullet(f"now: {c['new']}", level=3, out=out)
 
-def compare_ec2_sg(a: Dict[str, Any], b: Dict[str, Any]):
-    a_sgs = {x["GroupId"]: x for x in a.get("SecurityGroups", [])}
-    b_sgs = {x["GroupId"]: x for x in b.get("SecurityGroups", [])}
-
-    added = sorted(set(b_sgs) - set(a_sgs))
-    removed = sorted(set(a_sgs) - set(b_sgs))
-    changed = []
-
-    for gid in set(a_sgs) & set(b_sgs):
-        A = a_sgs[gid]; B = b_sgs[gid]
-        diffs = []
+def compare_s3(a: Dict[str, Any], b: Dict[str, Any]):
+    changes = diff_s3(a, b)
+    render_s3(changes)
+    return changes
+
+def index_ec2_sg(a: Dict[str, Any]) -> Dict[str, Tuple]:
+    """{GroupId: (group, inbound rule tuples, outbound rule tuples)} - rules normalized once."""
+    return {
+        x["GroupId"]: (x, frozenset(map(to_tuple_rule, x.get("InboundRules", []))),
+                       frozenset(map(to_tuple_rule, x.get("OutboundRules", []))))
+        for x in a.get("SecurityGroups", [])
+    }
+
+def diff_ec2_sg_indexed(a_sgs: Dict[str, Tuple], b_sgs: Dict[str, Tuple]) -> List[Dict[str, Any]]:
+    def sg_change(sgs, gid, kind, field=None, old=None, new=None):
+        sg = sgs[gid][0]
+        return change("ec2", gid, kind, field, old, new,
+                      name=sg.get("GroupName", "N/A"), desc=sg.get("Description", "N/A"))
+
+    changes = [sg_change(b_sgs, gid, "added") for gid in sorted(set(b_sgs) - set(a_sgs))]
+    changes += [sg_change(a_sgs, gid, "removed") for gid in sorted(set(a_sgs) - set(b_sgs))]
+
+    for gid in sorted(set(a_sgs) & set(b_sgs)):
+        A, A_in, A_out = a_sgs[gid]
+        B, B_in, B_out = b_sgs[gid]
 
         # Compare inbound
-        A_in = set(map(to_tuple_rule, A.get("InboundRules", [])))
-        B_in = set(map(to_tuple_rule, B.get("InboundRules", [])))
         if A_in != B_in:
-            diffs.append(("InboundRules", sorted(list(A_in)), sorted(list(B_in))))
+            changes.append(sg_change(a_sgs, gid, "modified", "InboundRules", sorted(A_in), sorted(B_in)))
 
         # Compare outbound
-        A_out = set(map(to_tuple_rule, A.get("OutboundRules", [])))
-        B_out = set(map(to_tuple_rule, B.get("OutboundRules", [])))
         if A_out != B_out:
-            diffs.append(("OutboundRules", sorted(list(A_out)), sorted(list(B_out))))
+            changes.append(sg_change(a_sgs, gid, "modified", "OutboundRules", sorted(A_out), sorted(B_out)))
 
         # Name/Desc/VPC changes (rare)
         for key in ("GroupName","Description","VpcId"):
             if A.get(key) != B.get(key):
-                diffs.append((key, A.get(key), B.get(key)))
-
-        if diffs:
-            changed.append((gid, diffs))
-
-    if added or removed or changed:
-        header("EC2 Security Group changes")
-        for gid in added:
-            sg = b_sgs[gid]
-            name = sg.get("GroupName", "N/A")
-            desc = sg.get("Description", "N/A")
-            bullet(f"SG added: {name} ({gid}) - {desc}")
-        for gid in removed:
-            sg = a_sgs[gid]
-            name = sg.get("GroupName", "N/A")
-            desc = sg.get("Description", "N/A")
-            bullet(f"SG removed: {name} ({gid}) - {desc}")
-        for gid, diffs in changed:
-            sg = a_sgs[gid]
-            name = sg.get("GroupName", "N/A")
-            desc = sg.get("Description", "N/A")
-            bullet(f"SG modified: {name} ({gid}) - {desc}")
-            for (field, old, new) in diffs:
-                bullet(f"{field} changed", level=2)
-                bullet(f"was: {old}", level=3)
-                bullet(f"now: {new}", level=3)
+                changes.append(sg_change(a_sgs, gid, "modified", key, A.get(key), B.get(key)))
+
+    return changes
+
+def diff_ec2_sg(a: Dict[str, Any], b: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return diff_ec2_sg_indexed(index_ec2_sg(a), index_ec2_sg(b))
+
+def render_ec2_sg(changes: List[Dict[str, Any]], out: List[str] = None):
+    if not changes:
+        return
+    header("EC2 Security Group changes", out)
+    current = None
+    for c in changes:
+        if c["kind"] == "added":
+            bullet(f"SG added: {c['name']} ({c['resource']}) - {c['desc']}", out=out)
+        elif c["kind"] == "removed":
+            bullet(f"SG removed: {c['name']} ({c['resource']}) - {c['desc']}", out=out)
+        else:
+            if c["resource"] != current:
+                current = c["resource"]
+                bullet(f"SG modified: {c['name']} ({current}) - {c['desc']}", out=out)
+            bullet(f"{c['field']} changed", level=2, out=out)
+            bullet(f"was: {c['old']}", level=3, out=out)
+            bullet(f"now: {c['new']}", level=3, out=out)
+
+def compare_ec2_sg(a: Dict[str, Any], b: Dict[str, Any]):
+    changes = diff_ec2_sg(a, b)
+    render_ec2_sg(changes)
+    return changes
+
+def _traced(section: str, fn, old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    with span(f"compare.{section}"):
+        return fn(old.get(section, {}), new.get(section, {}))
+
+DIFFS = {"iam": diff_iam, "s3": diff_s3, "ec2": diff_ec2_sg}
+# Per-section (indexer, indexed diff): diff_X(a, b) == diff_X_indexed(index_X(a), index_X(b)),
+# so a long-lived side (baseline_index.IndexedBaseline) is indexed once
+INDEXED = {
+    "iam": (index_iam, diff_iam_indexed),
+    "s3": (index_s3, diff_s3_indexed),
+    "ec2": (index_ec2_sg, diff_ec2_sg_indexed),
+}
+
+def diff_snapshots(old: Dict[str, Any], new: Dict[str, Any], sections: Sequence[str] = tuple(DIFFS)) -> Dict[str, Any]:
+    """Structured diff of two loaded snapshots: {"account_mismatch": bool, "changes": [...]}."""
+    changes: List[Dict[str, Any]] = []
+    for section in sections:
+        changes += _traced(section, DIFFS[section], old, new)
+    return {
+        "account_mismatch": old.get("identity", {}).get("account_id") != new.get("identity", {}).get("account_id"),
+        "changes": changes,
+    }
+
+def render_report(diff: Dict[str, Any]) -> str:
+    """Text report for a structured diff, identical to what main() prints."""
+    out: List[str] = []
+    if diff["account_mismatch"]:
+        header("WARNING", out)
+        bullet("Snapshots are from different AWS accounts!", out=out)
+    by_section = {"iam": [], "s3": [], "ec2": []}
+    for c in diff["changes"]:
+        by_section[c["section"]].append(c)
+    render_iam(by_section["iam"], out)
+    render_s3(by_section["s3"], out)
+    render_ec2_sg(by_section["ec2"], out)
+    out += ["", "Done."]
+    return "\n".join(out) + "\n"
+
+SECTION_TITLES = {"iam": "IAM changes", "s3": "S3 changes", "ec2": "EC2 Security Group changes"}
+NOUNS = {"iam": "User", "s3": "Bucket", "ec2": "SG"}
+
+def summarize(c: Dict[str, Any]) -> str:
+    """One-line description of a structured change (used by the dashboard)."""
+    noun = NOUNS.get(c["section"], c["section"])
+    what = c["resource"]
+    if c["section"] == "ec2" and c.get("name"):
+        what = f"{c['name']} ({c['resource']})"
+    if c["kind"] in ("added", "removed"):
+        return f"{noun} {c['kind']}: {what}"
+    return f"{noun} modified: {what} - {c['field']} was: {c['old']} now: {c['new']}"
+
+# --- batch mode: many (baseline, snapshot) pairs over a process pool ---
+_BASELINES: Dict[str, Dict[str, Any]] = {}
+_LAST_SNAPSHOT: Tuple[Optional[str], Optional[Dict[str, Any]]] = (None, None)
+
+def _init_batch_worker(baselines: Dict[str, Dict[str, Any]]):
+    """Pool initializer: each worker receives the loaded baselines once, not once per task."""
+    global _BASELINES
+    _BASELINES = baselines
+
+def _batch_task(index: int, baseline: str, snapshot: str, sections: Tuple[str, ...]):
+    from snapshot_index import open_snapshot   # snapshot_index -> resource_history -> drift_store -> here
+    global _LAST_SNAPSHOT
+    try:
+        # Section-split pairs can land on the same worker back to back; keep the last snapshot loaded
+        if _LAST_SNAPSHOT[0] != snapshot:
+            _LAST_SNAPSHOT = (snapshot, open_snapshot(snapshot))
+        # Lazily loaded: a section-split task parses only its own section of each file
+        base = _BASELINES[baseline] if baseline in _BASELINES else open_snapshot(baseline)
+        return index, sections, diff_snapshots(base, _LAST_SNAPSHOT[1], sections), None
+    except (OSError, ValueError) as e:
+        return index, sections, None, f"{type(e).__name__}: {e}"
+
+def compare_batch(pairs: Sequence[Tuple[str, str]], workers: int = None) -> List[Dict[str, Any]]:
+    """
+    Diff many (baseline path, snapshot path) pairs in a process pool and
+    return one result per pair, in input order:
+    {"baseline", "snapshot", "account_mismatch", "changes", "error"}.
+    A baseline used by several pairs is loaded once here and handed to the
+    workers by the pool initializer; one used once is loaded by its worker.
+    With fewer pairs than workers, pairs are split by section so a single
+    big comparison still uses every core.
+    """
+    workers = workers or os.cpu_count() or 1
+    split = len(pairs) < workers
+    uses = Counter(base for base, _ in pairs)
+    shared = {base for base, n in uses.items() if n > 1 or split}
+    baselines, errors = {}, {}
+    for base in shared:
+        try:
+            baselines[base] = load(base)
+        except (OSError, ValueError) as e:
+            errors[base] = f"{type(e).__name__}: {e}"
+    tasks = [(i, base, snap, (section,) if split else tuple(DIFFS))
+             for i, (base, snap) in enumerate(pairs) if base not in errors
+             for section in (DIFFS if split else [None])]
+
+    parts: Dict[int, Dict[Tuple[str, ...], Dict[str, Any]]] = {}
+    results = [{"baseline": b, "snapshot": s, "account_mismatch": False, "changes": [], "error": errors.get(b)}
+               for b, s in pairs]
+    if tasks:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_batch_worker,
+                                 initargs=(baselines,)) as pool:
+            futures = [pool.submit(_batch_task, *t) for t in tasks]
+            for f in futures:
+                index, sections, diff, error = f.result()
+                if error:
+                    results[index]["error"] = error
+                else:
+                    parts.setdefault(index, {})[sections] = diff
+    # Merge section parts back in the order diff_snapshots would have produced them
+    for index, by_sections in parts.items():
+        if results[index]["error"]:
+            continue
+        for sections in sorted(by_sections, key=lambda secs: list(DIFFS).index(secs[0])):
+            results[index]["changes"] += by_sections[sections]["changes"]
+            results[index]["account_mismatch"] = by_sections[sections]["account_mismatch"]
+    return results
+
+def read_pairs(path: str) -> List[Tuple[str, str]]:
+    """
+    Pairs file: one "<baseline.json> <snapshot.json>" per line; blank lines and # comments ignored.
+    Raises ValueError naming the file and line for a line without two paths.
+    """
+    pairs = []
+    with (sys.stdin if path == "-" else open(path, "r", encoding="utf-8")) as f:
+        for lineno, line in enumerate(f, 1):
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            if len(fields) < 2:
+                raise ValueError(f'{"<stdin>" if path == "-" else path}:{lineno}: expected "<baseline> <snapshot>", '
+                                 f"got {line.strip()!r}")
+            pairs.append((fields[0], fields[1]))
+    return pairs
+
+def batch_main(argv: List[str]):
+    ap = argparse.ArgumentParser(prog="compare_baseline.py", description="Batch compare over a process pool")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--batch", metavar="PAIRS", help='file of "<baseline> <snapshot>" lines ("-" = stdin)')
+    src.add_argument("--against", metavar="BASELINE", help="compare every SNAPSHOT against this baseline")
+    ap.add_argument("snapshots", nargs="*")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    ap.add_argument("--json", action="store_true", help="print structured results instead of reports")
+    args = ap.parse_args(argv)
+
+    try:
+        pairs = read_pairs(args.batch) if args.batch else [(args.against, s) for s in args.snapshots]
+    except (OSError, ValueError) as e:
+        ap.error(str(e))
+    t0 = time.perf_counter()
+    results = compare_batch(pairs, args.workers)
+    wall = time.perf_counter() - t0
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        for r in results:
+            header(f"{r['baseline']} -> {r['snapshot']}")
+            print(f"ERROR: {r['error']}\n" if r["error"] else render_report(r), end="")
+    print(f"\n{len(pairs)} pair(s), {sum(len(r['changes']) for r in results)} change(s), "
+          f"{sum(1 for r in results if r['error'])} error(s) in {wall:.2f}s", file=sys.stderr)
+    sys.exit(1 if any(r["error"] for r in results) else 0)
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1].startswith("--"):
+        batch_main(sys.argv[1:])
+        return
     if len(sys.argv) != 3:
         print("Usage: python compare_baseline.py <old_snapshot.json> <new_snapshot.json>")
+        print("       python compare_baseline.py --batch pairs.txt | --against <baseline.json> <snapshot.json>... "
+              "[--workers N] [--json]")
         sys.exit(1)
     old_path, new_path = sys.argv[1], sys.argv[2]
     if not Path(old_path).exists() or not Path(new_path).exists():
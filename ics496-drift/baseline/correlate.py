@@ -0,0 +1,134 @@
+"""
+Drift-to-CloudTrail correlation.
+
+Maps each structured change from compare_baseline.diff_snapshots to the exact
+resource it concerns (user name, bucket name, security group id) and to the
+API calls that can produce it, then looks up only those events inside the
+window between the two snapshots' capture times.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# Prefer the local indexed event cache; fall back to live LookupEvents by ResourceName
+try:
+    from event_store import EventStore, poll
+except Exception:
+    EventStore = None
+try:
+    from cloudtrail_fetch import find_events_for_resources
+except Exception:
+    find_events_for_resources = None
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+CAPTURE_FMT = "%Y-%m-%dT%H-%M-%SZ"   # meta.captured_at_utc in snapshots
+DEFAULT_LOOKBACK_MINUTES = 10        # when the older snapshot has no capture time
+WINDOW_SLACK_MINUTES = 2             # enumeration runs after captured_at is stamped
+# ------------------------------------------
+
+# (section, kind, field) -> API calls that can cause that change
+CAUSES: Dict[Tuple[str, str, Optional[str]], List[str]] = {
+    ("iam", "added", None): ["CreateUser"],
+    ("iam", "removed", None): ["DeleteUser"],
+    ("iam", "modified", "AttachedPolicies"): ["AttachUserPolicy", "DetachUserPolicy"],
+    ("iam", "modified", "InlinePolicies"): ["PutUserPolicy", "DeleteUserPolicy"],
+    ("s3", "added", None): ["CreateBucket"],
+    ("s3", "removed", None): ["DeleteBucket"],
+    ("s3", "modified", "Encryption"): ["PutBucketEncryption", "DeleteBucketEncryption"],
+    ("s3", "modified", "PublicAccessBlock"): ["PutPublicAccessBlock", "DeletePublicAccessBlock"],
+    ("s3", "modified", "Versioning.Status"): ["PutBucketVersioning"],
+    ("s3", "modified", "BucketPolicy"): ["PutBucketPolicy", "DeleteBucketPolicy"],
+    ("ec2", "added", None): ["CreateSecurityGroup"],
+    ("ec2", "removed", None): ["DeleteSecurityGroup"],
+    ("ec2", "modified", "InboundRules"): [
+        "AuthorizeSecurityGroupIngress", "RevokeSecurityGroupIngress",
+        "ModifySecurityGroupRules", "UpdateSecurityGroupRuleDescriptionsIngress",
+    ],
+    ("ec2", "modified", "OutboundRules"): [
+        "AuthorizeSecurityGroupEgress", "RevokeSecurityGroupEgress",
+        "ModifySecurityGroupRules", "UpdateSecurityGroupRuleDescriptionsEgress",
+    ],
+    # name/description/VPC are immutable; a change means the group was recreated
+    ("ec2", "modified", "GroupName"): ["CreateSecurityGroup", "DeleteSecurityGroup"],
+    ("ec2", "modified", "Description"): ["CreateSecurityGroup", "DeleteSecurityGroup"],
+    ("ec2", "modified", "VpcId"): ["CreateSecurityGroup", "DeleteSecurityGroup"],
+}
+
+
+def causes(c: Dict[str, Any]) -> List[str]:
+    """API calls that can produce one structured change."""
+    return CAUSES.get((c["section"], c["kind"], c.get("field")), [])
+
+
+def targets(changes: List[Dict[str, Any]]) -> Dict[str, Set[str]]:
+    """resource id -> set of candidate event names, merged across that resource's changes."""
+    out: Dict[str, Set[str]] = {}
+    for c in changes:
+        names = causes(c)
+        if names:
+            out.setdefault(c["resource"], set()).update(names)
+    return out
+
+
+def capture_time(snapshot: Dict[str, Any]) -> Optional[datetime]:
+    ts = (snapshot.get("meta") or {}).get("captured_at_utc")
+    if not ts:
+        return None
+    try:
+        return datetime.strptime(ts, CAPTURE_FMT).replace(tzinfo=UTC)
+    except ValueError:
+        return None
+
+
+def capture_window(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[datetime, datetime]:
+    """Time range in which the changes between old and new must have happened."""
+    end = capture_time(new) or datetime.now(UTC)
+    start = capture_time(old) or end - timedelta(minutes=DEFAULT_LOOKBACK_MINUTES)
+    if start > end:
+        start, end = end, start
+    return start, end + timedelta(minutes=WINDOW_SLACK_MINUTES)
+
+
+def correlate(
+    changes: List[Dict[str, Any]],
+    start_time: datetime,
+    end_time: datetime,
+    region_name: str = None,
+    max_results: int = 200,
+) -> List[Dict]:
+    """
+    Return CloudTrail events (newest first) that can explain `changes`.
+    Each event carries a "resource" key naming the drifted resource it matched.
+    """
+    tgts = targets(changes)
+    if not tgts:
+        return []
+
+    found: Dict[str, Dict] = {}
+    if EventStore is not None:
+        store = EventStore()
+        try:
+            poll(store, region_name=region_name)
+            for res, names in tgts.items():
+                for ev in store.query([res], names, start_time, end_time, limit=max_results):
+                    found.setdefault(ev.get("eventID"), dict(ev, resource=res))
+        finally:
+            store.close()
+    elif find_events_for_resources is not None:
+        for res, names in tgts.items():
+            for ev in find_events_for_resources([res], start_time, end_time, sorted(names),
+                                                max_results=max_results, region_name=region_name):
+                found.setdefault(ev.get("eventID"), dict(ev, resource=res))
+    else:
+        return []
+
+    events = sorted(found.values(), key=lambda e: str(e.get("eventTime") or ""), reverse=True)
+    return events[:max_results]
+
+
+def format_event(ev: Dict) -> str:
+    """One-line summary used in the logs: '<time> <name> by <user> from <ip>'."""
+    u = ev.get("userIdentity") or {}
+    uname = (u.get("userName") or u.get("arn") or str(u))
+    return f"{ev.get('eventTime')} {ev.get('eventName')} by {uname} from {ev.get('sourceIPAddress')}"
@@ -0,0 +1,21 @@
+"""
+Shared SQLite helpers.
+
+Everything that keeps local state (CloudTrail event cache, drift results, ...)
+lives in one SQLite file next to the scripts so the monitor and the web app
+see the same data. Override the location with DRIFT_DB.
+"""
+import os
+import sqlite3
+from pathlib import Path
+
+DB_FILE = Path(os.environ.get("DRIFT_DB", Path(__file__).parent.resolve() / "drift.db"))
+
+
+def connect(path=None) -> sqlite3.Connection:
+    """Open the shared database (WAL so the monitor can write while the app reads)."""
+    conn = sqlite3.connect(str(path or DB_FILE), timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
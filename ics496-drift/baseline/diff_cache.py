@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of compare results.
+
+Entries are keyed by (baseline sha256, snapshot sha256), so comparing the same
+pair of files again - a repeat click on "compare", the API's /diffs, a page
+reload - returns the stored structured diff instead of re-loading and
+re-diffing both snapshots, and reuses the CloudTrail correlation instead of
+querying CloudTrail again. Renaming or touching a file doesn't invalidate
+anything; changing its content does.
+
+Correlated events are only reused once the capture window has settled
+(EVENTS_SETTLE_MINUTES after it closed): CloudTrail delivers events with a
+delay, so an early lookup may legitimately come back short.
+
+The cache lives in the shared SQLite file (db.py) and is bounded by entry
+count and total bytes; the least recently used entries are evicted first.
+
+Usage:
+  python diff_cache.py stats
+  python diff_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from compare_baseline import diff_snapshots, load
+from db import connect
+from event_store import DELIVERY_DELAY_MINUTES
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+MAX_ENTRIES = 500                     # cached pairs kept
+MAX_BYTES = 64 * 1024 * 1024          # total compressed size kept
+EVENTS_SETTLE_MINUTES = DELIVERY_DELAY_MINUTES   # lookups of windows newer than this are not reused
+# ------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diff_cache (
+    base_hash  TEXT NOT NULL,
+    snap_hash  TEXT NOT NULL,
+    diff       BLOB NOT NULL,
+    events     BLOB,
+    bytes      INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used  REAL NOT NULL,
+    PRIMARY KEY (base_hash, snap_hash)
+);
+CREATE INDEX IF NOT EXISTS ix_diff_cache_used ON diff_cache(last_used);
+"""
+
+_HASHES: Dict[str, Tuple[int, int, str]] = {}     # path -> (size, mtime_ns, sha256)
+_HASH_LOCK = threading.Lock()
+
+
+def file_hash(path: Path) -> str:
+    """sha256 of a file's content, recomputed only when its size or mtime changes."""
+    st = path.stat()
+    key = str(path)
+    with _HASH_LOCK:
+        hit = _HASHES.get(key)
+    if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+        return hit[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _HASH_LOCK:
+        _HASHES[key] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, default=str, separators=(",", ":")).encode(), 6)
+
+
+def _unpack(blob: Optional[bytes]) -> Any:
+    return None if blob is None else json.loads(zlib.decompress(blob))
+
+
+class DiffCache:
+    def __init__(self, path=None, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def get(self, base_hash: str, snap_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached entry for the pair, or None:
+        {"diff", "base_meta", "snap_meta", "events" (None unless settled)}.
+        """
+        row = self.conn.execute(
+            "SELECT diff, events FROM diff_cache WHERE base_hash = ? AND snap_hash = ?", (base_hash, snap_hash)
+        ).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute(
+                "UPDATE diff_cache SET last_used = ? WHERE base_hash = ? AND snap_hash = ?",
+                (time.time(), base_hash, snap_hash),
+            )
+        entry = _unpack(row["diff"])
+        entry["events"] = _unpack(row["events"])
+        return entry
+
+    def put(self, base_hash: str, snap_hash: str, diff: Dict[str, Any], base_meta=None, snap_meta=None):
+        blob = _pack({"diff": diff, "base_meta": base_meta, "snap_meta": snap_meta})
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO diff_cache(base_hash, snap_hash, diff, events, bytes, created_at, last_used) "
+                "VALUES(?, ?, ?, NULL, ?, ?, ?) "
+                "ON CONFLICT(base_hash, snap_hash) DO UPDATE SET diff = excluded.diff, bytes = excluded.bytes, "
+                "last_used = excluded.last_used",
+                (base_hash, snap_hash, blob, len(blob), now, now),
+            )
+        self.evict()
+
+    def put_events(self, base_hash: str, snap_hash: str, events: List[Dict], window_end: datetime) -> bool:
+        """Store correlated events for a cached pair if the window has settled; returns whether stored."""
+        if window_end > datetime.now(UTC) - timedelta(minutes=EVENTS_SETTLE_MINUTES):
+            return False
+        blob = _pack(events)
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE diff_cache SET events = ?, bytes = length(diff) + ? WHERE base_hash = ? AND snap_hash = ?",
+                (blob, len(blob), base_hash, snap_hash),
+            )
+        self.evict()
+        return cur.rowcount > 0
+
+    def evict(self):
+        """Drop least recently used entries until both bounds hold."""
+        count, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM diff_cache").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        doomed = []
+        for r in self.conn.execute("SELECT base_hash, snap_hash, bytes FROM diff_cache ORDER BY last_used"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((r["base_hash"], r["snap_hash"]))
+            count, total = count - 1, total - r["bytes"]
+        with self.conn:
+            self.conn.executemany("DELETE FROM diff_cache WHERE base_hash = ? AND snap_hash = ?", doomed)
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM diff_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        r = self.conn.execute(
+            "SELECT COUNT(*) AS entries, COALESCE(SUM(bytes), 0) AS bytes, "
+            "SUM(events IS NOT NULL) AS with_events FROM diff_cache"
+        ).fetchone()
+        return {**dict(r), "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+
+def cached_diff(cache: DiffCache, base: Path, snap: Path) -> Tuple[str, str, Dict[str, Any], bool]:
+    """
+    (base_hash, snap_hash, entry, hit) for comparing base -> snap; diffs and
+    stores the pair on a miss. entry is shaped like DiffCache.get().
+    """
+    base_hash, snap_hash = file_hash(base), file_hash(snap)
+    entry = cache.get(base_hash, snap_hash)
+    if entry is not None:
+        return base_hash, snap_hash, entry, True
+    old, new = load(base), load(snap)
+    diff = diff_snapshots(old, new)
+    cache.put(base_hash, snap_hash, diff, old.get("meta"), new.get("meta"))
+    entry = {"diff": diff, "base_meta": old.get("meta"), "snap_meta": new.get("meta"), "events": None}
+    return base_hash, snap_hash, entry, False
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect or clear the compare result cache")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats")
+    sub.add_parser("clear")
+    args = ap.parse_args()
+
+    cache = DiffCache()
+    try:
+        if args.cmd == "stats":
+            s = cache.stats()
+            print(f"{s['entries']} / {s['max_entries']} entries, {s['bytes'] / 1e6:.1f} / "
+                  f"{s['max_bytes'] / 1e6:.1f} MB, {s['with_events'] or 0} with CloudTrail events")
+        elif args.cmd == "clear":
+            cache.clear()
+            print("Cache cleared.")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
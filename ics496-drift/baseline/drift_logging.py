@@ -0,0 +1,252 @@
+"""
+Buffered, batched logging for the monitor.
+
+Log calls only enqueue a record. A background writer thread drains the queue,
+formats records for each sink and writes them in batches, flushing when
+FLUSH_RECORDS records are pending or FLUSH_SECONDS have passed. File sinks
+rotate by size and gzip the rotated file. If the queue overflows, records
+are dropped rather than blocking the monitor; drops are counted in
+metrics.LOG_RECORDS_DROPPED and summarized in a warning line at the next flush.
+
+Sinks set up by `setup_logging`:
+  - realtime_monitor.jsonl   structured JSON-lines (one object per record)
+  - realtime_monitor.log     the human-readable "[ts] message" lines the dashboard shows
+  - stdout                   same human-readable lines
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import metrics
+
+try:
+    import fcntl                      # POSIX: serializes rotation between --worker processes
+except ImportError:
+    fcntl = None
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+FLUSH_RECORDS = 200                   # write out once this many records are buffered
+FLUSH_SECONDS = 1.0                   # ... or this long after the oldest buffered record
+MAX_BYTES = 10 * 1024 * 1024          # rotate file sinks past this size
+BACKUP_COUNT = 5                      # rotated .gz files kept per sink
+QUEUE_SIZE = 100_000                  # records dropped beyond this backlog (counted, and reported at the next flush)
+# ------------------------------------------
+
+
+class TextFormatter(logging.Formatter):
+    """'[2025-10-26T22-55-45Z] message' - the format realtime_monitor.log has always used."""
+
+    def format(self, record):
+        ts = datetime.fromtimestamp(record.created, UTC).strftime("%Y-%m-%dT%H-%M-%SZ")
+        return f"[{ts}] {record.getMessage()}"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; structured fields passed as extra={"fields": {...}}."""
+
+    def format(self, record):
+        doc = {
+            "ts": datetime.fromtimestamp(record.created, UTC).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        doc.update(getattr(record, "fields", None) or {})
+        return json.dumps(doc, default=str, separators=(",", ":"))
+
+
+class StreamSink:
+    def __init__(self, stream, formatter: logging.Formatter):
+        self.stream = stream
+        self.formatter = formatter
+
+    def write(self, lines: List[str]):
+        self.stream.write("\n".join(lines) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """
+    Append-only file that rotates to <name>.<ts>.gz past max_bytes. Several
+    processes (--worker) may share the path: each write holds an advisory lock
+    on <name>.lock (where fcntl exists), reopens the file if another process
+    rotated it away, and checks the file's size rather than its own offset.
+    """
+
+    def __init__(self, path: str, formatter: logging.Formatter, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT):
+        self.path = path
+        self.formatter = formatter
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lock = open(path + ".lock", "a") if fcntl else None
+        self._open()
+
+    def _open(self):
+        self.f = open(self.path, "a", encoding="utf-8")
+        st = os.fstat(self.f.fileno())
+        self.ino = (st.st_dev, st.st_ino)
+
+    def _reopen_if_moved(self):
+        try:
+            st = os.stat(self.path)
+            moved = (st.st_dev, st.st_ino) != self.ino
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self.f.close()
+            self._open()
+
+    def write(self, lines: List[str]):
+        data = "\n".join(lines) + "\n"
+        if self.lock:
+            fcntl.flock(self.lock, fcntl.LOCK_EX)
+        try:
+            self._reopen_if_moved()
+            size = os.fstat(self.f.fileno()).st_size
+            if self.max_bytes and size + len(data) > self.max_bytes and size > 0:
+                self.rotate()
+            self.f.write(data)
+            self.f.flush()
+        finally:
+            if self.lock:
+                fcntl.flock(self.lock, fcntl.LOCK_UN)
+
+    def rotate(self):
+        self.f.close()
+        rotated = f"{self.path}.{datetime.now(UTC).strftime('%Y%m%dT%H%M%S%fZ')}.{os.getpid()}"
+        try:
+            os.replace(self.path, rotated)
+        except FileNotFoundError:
+            rotated = None                         # another process rotated it first
+        self._open()
+        if rotated is None:
+            return
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        base = os.path.basename(self.path) + "."
+        d = os.path.dirname(self.path) or "."
+        old = sorted(f for f in os.listdir(d) if f.startswith(base) and f.endswith(".gz"))
+        for f in old[:-self.backup_count] if self.backup_count else []:
+            try:
+                os.remove(os.path.join(d, f))
+            except OSError:
+                pass
+
+    def close(self):
+        self.f.close()
+        if self.lock:
+            self.lock.close()
+
+
+class BatchingHandler(logging.Handler):
+    """Enqueue-only handler; a daemon thread formats and writes records to the sinks in batches."""
+
+    _STOP = object()
+
+    def __init__(self, sinks, flush_records: int = FLUSH_RECORDS, flush_seconds: float = FLUSH_SECONDS):
+        super().__init__()
+        self.sinks = sinks
+        self.flush_records = flush_records
+        self.flush_seconds = flush_seconds
+        self.queue: "queue.Queue" = queue.Queue(QUEUE_SIZE)
+        self.dropped = 0
+        self.reported = 0                     # drops already written out as a summary line
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.LOG_RECORDS_DROPPED.inc(logger=record.name)
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                self._write(pending)
+                return
+            if item is not None:
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+            if pending and (len(pending) >= self.flush_records or time.monotonic() >= deadline):
+                self._write(pending)
+                pending = []
+                deadline = None
+
+    def _write(self, records):
+        dropped = self.dropped - self.reported
+        if dropped:
+            self.reported += dropped
+            records = records + [logging.makeLogRecord({
+                "name": "drift.logging", "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "%d log record(s) dropped: writer queue full", "args": (dropped,),
+                "fields": {"event": "log_dropped", "dropped": dropped},
+            })]
+        if not records:
+            return
+        for sink in self.sinks:
+            try:
+                sink.write([sink.formatter.format(r) for r in records])
+            except Exception as e:
+                sys.stderr.write(f"log sink {sink!r} failed: {e}\n")
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join(timeout=10)
+        for sink in self.sinks:
+            sink.close()
+        super().close()
+
+
+_LOCK = threading.Lock()
+
+
+def setup_logging(
+    name: str = "drift",
+    logfile: Optional[str] = "realtime_monitor.log",
+    jsonfile: Optional[str] = "realtime_monitor.jsonl",
+    console: bool = True,
+) -> logging.Logger:
+    """Configure (once) and return the buffered logger."""
+    logger = logging.getLogger(name)
+    with _LOCK:
+        if any(isinstance(h, BatchingHandler) for h in logger.handlers):
+            return logger
+        sinks = []
+        if jsonfile:
+            sinks.append(FileSink(jsonfile, JsonFormatter()))
+        if logfile:
+            sinks.append(FileSink(logfile, TextFormatter()))
+        if console:
+            sinks.append(StreamSink(sys.stdout, TextFormatter()))
+        handler = BatchingHandler(sinks)
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        atexit.register(handler.close)
+    return logger
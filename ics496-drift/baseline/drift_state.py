@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Drift state tracking.
+
+Each drifted item is keyed by (account, section, resource, field path) and
+moves through open -> acknowledged -> resolved. The monitor feeds every
+baseline compare into `DriftTracker.update`, which returns only the
+transitions (opened, reopened, changed, resolved), so persistent drift is
+logged and enriched once instead of every cycle.
+
+Usage:
+  python drift_state.py list [--state open] [--account default]
+  python drift_state.py ack <section> <resource> [field] [--account default]
+"""
+import argparse
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from db import connect
+
+UTC = timezone.utc
+TIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+OPEN, ACKNOWLEDGED, RESOLVED = "open", "acknowledged", "resolved"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drift_state (
+    account     TEXT NOT NULL,
+    section     TEXT NOT NULL,
+    resource    TEXT NOT NULL,
+    field       TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    state       TEXT NOT NULL,
+    first_seen  TEXT NOT NULL,
+    last_seen   TEXT NOT NULL,
+    acked_at    TEXT,
+    resolved_at TEXT,
+    detail      TEXT,
+    PRIMARY KEY (account, section, resource, field)
+);
+CREATE INDEX IF NOT EXISTS ix_drift_state_state ON drift_state(account, state);
+"""
+
+
+def _now() -> str:
+    return datetime.now(UTC).strftime(TIME_FMT)
+
+
+def _detail(c: Dict[str, Any]) -> str:
+    return json.dumps({"kind": c["kind"], "old": c.get("old"), "new": c.get("new")}, sort_keys=True, default=str)
+
+
+def state_key(c: Dict[str, Any]):
+    """(section, resource, field path) for a structured change; added/removed use an empty field."""
+    return c["section"], c["resource"], c.get("field") or ""
+
+
+class DriftTracker:
+    """Persistent drift state machine backed by the shared SQLite file."""
+
+    def __init__(self, path=None):
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def update(self, changes: List[Dict[str, Any]], account: str = "default", now: str = None) -> List[Dict[str, Any]]:
+        """
+        Reconcile the current set of changes against stored state.
+        Returns transitions: each is the change dict plus "transition"
+        (opened / reopened / changed / resolved) and "first_seen".
+        """
+        now = now or _now()
+        current = {state_key(c): c for c in changes}
+        rows = {
+            (r["section"], r["resource"], r["field"]): r
+            for r in self.conn.execute("SELECT * FROM drift_state WHERE account = ?", (account,))
+        }
+        transitions = []
+        with self.conn:
+            for key, c in current.items():
+                row = rows.get(key)
+                detail = _detail(c)
+                if row is None or row["state"] == RESOLVED:
+                    transitions.append(dict(c, transition="opened" if row is None else "reopened", first_seen=now))
+                    self.conn.execute(
+                        "INSERT INTO drift_state(account, section, resource, field, kind, state, first_seen, last_seen, detail) "
+                        "VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(account, section, resource, field) DO UPDATE SET "
+                        "kind = excluded.kind, state = excluded.state, first_seen = excluded.first_seen, "
+                        "last_seen = excluded.last_seen, acked_at = NULL, resolved_at = NULL, detail = excluded.detail",
+                        (account, *key, c["kind"], OPEN, now, now, detail),
+                    )
+                    continue
+                if row["detail"] != detail:
+                    # Still drifted, but differently: worth reporting again (and un-acknowledging)
+                    transitions.append(dict(c, transition="changed", first_seen=row["first_seen"]))
+                    self.conn.execute(
+                        "UPDATE drift_state SET kind = ?, state = ?, last_seen = ?, acked_at = NULL, detail = ? "
+                        "WHERE account = ? AND section = ? AND resource = ? AND field = ?",
+                        (c["kind"], OPEN, now, detail, account, *key),
+                    )
+                else:
+                    self.conn.execute(
+                        "UPDATE drift_state SET last_seen = ? "
+                        "WHERE account = ? AND section = ? AND resource = ? AND field = ?",
+                        (now, account, *key),
+                    )
+            for key, row in rows.items():
+                if key in current or row["state"] == RESOLVED:
+                    continue
+                d = json.loads(row["detail"] or "{}")
+                transitions.append({
+                    "section": key[0], "resource": key[1], "field": key[2] or None,
+                    "kind": row["kind"], "old": d.get("old"), "new": d.get("new"),
+                    "transition": "resolved", "first_seen": row["first_seen"],
+                })
+                self.conn.execute(
+                    "UPDATE drift_state SET state = ?, resolved_at = ? "
+                    "WHERE account = ? AND section = ? AND resource = ? AND field = ?",
+                    (RESOLVED, now, account, *key),
+                )
+        return transitions
+
+    def acknowledge(self, section: str, resource: str, field: str = "", account: str = "default") -> bool:
+        """Mark an open drift item as acknowledged. Returns False if there was nothing open to ack."""
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE drift_state SET state = ?, acked_at = ? "
+                "WHERE account = ? AND section = ? AND resource = ? AND field = ? AND state = ?",
+                (ACKNOWLEDGED, _now(), account, section, resource, field or "", OPEN),
+            )
+        return cur.rowcount > 0
+
+    def items(self, account: str = None, state: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql, args = "SELECT * FROM drift_state WHERE 1 = 1", []
+        if account:
+            sql += " AND account = ?"
+            args.append(account)
+        if state:
+            sql += " AND state = ?"
+            args.append(state)
+        sql += " ORDER BY last_seen DESC"
+        return [dict(r) for r in self.conn.execute(sql, args)]
+
+
+def describe(t: Dict[str, Any]) -> str:
+    """One-line summary of a transition for the monitor log."""
+    what = f"{t['section']} {t['resource']}" + (f" {t['field']}" if t.get("field") else f" ({t['kind']})")
+    if t["transition"] == "resolved":
+        return f"Drift resolved: {what} (open since {t['first_seen']})"
+    return f"Drift {t['transition']}: {what}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect and acknowledge tracked drift")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("list")
+    p.add_argument("--state", choices=[OPEN, ACKNOWLEDGED, RESOLVED])
+    p.add_argument("--account")
+    p = sub.add_parser("ack")
+    p.add_argument("section")
+    p.add_argument("resource")
+    p.add_argument("field", nargs="?", default="")
+    p.add_argument("--account", default="default")
+    args = ap.parse_args()
+
+    tracker = DriftTracker()
+    try:
+        if args.cmd == "list":
+            for r in tracker.items(args.account, args.state):
+                print(f"[{r['state']:<12}] {r['account']} {r['section']} {r['resource']} {r['field'] or '(' + r['kind'] + ')'} "
+                      f"first={r['first_seen']} last={r['last_seen']}")
+        elif args.cmd == "ack":
+            if tracker.acknowledge(args.section, args.resource, args.field, args.account):
+                print("Acknowledged.")
+            else:
+                print("No open drift item matches.")
+                raise SystemExit(1)
+    finally:
+        tracker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Drift result store.
+
+Structured compare results and their CloudTrail enrichment are written here by
+the monitor and by the web app's compare endpoints, and read back by the
+dashboard with indexed queries (latest, time range, section, resource), so a
+page load no longer re-reads and re-parses realtime_monitor.log.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from compare_baseline import SECTION_TITLES, summarize
+from db import connect
+from drift_state import RESOLVED, SCHEMA as STATE_SCHEMA
+
+UTC = timezone.utc
+TIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comparisons (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at       TEXT NOT NULL,
+    account          TEXT NOT NULL,
+    source           TEXT NOT NULL,
+    baseline         TEXT NOT NULL,
+    snapshot         TEXT NOT NULL,
+    captured_at      TEXT,
+    account_mismatch INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_comparisons_created ON comparisons(created_at);
+CREATE INDEX IF NOT EXISTS ix_comparisons_snapshot ON comparisons(snapshot);
+CREATE TABLE IF NOT EXISTS drift_items (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    comparison_id INTEGER NOT NULL REFERENCES comparisons(id),
+    section       TEXT NOT NULL,
+    resource      TEXT NOT NULL,
+    field         TEXT,
+    kind          TEXT NOT NULL,
+    transition    TEXT,
+    text          TEXT NOT NULL,
+    old           TEXT,
+    new           TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_drift_items_comparison ON drift_items(comparison_id);
+CREATE INDEX IF NOT EXISTS ix_drift_items_resource ON drift_items(resource, comparison_id);
+CREATE INDEX IF NOT EXISTS ix_drift_items_section ON drift_items(section, comparison_id);
+CREATE TABLE IF NOT EXISTS enrichments (
+    comparison_id INTEGER NOT NULL REFERENCES comparisons(id),
+    event_id      TEXT,
+    event_time    TEXT,
+    event_name    TEXT,
+    principal     TEXT,
+    source_ip     TEXT,
+    resource      TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_enrichments_comparison ON enrichments(comparison_id);
+CREATE INDEX IF NOT EXISTS ix_enrichments_resource ON enrichments(resource);
+CREATE TABLE IF NOT EXISTS monitor_heartbeats (
+    account     TEXT PRIMARY KEY,
+    baseline    TEXT NOT NULL,
+    snapshot    TEXT NOT NULL,
+    captured_at TEXT,
+    created_at  TEXT NOT NULL,
+    account_mismatch INTEGER NOT NULL DEFAULT 0,
+    beats       INTEGER NOT NULL DEFAULT 1
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now(UTC).strftime(TIME_FMT)
+
+
+def _principal(ev: Dict) -> str:
+    u = ev.get("userIdentity") or {}
+    return u.get("userName") or u.get("arn") or str(u)
+
+
+class DriftStore:
+    """Indexed store of compare results and CloudTrail correlations."""
+
+    def __init__(self, path=None):
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(STATE_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- writes ---
+    def record_comparison(
+        self,
+        baseline: str,
+        snapshot: str,
+        diff: Dict[str, Any],
+        source: str = "manual",
+        account: str = "default",
+        captured_at: Optional[str] = None,
+    ) -> int:
+        """Store one compare result; returns its comparison id."""
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO comparisons(created_at, account, source, baseline, snapshot, captured_at, account_mismatch) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                (_now(), account, source, baseline, snapshot, captured_at, int(bool(diff.get("account_mismatch")))),
+            )
+            cid = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO drift_items(comparison_id, section, resource, field, kind, transition, text, old, new) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (cid, c["section"], c["resource"], c.get("field"), c["kind"], c.get("transition"),
+                     summarize(c), json.dumps(c.get("old"), default=str), json.dumps(c.get("new"), default=str))
+                    for c in diff.get("changes", [])
+                ],
+            )
+        return cid
+
+    def heartbeat(self, baseline: str, snapshot: str, account: str = "default",
+                  captured_at: Optional[str] = None, account_mismatch: bool = False):
+        """
+        The monitor's latest baseline compare of an account. Cycles without
+        transitions are recorded only here (one row per account), not as comparisons.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO monitor_heartbeats(account, baseline, snapshot, captured_at, created_at, account_mismatch) "
+                "VALUES(?, ?, ?, ?, ?, ?) ON CONFLICT(account) DO UPDATE SET baseline = excluded.baseline, "
+                "snapshot = excluded.snapshot, captured_at = excluded.captured_at, created_at = excluded.created_at, "
+                "account_mismatch = excluded.account_mismatch, beats = beats + 1",
+                (account, baseline, snapshot, captured_at, _now(), int(bool(account_mismatch))),
+            )
+
+    def add_enrichment(self, comparison_id: int, events: List[Dict]):
+        """Attach correlated CloudTrail events (correlate.correlate output) to a comparison."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO enrichments(comparison_id, event_id, event_time, event_name, principal, source_ip, resource) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (comparison_id, ev.get("eventID"), str(ev.get("eventTime")), ev.get("eventName"),
+                     _principal(ev), ev.get("sourceIPAddress"), ev.get("resource"))
+                    for ev in events
+                ],
+            )
+
+    # --- reads ---
+    def comparisons(
+        self, start: str = None, end: str = None, account: str = None, limit: int = 50, before: int = None
+    ) -> List[Dict]:
+        """Comparisons newest first, optionally within [start, end] (ISO UTC strings) and with id < before."""
+        sql, args = "SELECT * FROM comparisons WHERE 1 = 1", []
+        if before is not None:
+            sql += " AND id < ?"
+            args.append(before)
+        if start:
+            sql += " AND created_at >= ?"
+            args.append(start)
+        if end:
+            sql += " AND created_at <= ?"
+            args.append(end)
+        if account:
+            sql += " AND account = ?"
+            args.append(account)
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(limit)
+        return [dict(r) for r in self.conn.execute(sql, args)]
+
+    def items(
+        self,
+        comparison_id: int = None,
+        section: str = None,
+        resource: str = None,
+        start: str = None,
+        end: str = None,
+        limit: int = 200,
+        before: int = None,
+        after: int = None,
+    ) -> List[Dict]:
+        """
+        Drift items newest first, filtered by comparison, section, resource, time
+        range and/or id < before. With after, the items with id > after, oldest first.
+        """
+        sql = ("SELECT i.*, c.created_at, c.snapshot, c.account FROM drift_items i "
+               "JOIN comparisons c ON c.id = i.comparison_id WHERE 1 = 1")
+        args: List[Any] = []
+        if before is not None:
+            sql += " AND i.id < ?"
+            args.append(before)
+        if after is not None:
+            sql += " AND i.id > ?"
+            args.append(after)
+        if comparison_id is not None:
+            sql += " AND i.comparison_id = ?"
+            args.append(comparison_id)
+        if section:
+            sql += " AND i.section = ?"
+            args.append(section)
+        if resource:
+            sql += " AND i.resource = ?"
+            args.append(resource)
+        if start:
+            sql += " AND c.created_at >= ?"
+            args.append(start)
+        if end:
+            sql += " AND c.created_at <= ?"
+            args.append(end)
+        sql += " ORDER BY i.id ASC LIMIT ?" if after is not None else " ORDER BY i.id DESC LIMIT ?"
+        args.append(limit)
+        return [dict(r) for r in self.conn.execute(sql, args)]
+
+    def version(self) -> str:
+        """Changes whenever anything is added or a heartbeat is recorded; used for HTTP ETags."""
+        row = self.conn.execute(
+            "SELECT (SELECT MAX(id) FROM comparisons), (SELECT MAX(id) FROM drift_items), "
+            "(SELECT MAX(rowid) FROM enrichments), (SELECT SUM(beats) FROM monitor_heartbeats)"
+        ).fetchone()
+        return "-".join(str(v or 0) for v in row)
+
+    def enrichment(self, comparison_id: int) -> List[Dict]:
+        return [dict(r) for r in self.conn.execute(
+            "SELECT * FROM enrichments WHERE comparison_id = ? ORDER BY event_time DESC", (comparison_id,)
+        )]
+
+    def latest(self, account: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Most recent comparison in the shape the dashboard's Latest Log panel expects:
+        snapshot_name, snapshot_date, changes (one entry per section), cloudtrail_events, warning.
+        When the monitor's baseline heartbeat is the newest (its compares store transitions
+        only), changes is the drift currently open for that account and the CloudTrail
+        events are those found when each open item was reported.
+        """
+        rows = self.comparisons(account=account, limit=1)
+        comp = rows[0] if rows else None
+        q, args = "SELECT * FROM monitor_heartbeats", ()
+        if account:
+            q, args = q + " WHERE account = ?", (account,)
+        hb = self.conn.execute(q + " ORDER BY created_at DESC LIMIT 1", args).fetchone()
+        by_section = {k: [] for k in SECTION_TITLES}
+        if hb and (comp is None or hb["created_at"] >= comp["created_at"]):
+            items = [dict(c, text=summarize(c)) for c in self.open_drift(hb["account"])]
+            events = self._events_of(self._reported_in(hb["account"], items))
+            snapshot, captured, mismatch = hb["snapshot"], hb["captured_at"] or hb["created_at"], hb["account_mismatch"]
+            comp_id = comp["id"] if comp else None
+        elif comp:
+            items = reversed(self.items(comparison_id=comp["id"], limit=10000))
+            events = self.enrichment(comp["id"])
+            snapshot, captured, mismatch = comp["snapshot"], comp["captured_at"] or comp["created_at"], comp["account_mismatch"]
+            comp_id = comp["id"]
+        else:
+            return None
+        for it in items:
+            status = it["kind"] if it["kind"] in ("added", "removed") else "modified"
+            by_section.setdefault(it["section"], []).append({"text": it["text"], "status": status})
+        return {
+            "id": comp_id,
+            "snapshot_name": snapshot,
+            "snapshot_date": captured,
+            "changes": [{"type": SECTION_TITLES.get(k, k), "items": v} for k, v in by_section.items()],
+            "cloudtrail_events": [
+                {"time": e["event_time"], "name": e["event_name"], "user": e["principal"], "ip": e["source_ip"]}
+                for e in events
+            ],
+            "warning": "Snapshots are from different AWS accounts!" if mismatch else None,
+        }
+
+    def _reported_in(self, account: str, changes: List[Dict[str, Any]]) -> List[int]:
+        """Comparisons where each change was last opened / reopened / changed (where it was enriched)."""
+        cids = set()
+        for c in changes:
+            row = self.conn.execute(
+                "SELECT MAX(i.comparison_id) FROM drift_items i JOIN comparisons c ON c.id = i.comparison_id "
+                "WHERE i.resource = ? AND i.section = ? AND COALESCE(i.field, '') = ? AND c.account = ? "
+                "AND c.source = 'monitor' AND i.transition IN ('opened', 'reopened', 'changed')",
+                (c["resource"], c["section"], c.get("field") or "", account),
+            ).fetchone()
+            if row[0] is not None:
+                cids.add(row[0])
+        return sorted(cids)
+
+    def _events_of(self, comparison_ids: List[int]) -> List[Dict]:
+        """Enrichments of several comparisons, one row per event, newest first."""
+        seen, out = set(), []
+        rows = [e for cid in comparison_ids for e in self.enrichment(cid)]
+        for e in sorted(rows, key=lambda e: e["event_time"] or "", reverse=True):
+            key = e["event_id"] or (e["event_time"], e["event_name"], e["resource"])
+            if key not in seen:
+                seen.add(key)
+                out.append(e)
+        return out
+
+    def open_drift(self, account: str) -> List[Dict[str, Any]]:
+        """Unresolved drift_state items of an account as change dicts (oldest first)."""
+        out = []
+        for r in self.conn.execute(
+            "SELECT * FROM drift_state WHERE account = ? AND state != ? ORDER BY first_seen, section, resource, field",
+            (account, RESOLVED),
+        ):
+            d = json.loads(r["detail"] or "{}")
+            out.append({"section": r["section"], "resource": r["resource"], "field": r["field"] or None,
+                        "kind": r["kind"], "old": d.get("old"), "new": d.get("new")})
+        return out
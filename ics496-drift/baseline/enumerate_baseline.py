@@ -1,12 +1,19 @@
-import json, datetime
+import json, datetime, os
 import boto3
-from botocore.exceptions import ClientError
+
+import collectors
+from snapshot_index import write_index
+from tracing import span
 
 def ts():
     return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H-%M-%SZ")
 
-def get_account():
-    sts = boto3.client("sts")
+def client(name, session=None):
+    """Client from the given boto3 Session (e.g. a named profile), else the default session."""
+    return (session or boto3).client(name)
+
+def get_account(session=None, errors=None):
+    sts = client("sts", session)
     ident = sts.get_caller_identity()
     return {
         "account_id": ident["Account"],
@@ -14,124 +21,33 @@ def get_account():
         "user_id": ident["UserId"],
     }
 
-def get_iam():
-    iam = boto3.client("iam")
-    users = []
-    paginator = iam.get_paginator("list_users")
-    for page in paginator.paginate():
-        for u in page["Users"]:
-            uname = u["UserName"]
-            user = {
-                "UserName": uname,
-                "CreateDate": u["CreateDate"].strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "Arn": u["Arn"],
-                "Groups": [],
-                "AttachedPolicies": [],
-                "InlinePolicies": [],
-            }
-            # groups
-            for g in iam.list_groups_for_user(UserName=uname)["Groups"]:
-                user["Groups"].append(g["GroupName"])
-            # attached policies
-            for p in iam.list_attached_user_policies(UserName=uname)["AttachedPolicies"]:
-                user["AttachedPolicies"].append(p["PolicyArn"])
-            # inline policies (names only)
-            for pn in iam.list_user_policies(UserName=uname)["PolicyNames"]:
-                user["InlinePolicies"].append(pn)
-            users.append(user)
-    # account-level managed policies (names only, optional)
-    return {"Users": users}
+def get_iam(session=None, errors=None):
+    return {"Users": collectors.run(collectors.IAM_USERS, session, errors=errors)}
 
-def safe_call(fn, default=None):
-    try:
-        return fn()
-    except ClientError as e:
-        # If access denied or not configured, return default
-        return default
+def get_s3(session=None, errors=None):
+    # Versioning drops ResponseMetadata (request id / date): it changed on every capture
+    return {"Buckets": collectors.run(collectors.S3_BUCKETS, session, errors=errors)}
 
-def get_s3():
-    s3 = boto3.client("s3")
-    out = {"Buckets": []}
-    buckets = s3.list_buckets().get("Buckets", [])
-    for b in buckets:
-        name = b["Name"]
-        binfo = {"Name": name}
-        # location
-        loc = safe_call(lambda: s3.get_bucket_location(Bucket=name))
-        binfo["Location"] = (loc or {}).get("LocationConstraint")
-        # encryption
-        enc = safe_call(lambda: s3.get_bucket_encryption(Bucket=name))
-        if enc and "ServerSideEncryptionConfiguration" in enc:
-            binfo["Encryption"] = enc["ServerSideEncryptionConfiguration"]
-        else:
-            binfo["Encryption"] = None
-        # policy
-        pol = safe_call(lambda: s3.get_bucket_policy(Bucket=name))
-        if pol and "Policy" in pol:
-            binfo["Policy"] = json.loads(pol["Policy"])
-        else:
-            binfo["Policy"] = None
-        # public access block
-        pab = safe_call(lambda: s3.get_public_access_block(Bucket=name))
-        binfo["PublicAccessBlock"] = (pab or {}).get("PublicAccessBlockConfiguration")
-        # versioning
-        ver = safe_call(lambda: s3.get_bucket_versioning(Bucket=name))
-        binfo["Versioning"] = ver or {}
-        out["Buckets"].append(binfo)
-    return out
+def get_ec2_security_groups(session=None, errors=None):
+    return {"SecurityGroups": collectors.run(collectors.EC2_SECURITY_GROUPS, session, errors=errors)}
 
-def get_ec2_security_groups():
-    ec2 = boto3.client("ec2")
-    resp = ec2.describe_security_groups()
-    sgs = []
-    for sg in resp.get("SecurityGroups", []):
-        def fmt_perms(perms):
-            rules = []
-            for p in perms:
-                proto = p.get("IpProtocol")
-                fromp = p.get("FromPort")
-                top = p.get("ToPort")
-                # IPv4 ranges
-                for r in p.get("IpRanges", []):
-                    rules.append({
-                        "Protocol": proto,
-                        "FromPort": fromp,
-                        "ToPort": top,
-                        "CidrIp": r.get("CidrIp"),
-                        "Desc": r.get("Description"),
-                    })
-                # IPv6 ranges
-                for r in p.get("Ipv6Ranges", []):
-                    rules.append({
-                        "Protocol": proto,
-                        "FromPort": fromp,
-                        "ToPort": top,
-                        "CidrIpv6": r.get("CidrIpv6"),
-                        "Desc": r.get("Description"),
-                    })
-                # referenced SGs
-                for r in p.get("UserIdGroupPairs", []):
-                    rules.append({
-                        "Protocol": proto,
-                        "FromPort": fromp,
-                        "ToPort": top,
-                        "SourceGroupId": r.get("GroupId"),
-                        "Desc": r.get("Description"),
-                    })
-            return rules
+def collect(name, fn, session=None, errors=None):
+    with span(f"collect.{name}"):
+        return fn(session, errors=errors)
 
-        sgs.append({
-            "GroupId": sg.get("GroupId"),
-            "GroupName": sg.get("GroupName"),
-            "Description": sg.get("Description"),
-            "VpcId": sg.get("VpcId"),
-            "InboundRules": fmt_perms(sg.get("IpPermissions", [])),
-            "OutboundRules": fmt_perms(sg.get("IpPermissionsEgress", [])),
-            "Tags": {t["Key"]: t["Value"] for t in sg.get("Tags", [])} if sg.get("Tags") else {},
-        })
-    return {"SecurityGroups": sgs}
+COLLECTORS = [
+    ("identity", get_account),
+    ("iam", get_iam),
+    ("s3", get_s3),
+    ("ec2", get_ec2_security_groups),
+]
 
-def main():
+def build_snapshot(session=None, progress=None):
+    """
+    progress(done, total, section) is called before each collector runs.
+    Non-fatal collector errors (denied describe calls etc.) go to meta.collector_errors.
+    """
+    errors = []
     snapshot = {
         "meta": {
             "captured_at_utc": ts(),
@@ -139,14 +55,31 @@ def main():
                 "boto3": boto3.__version__,
             }
         },
-        "identity": get_account(),
-        "iam": get_iam(),
-        "s3": get_s3(),
-        "ec2": get_ec2_security_groups(),
     }
+    for i, (name, fn) in enumerate(COLLECTORS):
+        if progress:
+            progress(i, len(COLLECTORS), name)
+        snapshot[name] = collect(name, fn, session, errors)
+    # Opt-in collectors (DRIFT_EXTRA_COLLECTORS) land in their own keys of the same sections
+    if collectors.EXTRA_COLLECTORS:
+        with span("collect.extras"):
+            collectors.collect_extras(snapshot, session, errors=errors)
+    if errors:
+        snapshot["meta"]["collector_errors"] = errors
+    return snapshot
+
+def write_snapshot(snapshot, directory="."):
+    """Write a snapshot as baseline_<ts>.json in directory and return the file name."""
     fname = f"baseline_{ts()}.json"
-    with open(fname, "w", encoding="utf-8") as f:
-        json.dump(snapshot, f, indent=2, sort_keys=True)
+    path = os.path.join(directory, fname)
+    text = json.dumps(snapshot, indent=2, sort_keys=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    write_index(path, text)
+    return fname
+
+def main():
+    fname = write_snapshot(build_snapshot())
     print(f"Wrote {fname}")
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Local CloudTrail event cache.
+
+Events are pulled incrementally from LookupEvents (see `poll`) and stored in
+SQLite, indexed on eventTime, eventName, eventID and the resource names each
+event touches. Drift enrichment then runs against the local index instead of
+re-downloading the last N minutes of CloudTrail on every compare.
+
+Events ingested from log archives (cloudtrail_ingest.py) are marked as such
+and kept for ARCHIVE_RETENTION_DAYS (forever by default) instead of the live
+cache's RETENTION_DAYS.
+
+Usage:
+  python event_store.py poll [--region us-east-2] [--loop 60]
+  python event_store.py prune [--days 30] [--archive-days 365]
+  python event_store.py query sg-0123 my-bucket [--minutes 60]
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import boto3
+
+from db import connect
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+RETENTION_DAYS = int(os.environ.get("DRIFT_EVENT_RETENTION_DAYS", "30"))
+# Events loaded from CloudTrail log archives (cloudtrail_ingest.py) are history
+# LookupEvents can't give back (> 90 days): 0 = keep them forever
+ARCHIVE_RETENTION_DAYS = int(os.environ.get("DRIFT_ARCHIVE_RETENTION_DAYS", "0"))
+INITIAL_LOOKBACK_MINUTES = 60     # first poll with no watermark
+DELIVERY_DELAY_MINUTES = 20       # CloudTrail can surface events in LookupEvents ~15 min late (shared with diff_cache)
+OVERLAP_MINUTES = DELIVERY_DELAY_MINUTES   # so each poll re-reads this much behind the watermark
+MIN_POLL_SECONDS = 15             # callers sharing a store don't re-poll more often than this
+# ------------------------------------------
+
+TIME_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+# requestParameters / responseElements keys that name the resource being changed
+RESOURCE_KEYS = (
+    "groupId", "groupName", "bucketName", "userName", "roleName", "policyArn",
+    "policyName", "keyId", "functionName", "dBInstanceIdentifier", "name",
+    "trailName", "instanceId", "vpcId", "securityGroupRuleId", "GroupId",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ct_events (
+    event_id     TEXT PRIMARY KEY,
+    event_time   TEXT NOT NULL,
+    event_name   TEXT NOT NULL,
+    event_source TEXT,
+    username     TEXT,
+    source_ip    TEXT,
+    read_only    INTEGER,
+    raw          TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_ct_events_time ON ct_events(event_time);
+CREATE INDEX IF NOT EXISTS ix_ct_events_name ON ct_events(event_name, event_time);
+CREATE TABLE IF NOT EXISTS ct_event_resources (
+    event_id      TEXT NOT NULL,
+    resource_name TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (event_id, resource_name)
+);
+CREATE INDEX IF NOT EXISTS ix_ct_event_resources_name ON ct_event_resources(resource_name);
+CREATE TABLE IF NOT EXISTS ct_archived_events (
+    event_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS ct_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def fmt_time(dt: datetime) -> str:
+    return dt.astimezone(UTC).strftime(TIME_FMT)
+
+
+def parse_time(s: str) -> datetime:
+    return datetime.strptime(s, TIME_FMT).replace(tzinfo=UTC)
+
+
+def resource_names(ev_json: Dict, lookup_resources: Optional[List[Dict]] = None) -> List[str]:
+    """Collect the names/ids/ARNs of everything an event touched."""
+    names = set()
+    for r in lookup_resources or []:
+        if r.get("ResourceName"):
+            names.add(r["ResourceName"])
+    for r in ev_json.get("resources") or []:
+        if r.get("ARN"):
+            names.add(r["ARN"])
+    for section in ("requestParameters", "responseElements"):
+        params = ev_json.get(section)
+        if not isinstance(params, dict):
+            continue
+        # one level of nesting covers e.g. responseElements.user.userName
+        for obj in [params] + [v for v in params.values() if isinstance(v, dict)]:
+            for k in RESOURCE_KEYS:
+                v = obj.get(k)
+                if isinstance(v, str) and v:
+                    names.add(v)
+    return sorted(names)
+
+
+def to_match(ev_json: Dict, raw=None, lookup_event: Optional[Dict] = None) -> Dict:
+    """Shape an event like cloudtrail_fetch.find_events_for_keywords results."""
+    lookup_event = lookup_event or {}
+    return {
+        "eventID": ev_json.get("eventID") or lookup_event.get("EventId"),
+        "eventTime": ev_json.get("eventTime") or lookup_event.get("EventTime"),
+        "eventName": ev_json.get("eventName") or lookup_event.get("EventName"),
+        "userIdentity": ev_json.get("userIdentity"),
+        "sourceIPAddress": ev_json.get("sourceIPAddress"),
+        "userAgent": ev_json.get("userAgent"),
+        "resources": ev_json.get("resources") or lookup_event.get("Resources"),
+        "raw": ev_json or raw,
+    }
+
+
+class EventStore:
+    """SQLite-backed CloudTrail event index."""
+
+    def __init__(self, path=None, retention_days: int = RETENTION_DAYS,
+                 archive_retention_days: int = ARCHIVE_RETENTION_DAYS):
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+        self.retention_days = retention_days
+        self.archive_retention_days = archive_retention_days
+
+    def close(self):
+        self.conn.close()
+
+    # --- watermark ---
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM ct_meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO ct_meta(key, value) VALUES(?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    # --- writes ---
+    def add_records(self, records: Iterable[Dict], lookup_events: Optional[Iterable[Dict]] = None,
+                    archive: bool = False) -> int:
+        """
+        Insert parsed CloudTrail records (the JSON inside CloudTrailEvent, or a
+        `Records[]` entry from a log file). Already-known eventIDs are ignored.
+        archive=True marks them (known or not) as archive history, pruned on
+        archive_retention_days. Returns the number of new events.
+        """
+        lookups = list(lookup_events) if lookup_events is not None else None
+        added = 0
+        with self.conn:
+            for i, rec in enumerate(records):
+                lev = lookups[i] if lookups else {}
+                eid = rec.get("eventID") or lev.get("EventId")
+                etime = rec.get("eventTime")
+                if not etime and lev.get("EventTime"):
+                    etime = fmt_time(lev["EventTime"])
+                if not eid or not etime:
+                    continue
+                if archive:
+                    self.conn.execute("INSERT OR IGNORE INTO ct_archived_events(event_id) VALUES(?)", (eid,))
+                ident = rec.get("userIdentity") or {}
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO ct_events(event_id, event_time, event_name, event_source, "
+                    "username, source_ip, read_only, raw) VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        eid,
+                        etime,
+                        rec.get("eventName") or lev.get("EventName") or "",
+                        rec.get("eventSource") or lev.get("EventSource"),
+                        ident.get("userName") or ident.get("arn") or lev.get("Username"),
+                        rec.get("sourceIPAddress"),
+                        None if rec.get("readOnly") is None else int(bool(rec.get("readOnly"))),
+                        json.dumps(rec, separators=(",", ":")),
+                    ),
+                )
+                if cur.rowcount == 0:
+                    continue
+                added += 1
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO ct_event_resources(event_id, resource_name) VALUES(?, ?)",
+                    [(eid, n) for n in resource_names(rec, lev.get("Resources"))],
+                )
+        return added
+
+    def add_lookup_events(self, events: List[Dict]) -> int:
+        """Insert raw LookupEvents entries."""
+        recs = []
+        for ev in events:
+            try:
+                recs.append(json.loads(ev.get("CloudTrailEvent") or "{}"))
+            except Exception:
+                recs.append({})
+        return self.add_records(recs, events)
+
+    def prune(self, retention_days: Optional[int] = None, archive_retention_days: Optional[int] = None) -> int:
+        """
+        Drop live-cache events older than the retention window, and archive
+        events older than the archive window (if any). Returns rows deleted.
+        """
+        days = self.retention_days if retention_days is None else retention_days
+        archive_days = self.archive_retention_days if archive_retention_days is None else archive_retention_days
+        stale = ["event_time < ? AND event_id NOT IN (SELECT event_id FROM ct_archived_events)"]
+        args = [fmt_time(datetime.now(UTC) - timedelta(days=days))]
+        if archive_days:
+            stale.append("event_time < ?")
+            args.append(fmt_time(datetime.now(UTC) - timedelta(days=archive_days)))
+        deleted = 0
+        with self.conn:
+            for where, arg in zip(stale, args):
+                self.conn.execute(
+                    f"DELETE FROM ct_event_resources WHERE event_id IN (SELECT event_id FROM ct_events WHERE {where})",
+                    (arg,),
+                )
+                self.conn.execute(
+                    f"DELETE FROM ct_archived_events WHERE event_id IN (SELECT event_id FROM ct_events WHERE {where})",
+                    (arg,),
+                )
+                deleted += self.conn.execute(f"DELETE FROM ct_events WHERE {where}", (arg,)).rowcount
+        return deleted
+
+    # --- reads ---
+    def query(
+        self,
+        resources: Optional[Iterable[str]] = None,
+        event_names: Optional[Iterable[str]] = None,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+        limit: int = 200,
+    ) -> List[Dict]:
+        """Return events (newest first) touching any of `resources` and/or named in `event_names`."""
+        where, args = [], []
+        resources = [r for r in (resources or []) if r]
+        event_names = [n for n in (event_names or []) if n]
+        if resources:
+            where.append(
+                "e.event_id IN (SELECT event_id FROM ct_event_resources WHERE resource_name IN (%s))"
+                % ",".join("?" * len(resources))
+            )
+            args += resources
+        if event_names:
+            where.append("e.event_name IN (%s)" % ",".join("?" * len(event_names)))
+            args += event_names
+        if start_time:
+            where.append("e.event_time >= ?")
+            args.append(fmt_time(start_time))
+        if end_time:
+            where.append("e.event_time <= ?")
+            args.append(fmt_time(end_time))
+        sql = "SELECT raw FROM ct_events e"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY e.event_time DESC LIMIT ?"
+        args.append(limit)
+        return [to_match(json.loads(row["raw"])) for row in self.conn.execute(sql, args)]
+
+
+def _poll_key(region_name: str = None) -> str:
+    return f"lookup:{region_name or 'default'}"
+
+
+def poll(store: EventStore, region_name: str = None, force: bool = False) -> int:
+    """
+    Pull CloudTrail events newer than the stored watermark (minus the
+    delivery delay, so late events are still picked up) into the store and advance the watermark.
+    Returns the number of new events; 0 when skipped because of MIN_POLL_SECONDS.
+    """
+    key = _poll_key(region_name)
+    now = datetime.now(UTC)
+    last_poll = store.get_meta(key + ":polled_at")
+    if not force and last_poll and (now - parse_time(last_poll)).total_seconds() < MIN_POLL_SECONDS:
+        return 0
+
+    wm = store.get_meta(key + ":watermark")
+    if wm:
+        start = parse_time(wm) - timedelta(minutes=OVERLAP_MINUTES)
+    else:
+        start = now - timedelta(minutes=INITIAL_LOOKBACK_MINUTES)
+
+    ct = boto3.client("cloudtrail", region_name=region_name)
+    paginator = ct.get_paginator("lookup_events")
+    added = 0
+    newest = parse_time(wm) if wm else start
+    for page in paginator.paginate(StartTime=start, EndTime=now, PaginationConfig={"PageSize": 50}):
+        events = page.get("Events", [])
+        added += store.add_lookup_events(events)
+        for ev in events:
+            if ev.get("EventTime") and ev["EventTime"] > newest:
+                newest = ev["EventTime"]
+
+    store.set_meta(key + ":watermark", fmt_time(newest))
+    store.set_meta(key + ":polled_at", fmt_time(now))
+    store.prune()
+    return added
+
+
+def find_events_for_keywords(
+    keywords: List[str],
+    start_time,
+    end_time,
+    event_names: List[str] = None,
+    max_results: int = 200,
+    region_name: str = None,
+) -> List[Dict]:
+    """
+    Drop-in replacement for cloudtrail_fetch.find_events_for_keywords that
+    tops up the local store incrementally and answers from the index.
+    Keywords are matched (case-insensitive) against resource names.
+    """
+    store = EventStore()
+    try:
+        poll(store, region_name=region_name)
+        return store.query(keywords, event_names, start_time, end_time, limit=max_results)
+    finally:
+        store.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Local CloudTrail event cache")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("poll", help="pull new events past the watermark")
+    p.add_argument("--region")
+    p.add_argument("--loop", type=int, default=0, help="keep polling every N seconds")
+    p = sub.add_parser("prune", help="drop events older than the retention window")
+    p.add_argument("--days", type=int, default=RETENTION_DAYS)
+    p.add_argument("--archive-days", type=int, default=ARCHIVE_RETENTION_DAYS, help="0 = keep archive events")
+    p = sub.add_parser("query", help="show cached events for resource names")
+    p.add_argument("resources", nargs="+")
+    p.add_argument("--minutes", type=int, default=60)
+    args = ap.parse_args()
+
+    store = EventStore()
+    try:
+        if args.cmd == "poll":
+            while True:
+                n = poll(store, region_name=args.region, force=True)
+                wm = store.get_meta(_poll_key(args.region) + ":watermark")
+                print(f"Stored {n} new event(s); watermark {wm}")
+                if not args.loop:
+                    break
+                time.sleep(args.loop)
+        elif args.cmd == "prune":
+            print(f"Pruned {store.prune(args.days, args.archive_days)} event(s)")
+        elif args.cmd == "query":
+            start = datetime.now(UTC) - timedelta(minutes=args.minutes)
+            for ev in store.query(args.resources, start_time=start):
+                u = ev.get("userIdentity") or {}
+                uname = u.get("userName") or u.get("arn") or str(u)
+                print(f"{ev.get('eventTime')} {ev.get('eventName')} by {uname} from {ev.get('sourceIPAddress')}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Background jobs for the web app.
+
+Snapshot and compare requests are queued here instead of running inside the
+request: the route gets a job id back immediately and clients poll
+/api/v1/jobs/<id> for status and progress.
+
+  - a bounded worker pool (MAX_WORKERS threads, at most MAX_PENDING jobs queued);
+  - duplicate in-flight jobs coalesce: submitting a key that is already queued
+    or running returns the existing job (two users clicking "compare latest");
+  - AWS-heavy jobs additionally take one of AWS_SLOTS, so a slow account can't
+    occupy every worker. The slot is taken before the job reaches the pool: jobs
+    waiting for one sit in a FIFO instead of holding a worker thread.
+"""
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# ----------------- CONFIG -----------------
+MAX_WORKERS = 4                       # worker threads
+MAX_PENDING = 50                      # queued + running jobs before submit() refuses
+AWS_SLOTS = 2                         # concurrent AWS-heavy jobs
+KEEP_FINISHED = 200                   # finished jobs kept for status lookups
+# ------------------------------------------
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str, key: str, description: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.key = key
+        self.description = description
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def update(self, progress: float = None, message: str = None):
+        """Called by the job function to report progress (0..1) and a short status line."""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id, "kind": self.kind, "description": self.description, "status": self.status,
+            "progress": round(self.progress, 3), "message": self.message, "result": self.result,
+            "error": self.error, "created_at": self.created_at, "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    def __init__(self, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING, aws_slots: int = AWS_SLOTS):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.max_pending = max_pending
+        self.aws = threading.BoundedSemaphore(aws_slots)
+        self.lock = threading.Lock()
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.inflight: Dict[str, Job] = {}          # coalescing key -> active job
+        self.aws_waiting: "deque" = deque()          # (job, fn) of AWS jobs waiting for a slot
+
+    def submit(self, kind: str, key: str, fn: Callable[[Job], Any], description: str = "", aws: bool = False) -> Job:
+        """
+        Queue fn(job) unless a job with the same key is already queued or running,
+        in which case that job is returned. Raises QueueFull when saturated.
+        """
+        with self.lock:
+            existing = self.inflight.get(key)
+            if existing is not None and existing.active:
+                return existing
+            if len(self.inflight) >= self.max_pending:
+                raise QueueFull(f"{len(self.inflight)} jobs already pending")
+            job = Job(kind, key, description or kind)
+            self.jobs[job.id] = job
+            self.inflight[key] = job
+            self._prune()
+            if aws and not self.aws.acquire(blocking=False):
+                job.update(message="waiting for an AWS slot")
+                self.aws_waiting.append((job, fn))
+                return job
+        self.pool.submit(self._run, job, fn, aws)
+        return job
+
+    def _release_aws(self):
+        """Hand a finished AWS job's slot to the next waiting one, or free it."""
+        with self.lock:
+            if not self.aws_waiting:
+                self.aws.release()
+                return
+            job, fn = self.aws_waiting.popleft()
+        self.pool.submit(self._run, job, fn, True)
+
+    def _run(self, job: Job, fn: Callable[[Job], Any], aws: bool):
+        try:
+            try:
+                job.status, job.started_at = RUNNING, time.time()
+                job.update(message="running")
+                job.result = fn(job)
+                job.status = DONE
+                job.update(1.0, "done")
+            finally:
+                if aws:
+                    self._release_aws()
+        except Exception as e:
+            job.status, job.error = FAILED, f"{type(e).__name__}: {e}"
+            job.update(message="failed")
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            with self.lock:
+                if self.inflight.get(job.key) is job:
+                    del self.inflight[job.key]
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if not j.active]
+        for j in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self.jobs[j.id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def recent(self, limit: int = 20) -> List[Job]:
+        with self.lock:
+            return list(reversed(self.jobs.values()))[:limit]
+
+
+QUEUE = JobQueue()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Lease-based coordination between monitor processes.
+
+Leases live in the shared SQLite file (db.py). A lease has one owner and an
+expiry; the owner renews it, and anyone may take it over once it expires, so
+a dead worker's accounts move to the survivors within LEASE_TTL_SECONDS.
+
+Two uses:
+  - the "monitor" singleton lease: at most one plain realtime_monitor.py runs
+    (app.monitor_start checks it instead of spawning duplicates);
+  - worker mode (realtime_monitor.py --worker): N processes share a set of
+    accounts, each account leased to exactly one worker. Workers balance by
+    observed cycle cost (an EWMA per account), not by account count.
+
+Usage:
+  python leases.py list
+  python leases.py costs
+"""
+import argparse
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+from db import connect
+
+# ----------------- CONFIG -----------------
+LEASE_TTL_SECONDS = 60                # a lease not renewed for this long can be taken over
+COST_ALPHA = 0.3                      # EWMA weight of the newest cycle duration
+DEFAULT_COST = 10.0                   # assumed cycle seconds for an account never measured
+BALANCE_SLACK = 0.25                  # tolerate load up to (1 + slack) x fair share before shedding
+SINGLETON = "monitor"
+ACCOUNT_PREFIX = "account:"
+# ------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name        TEXT PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    host        TEXT,
+    pid         INTEGER,
+    acquired_at REAL NOT NULL,
+    expires_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_leases_owner ON leases(owner);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    host      TEXT,
+    pid       INTEGER,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS account_costs (
+    account    TEXT PRIMARY KEY,
+    ewma       REAL NOT NULL,
+    samples    INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseManager:
+    """Acquire / renew / release leases and balance account ownership for one worker."""
+
+    def __init__(self, worker_id: Optional[str] = None, ttl: float = LEASE_TTL_SECONDS, path=None):
+        self.worker_id = worker_id or new_worker_id()
+        self.ttl = ttl
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+        self.conn = connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- single leases ---
+    def acquire(self, name: str, now: float = None) -> bool:
+        """Take (or renew) a lease if it is free, expired or already ours."""
+        now = now or time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO leases(name, owner, host, pid, acquired_at, expires_at) VALUES(?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, host = excluded.host, pid = excluded.pid, "
+                "acquired_at = CASE WHEN leases.owner = excluded.owner THEN leases.acquired_at ELSE excluded.acquired_at END, "
+                "expires_at = excluded.expires_at "
+                "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                (name, self.worker_id, self.host, self.pid, now, now + self.ttl, now),
+            )
+        row = self.conn.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+        return bool(row) and row["owner"] == self.worker_id
+
+    def renew(self, names: Iterable[str], now: float = None) -> List[str]:
+        """Extend leases we still hold; returns the names still ours."""
+        now = now or time.time()
+        names = list(names)
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE leases SET expires_at = ? WHERE name = ? AND owner = ?",
+                [(now + self.ttl, n, self.worker_id) for n in names],
+            )
+        return [n for n in names if n in self.owned(now)]
+
+    def release(self, name: str):
+        with self.conn:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, self.worker_id))
+
+    def release_all(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM leases WHERE owner = ?", (self.worker_id,))
+            self.conn.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+
+    def owned(self, now: float = None) -> List[str]:
+        now = now or time.time()
+        return [r["name"] for r in self.conn.execute(
+            "SELECT name FROM leases WHERE owner = ? AND expires_at >= ?", (self.worker_id, now))]
+
+    # --- worker mode ---
+    def heartbeat(self, now: float = None):
+        now = now or time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO workers(worker_id, host, pid, heartbeat) VALUES(?, ?, ?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (self.worker_id, self.host, self.pid, now),
+            )
+            self.conn.execute("DELETE FROM workers WHERE heartbeat < ?", (now - 2 * self.ttl,))
+
+    def record_cost(self, account: str, seconds: float, now: float = None):
+        """Fold one cycle duration into the account's EWMA cost."""
+        now = now or time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO account_costs(account, ewma, samples, updated_at) VALUES(?, ?, 1, ?) "
+                "ON CONFLICT(account) DO UPDATE SET ewma = ? * excluded.ewma + (1 - ?) * account_costs.ewma, "
+                "samples = account_costs.samples + 1, updated_at = excluded.updated_at",
+                (account, seconds, now, COST_ALPHA, COST_ALPHA),
+            )
+
+    def costs(self, accounts: Iterable[str]) -> Dict[str, float]:
+        known = {r["account"]: r["ewma"] for r in self.conn.execute("SELECT account, ewma FROM account_costs")}
+        measured = [known[a] for a in accounts if a in known]
+        # Unmeasured accounts are assumed to cost what a typical measured one does
+        default = sorted(measured)[len(measured) // 2] if measured else DEFAULT_COST
+        return {a: known.get(a, default) for a in accounts}
+
+    def rebalance(self, accounts: Iterable[str], now: float = None) -> List[str]:
+        """
+        Renew our account leases, shed load above our fair share and pick up
+        free or expired accounts up to it. Returns the accounts we now own.
+        """
+        now = now or time.time()
+        accounts = list(accounts)
+        self.heartbeat(now)
+        cost = self.costs(accounts)
+        live = [r["worker_id"] for r in self.conn.execute(
+            "SELECT worker_id FROM workers WHERE heartbeat >= ? ORDER BY worker_id", (now - self.ttl,))]
+        if self.worker_id not in live:
+            live.append(self.worker_id)
+        share = sum(cost.values()) / len(live)
+
+        leases = {
+            r["name"][len(ACCOUNT_PREFIX):]: r
+            for r in self.conn.execute("SELECT * FROM leases WHERE name LIKE ?", (ACCOUNT_PREFIX + "%",))
+            if r["expires_at"] >= now
+        }
+        mine = {a for a in accounts if a in leases and leases[a]["owner"] == self.worker_id}
+        load = {w: 0.0 for w in live}
+        for a, r in leases.items():
+            if a in cost and r["owner"] in load:
+                load[r["owner"]] += cost[a]
+
+        # Shed: drop our cheapest accounts while above share * (1 + slack), keeping at least one
+        me, limit, shed = self.worker_id, share * (1 + BALANCE_SLACK), set()
+        for a in sorted(mine, key=lambda x: cost[x]):
+            if load[me] <= limit or len(mine) <= 1:
+                break
+            self.release(ACCOUNT_PREFIX + a)
+            mine.discard(a)
+            shed.add(a)
+            load[me] -= cost[a]
+
+        # Take: free accounts, most expensive first, while under our share. The
+        # least-loaded live worker also takes leftovers so nothing stays unowned.
+        free = sorted((a for a in accounts if a not in leases and a not in shed), key=lambda x: -cost[x])
+        for a in free:
+            least = min(load, key=lambda w: (load[w], w)) == me
+            if (load[me] + cost[a] <= share or least) and self.acquire(ACCOUNT_PREFIX + a, now):
+                mine.add(a)
+                load[me] += cost[a]
+
+        still = self.renew([ACCOUNT_PREFIX + a for a in mine], now)
+        return sorted(n[len(ACCOUNT_PREFIX):] for n in still)
+
+
+def holder(name: str = SINGLETON, path=None) -> Optional[Dict]:
+    """Current unexpired holder of a lease (owner, host, pid, ...), or None."""
+    conn = connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        row = conn.execute("SELECT * FROM leases WHERE name = ? AND expires_at >= ?", (name, time.time())).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def live_workers(path=None) -> List[Dict]:
+    """Worker-mode processes that heartbeated within the lease TTL."""
+    conn = connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        return [dict(r) for r in conn.execute(
+            "SELECT * FROM workers WHERE heartbeat >= ? ORDER BY worker_id", (time.time() - LEASE_TTL_SECONDS,))]
+    finally:
+        conn.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inspect monitor leases")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list")
+    sub.add_parser("costs")
+    args = ap.parse_args()
+
+    conn = connect()
+    try:
+        conn.executescript(SCHEMA)
+        now = time.time()
+        if args.cmd == "list":
+            for r in conn.execute("SELECT * FROM leases ORDER BY name"):
+                state = "live" if r["expires_at"] >= now else "expired"
+                print(f"{r['name']:<40} {r['owner']:<40} {state:<8} expires in {r['expires_at'] - now:6.0f}s")
+        elif args.cmd == "costs":
+            for r in conn.execute("SELECT * FROM account_costs ORDER BY ewma DESC"):
+                print(f"{r['account']:<30} {r['ewma']:8.2f}s  ({r['samples']} cycles)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
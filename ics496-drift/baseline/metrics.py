@@ -0,0 +1,241 @@
+"""
+In-process metrics with a Prometheus text endpoint.
+
+AWS API calls are measured through botocore's event hooks (`instrument_session`),
+so enumerate_baseline / cloudtrail_fetch / event_store need no hand
+instrumentation: any client created from an instrumented session is counted.
+
+Usage:
+  import metrics
+  metrics.instrument_session(boto3.session.Session())
+  metrics.start_http_server(9108)          # GET http://127.0.0.1:9108/metrics
+  with metrics.timer(metrics.CYCLE_PHASE_SECONDS, phase="compare", account="default"):
+      ...
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+THROTTLE_CODES = {
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "RequestLimitExceeded", "SlowDown", "RequestThrottled",
+    "ProvisionedThroughputExceededException", "BandwidthLimitExceeded",
+}
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_LOCK = threading.Lock()
+_REGISTRY: List["_Metric"] = []
+
+
+def _labels_key(labelnames: Sequence[str], labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(n, "")) for n in labelnames)
+
+
+def _fmt_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        with _LOCK:
+            _REGISTRY.append(self)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels_key(self.labelnames, labels)
+        with _LOCK:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {v:g}" for k, v in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _labels_key(self.labelnames, labels)
+        with _LOCK:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], list] = {}   # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _labels_key(self.labelnames, labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _LOCK:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self) -> List[str]:
+        out = []
+        for key, row in sorted(self.values.items()):
+            cum = 0
+            for b, n in zip(self.buckets, row):
+                cum += n
+                le = 'le="%g"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cum}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {row[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {row[-2]:g}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {row[-1]}")
+        return out
+
+
+# --- the metrics the monitor and app publish ---
+CYCLE_SECONDS = Histogram("drift_cycle_seconds", "Wall time of a full monitor cycle", ["account"])
+CYCLE_PHASE_SECONDS = Histogram("drift_cycle_phase_seconds", "Wall time per cycle phase", ["phase", "account"])
+CYCLES_SKIPPED = Counter("drift_cycles_skipped_total", "Ticks skipped because the previous cycle was still running", ["account"])
+API_CALLS = Counter("drift_aws_api_calls_total", "AWS API calls by service/operation and HTTP status", ["service", "operation", "status"])
+API_LATENCY = Histogram("drift_aws_api_latency_seconds", "AWS API call latency (including retries)", ["service", "operation"])
+API_THROTTLES = Counter("drift_aws_api_throttles_total", "Throttled AWS API attempts", ["service", "operation"])
+API_ERRORS = Counter("drift_aws_api_errors_total", "Failed AWS API calls by error code", ["service", "operation", "code"])
+API_RETRIES = Counter("drift_aws_api_retries_total", "AWS API attempts that were retried", ["service", "operation"])
+SNAPSHOT_BYTES = Gauge("drift_snapshot_bytes", "Size of the latest snapshot file", ["account"])
+SNAPSHOT_RESOURCES = Gauge("drift_snapshot_resources", "Resources in the latest snapshot", ["account", "section"])
+DIFF_CHANGES = Histogram("drift_diff_changes", "Structured changes per compare", ["account"], buckets=SIZE_BUCKETS)
+DIFF_CACHE_LOOKUPS = Counter("drift_diff_cache_lookups_total", "Compare result cache lookups", ["kind", "result"])
+LOG_RECORDS_DROPPED = Counter("drift_log_records_dropped_total", "Log records dropped because the writer queue was full", ["logger"])
+HTTP_REQUEST_SECONDS = Histogram("drift_http_request_seconds", "Dashboard request latency", ["endpoint", "method", "status"])
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format."""
+    lines = []
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    for m in metrics:
+        lines.append(f"# HELP {m.name} {m.doc}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        with _LOCK:
+            lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def timer(hist: Histogram, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - t0, **labels)
+
+
+# --- botocore hooks ---
+def _op(event_name: str) -> Tuple[str, str]:
+    # e.g. "before-call.ec2.DescribeSecurityGroups"
+    parts = event_name.split(".")
+    return (parts[1] if len(parts) > 1 else "?"), (parts[2] if len(parts) > 2 else "?")
+
+
+def _before_call(event_name=None, context=None, **kwargs):
+    if context is not None:
+        context["_metrics_t0"] = time.perf_counter()
+
+
+def _after_call(event_name=None, http_response=None, parsed=None, context=None, **kwargs):
+    service, op = _op(event_name)
+    t0 = (context or {}).get("_metrics_t0")
+    if t0 is not None:
+        API_LATENCY.observe(time.perf_counter() - t0, service=service, operation=op)
+    status = getattr(http_response, "status_code", 0)
+    API_CALLS.inc(service=service, operation=op, status=status)
+    code = ((parsed or {}).get("Error") or {}).get("Code")
+    if code:
+        API_ERRORS.inc(service=service, operation=op, code=code)
+
+
+def _after_call_error(event_name=None, exception=None, **kwargs):
+    service, op = _op(event_name)
+    API_CALLS.inc(service=service, operation=op, status="error")
+    API_ERRORS.inc(service=service, operation=op, code=type(exception).__name__)
+
+
+def _needs_retry(event_name=None, response=None, attempts=None, **kwargs):
+    # Called once per attempt; response is (http_response, parsed) or None
+    service, op = _op(event_name)
+    parsed = response[1] if response else {}
+    code = ((parsed or {}).get("Error") or {}).get("Code")
+    if code in THROTTLE_CODES:
+        API_THROTTLES.inc(service=service, operation=op)
+    if attempts and attempts > 1:
+        API_RETRIES.inc(service=service, operation=op)
+    return None
+
+
+def instrument_session(session):
+    """Register the metric hooks on a boto3 (or botocore) session. Safe to call more than once."""
+    events = session.events if hasattr(session, "events") else session.get_component("event_emitter")
+    events.register("before-call", _before_call, unique_id="drift-metrics-before")
+    events.register("after-call", _after_call, unique_id="drift-metrics-after")
+    events.register("after-call-error", _after_call_error, unique_id="drift-metrics-after-error")
+    events.register("needs-retry", _needs_retry, unique_id="drift-metrics-retry")
+    return session
+
+
+def instrument_default_session():
+    """Instrument boto3's default session (used by bare boto3.client(...) calls)."""
+    import boto3
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    return instrument_session(boto3.DEFAULT_SESSION)
+
+
+# --- HTTP endpoint ---
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port: int, addr: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread. Returns the server (call .shutdown() to stop)."""
+    server = ThreadingHTTPServer((addr, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Promote a snapshot (or some of its categories) into Baseline.json.
+
+This used to be an interactive prompt inside the monitor loop; it is now a
+separate command so the monitor never blocks waiting on stdin.
+
+Usage:
+  python promote_baseline.py                       # newest snapshot, prompts for categories
+  python promote_baseline.py baseline_<ts>.json --categories iam,s3
+  python promote_baseline.py baseline_<ts>.json --all
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List
+
+from realtime_monitor import log, newest_snapshot_name, BASELINE_FILE
+
+
+def write_baseline(data, baseline_path: str = BASELINE_FILE):
+    """
+    Write the baseline to a temp file and rename it over the old one, so the
+    monitor and the app never read a half-written Baseline.json.
+    """
+    tmp = f"{baseline_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as fbw:
+            json.dump(data, fbw, indent=2, sort_keys=True)
+        os.replace(tmp, baseline_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def promote(snapshot_path: str, categories: List[str], baseline_path: str = BASELINE_FILE) -> List[str]:
+    """
+    Copy the given top-level categories of a snapshot into the baseline, or
+    replace the baseline entirely when categories == ["all"].
+    Returns the categories actually updated.
+    """
+    with open(snapshot_path, 'r', encoding='utf-8') as fnew:
+        new_snap = json.load(fnew)
+
+    if [c.lower() for c in categories] == ['all']:
+        write_baseline(new_snap, baseline_path)
+        log(f"Replaced entire baseline with snapshot: {snapshot_path}")
+        return sorted(new_snap.keys())
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r', encoding='utf-8') as fb:
+            try:
+                baseline = json.load(fb)
+            except Exception:
+                baseline = {}
+
+    updated = []
+    for c in categories:
+        if c in new_snap:
+            baseline[c] = new_snap[c]
+            updated.append(c)
+        else:
+            log(f"Category not found in snapshot: {c}")
+    if updated:
+        write_baseline(baseline, baseline_path)
+        log(f"Updated baseline categories: {', '.join(updated)} from {snapshot_path}")
+    else:
+        log("No valid categories selected; baseline unchanged")
+    return updated
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Promote snapshot categories into Baseline.json")
+    ap.add_argument("snapshot", nargs="?", help="snapshot file (default: newest)")
+    ap.add_argument("--categories", help="comma-separated categories to copy (e.g. iam,s3)")
+    ap.add_argument("--all", action="store_true", help="replace the whole baseline")
+    ap.add_argument("--baseline", default=BASELINE_FILE)
+    args = ap.parse_args()
+
+    fname = args.snapshot
+    if not fname:
+        d = os.path.dirname(args.baseline) or "."
+        newest = newest_snapshot_name(d)
+        fname = os.path.join(d, newest) if newest else None
+    if not fname or not os.path.exists(fname):
+        print("Snapshot file not found.")
+        sys.exit(1)
+
+    if args.all:
+        cats = "all"
+    elif args.categories:
+        cats = args.categories
+    else:
+        if not sys.stdin.isatty():
+            print("Pass --categories or --all when not running interactively.")
+            sys.exit(1)
+        with open(fname, 'r', encoding='utf-8') as f:
+            avail = sorted(json.load(f).keys())
+        print(f"Update '{args.baseline}' from '{fname}'.")
+        print("\nAvailable categories in the snapshot:")
+        for k in avail:
+            print(f"  - {k}")
+        cats = input("Enter comma-separated categories to copy, or 'all' to replace the baseline: ").strip()
+        if not cats:
+            log("Empty category selection; baseline unchanged")
+            return
+
+    selected = [c.strip() for c in cats.split(',') if c.strip()]
+    try:
+        promote(fname, selected, args.baseline)
+    except Exception as e:
+        log(f"Failed to update baseline: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,75 @@
 #!/usr/bin/env python3
 """
 Realtime Drift Monitor
-- Runs `enumerate_baseline.py` to create snapshots.
+- Captures a snapshot per account (enumerate_baseline, in a worker thread) at a fixed rate with jitter.
 - Compares each snapshot to Baseline.json (if present) or the previous snapshot.
-- Logs any drift and (optionally) queries CloudTrail for related events.
+- Against the baseline, only drift state transitions (opened / changed / resolved, see
+  drift_state.py) are logged, so persistent drift isn't re-reported every cycle.
+- Logs any drift and (optionally) queries CloudTrail for related events; enrichment
+  runs concurrently with the next collection.
+- Never runs two cycles for the same account at once; a tick that finds the previous
+  cycle still running is skipped.
 - Automatically keeps ONLY the last 10 snapshots.
+- Shuts down gracefully on SIGTERM / Ctrl-C.
+- Optional per-cycle Chrome traces (--trace) and cProfile dumps (--profile-every N), see tracing.py.
+- Only one plain monitor runs at a time (a lease in the drift DB, see leases.py). With
+  --worker, N processes split the accounts instead: each account is leased to exactly
+  one worker, leases of dead workers are taken over, and load is balanced by the
+  observed per-account cycle cost.
+- Exposes cycle/API/throttle metrics on http://127.0.0.1:9108/metrics (see metrics.py).
+
+Promoting a snapshot into Baseline.json is a separate command: promote_baseline.py
+
+Usage:
+  python realtime_monitor.py [--interval 20] [--jitter 2] [--account PROFILE ...] [--once] [--metrics-port 9108]
+                              [--trace] [--profile-every N]
+  python realtime_monitor.py --worker --accounts-file accounts.txt --metrics-port 0   # x N processes
 
 TENTATIVE TO CHANGE - angello 10-26-25
 """
-from typing import Optional
+from typing import Dict, Optional, Set
 
-import subprocess
-import time
+import argparse
+import asyncio
 import os
+import random
+import signal
 import sys
-import json
-import select
-import re
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 UTC = timezone.utc
 
+import boto3
+
+from compare_baseline import load, diff_snapshots, render_report
+from enumerate_baseline import build_snapshot, write_snapshot
+from resource_history import index_snapshot
+from columnar_export import export_snapshot
+from snapshot_index import remove_index
+import baseline_index
+from drift_state import DriftTracker, describe
+from drift_store import DriftStore
+from drift_logging import setup_logging
+import metrics
+import tracing
+from leases import LeaseManager, SINGLETON, holder
+
 try:
-    from cloudtrail_fetch import find_events_for_keywords
+    from correlate import correlate, targets, capture_window, format_event
 except Exception:
-    find_events_for_keywords = None
+    correlate = None
 
 # ----------------- CONFIG -----------------
 SNAP_PREFIX = "snapshot_"             # new naming
 SNAP_GLOB = f"{SNAP_PREFIX}*.json"
 FALLBACK_GLOB = "baseline_*.json"     # for transition only
-SLEEP_SECONDS = 20
+SLEEP_SECONDS = 20                    # cycle period (fixed rate, not work + sleep)
+JITTER_SECONDS = 2                    # +/- random offset per tick so accounts don't fire in lockstep
+SHUTDOWN_GRACE_SECONDS = 30           # how long in-flight cycles get to finish on SIGTERM
 LOGFILE = "realtime_monitor.log"
+JSONLOG = "realtime_monitor.jsonl"    # structured records (see drift_logging.py)
 BASELINE_FILE = "Baseline.json"
+ACCOUNTS_DIR = "accounts"             # named profiles keep their snapshots in accounts/<profile>/
+METRICS_PORT = int(os.environ.get("DRIFT_METRICS_PORT", "9108"))  # Prometheus text on 127.0.0.1; 0 disables
 
 # Use the SAME interpreter that launched this script
 PY = sys.executable
@@ -42,73 +80,137 @@ def now_ts() -> str:
     return datetime.now(UTC).strftime("%Y-%m-%dT%H-%M-%SZ")
 
 
-def log(msg: str):
-    ts = now_ts()
-    with open(LOGFILE, "a", encoding="utf-8") as f:
-        f.write(f"[{ts}] {msg}\n")
-    print(f"[{ts}] {msg}")
+def log(msg: str, **fields):
+    """Queue a log line (text log + console) and a structured JSON-lines record with `fields`."""
+    setup_logging(logfile=LOGFILE, jsonfile=JSONLOG).info(msg, extra={"fields": fields})
 
 
+def account_dir(profile: Optional[str]) -> str:
+    """Working directory for an account: '.' for default credentials, accounts/<profile>/ otherwise."""
+    if not profile:
+        return "."
+    d = os.path.join(ACCOUNTS_DIR, profile)
+    os.makedirs(d, exist_ok=True)
+    return d
 
-def newest_snapshot_name() -> Optional[str]:
-    """Return newest snapshot file (prefers snapshot_*.json, falls back to baseline_*.json)."""
-    files = sorted(
-        [f for f in os.listdir('.') if f.startswith(SNAP_PREFIX) and f.endswith('.json')],
-        key=os.path.getmtime
+
+def _snapshot_files(directory: str, prefix: str):
+    return sorted(
+        [f for f in os.listdir(directory) if f.startswith(prefix) and f.endswith('.json')],
+        key=lambda f: os.path.getmtime(os.path.join(directory, f))
     )
+
+
+def newest_snapshot_name(directory: str = ".") -> Optional[str]:
+    """Return newest snapshot file (prefers snapshot_*.json, falls back to baseline_*.json)."""
+    files = _snapshot_files(directory, SNAP_PREFIX)
     if files:
         return files[-1]
     # fallback (transition period)
-    files = sorted(
-        [f for f in os.listdir('.') if f.startswith('baseline_') and f.endswith('.json')],
-        key=os.path.getmtime
-    )
+    files = _snapshot_files(directory, 'baseline_')
     return files[-1] if files else None
 
 
-def run_enumerate():
-    """Run enumerate_baseline.py and return (filename, rc, stdout, stderr)."""
-    proc = subprocess.run([PY, "enumerate_baseline.py"], capture_output=True, text=True)
-    out = proc.stdout.strip()
-    fname = None
-
-    # enumerate prints: "Wrote <filename>"
-    if out:
-        parts = out.split()
-        if len(parts) >= 2 and parts[0] == "Wrote":
-            fname = parts[1]
+def run_enumerate(profile: Optional[str] = None, directory: str = "."):
+    """Capture a snapshot for one account (blocking; run in a worker thread). Returns (file name, snapshot)."""
+    # A fresh Session per call: boto3 sessions are not thread-safe
+    session = boto3.session.Session(profile_name=profile) if profile else boto3.session.Session()
+    metrics.instrument_session(session)
+    tracing.instrument_session(session)
+    snapshot = build_snapshot(session)
+    fname = write_snapshot(snapshot, directory)
+    account = profile or "default"
+    metrics.SNAPSHOT_BYTES.set(os.path.getsize(os.path.join(directory, fname)), account=account)
+    for section, key in (("iam", "Users"), ("s3", "Buckets"), ("ec2", "SecurityGroups")):
+        metrics.SNAPSHOT_RESOURCES.set(len(snapshot.get(section, {}).get(key, [])), account=account, section=section)
+    return fname, snapshot
 
-    # Fallback: pick newest snapshot_* (then baseline_* for transition)
-    if not fname:
-        fname = newest_snapshot_name()
 
-    return fname, proc.returncode, proc.stdout, proc.stderr
+def run_archive(snapshot, fname: str, account: str = "default"):
+    """Resource history + columnar export of a captured snapshot (blocking; after compare, off the cycle path)."""
+    try:
+        index_snapshot(snapshot, fname, account)
+    except Exception as e:
+        log(f"[{account}] resource history update failed: {e}")
+    try:
+        export_snapshot(snapshot, fname, account)
+    except Exception as e:
+        log(f"[{account}] columnar export failed: {e}")
+
+
+def run_compare(old_path: str, new_path: str, indexed: Optional[baseline_index.IndexedBaseline] = None):
+    """
+    Compare two snapshot files in-process. Returns (diff, report_text, old_snap, new_snap).
+    With an IndexedBaseline for old_path, only the new snapshot is loaded and indexed.
+    """
+    new = load(new_path)
+    if indexed is not None:
+        diff = indexed.diff(new)
+        return diff, render_report(diff), indexed.data, new
+    old = load(old_path)
+    diff = diff_snapshots(old, new)
+    return diff, render_report(diff), old, new
+
+
+def track_drift(changes, account: str = "default"):
+    """Feed a baseline compare into the drift state machine; returns the transitions."""
+    tracker = DriftTracker()
+    try:
+        return tracker.update(changes, account)
+    finally:
+        tracker.close()
 
 
-def run_compare(old_path: str, new_path: str):
-    proc = subprocess.run([PY, "compare_baseline.py", old_path, new_path], capture_output=True, text=True)
-    return proc.returncode, proc.stdout, proc.stderr
+def record_drift(baseline: str, snapshot: str, diff, account: str = "default", new_snap=None) -> Optional[int]:
+    """Persist a compare result (or a baseline compare's transitions) to the drift store. Returns the comparison id."""
+    try:
+        store = DriftStore()
+        try:
+            captured = ((new_snap or {}).get("meta") or {}).get("captured_at_utc")
+            return store.record_comparison(os.path.basename(baseline), os.path.basename(snapshot), diff,
+                                           source="monitor", account=account, captured_at=captured)
+        finally:
+            store.close()
+    except Exception as e:
+        log(f"Failed to record drift: {e}")
+        return None
+
+
+def record_heartbeat(baseline: str, snapshot: str, account: str = "default", new_snap=None, account_mismatch=False):
+    """Note a baseline compare in the drift store's per-account heartbeat (no comparison row)."""
+    try:
+        store = DriftStore()
+        try:
+            captured = ((new_snap or {}).get("meta") or {}).get("captured_at_utc")
+            store.heartbeat(os.path.basename(baseline), os.path.basename(snapshot), account, captured, account_mismatch)
+        finally:
+            store.close()
+    except Exception as e:
+        log(f"Failed to record heartbeat: {e}")
+
+
+def record_enrichment(comparison_id: int, events):
+    store = DriftStore()
+    try:
+        store.add_enrichment(comparison_id, events)
+    finally:
+        store.close()
 
 
-def trim_snapshots_keep_last_10():
+def trim_snapshots_keep_last_10(directory: str = "."):
     """Delete older snapshots, keeping only the 10 most recent (prefers snapshot_*; also trims legacy baseline_*)."""
     # Primary set
-    snaps = sorted(
-        [f for f in os.listdir('.') if f.startswith(SNAP_PREFIX) and f.endswith('.json')],
-        key=os.path.getmtime
-    )
+    snaps = _snapshot_files(directory, SNAP_PREFIX)
     # Legacy set (only if still present)
-    legacy = sorted(
-        [f for f in os.listdir('.') if f.startswith('baseline_') and f.endswith('.json')],
-        key=os.path.getmtime
-    )
+    legacy = _snapshot_files(directory, 'baseline_')
 
     # Trim primary snapshots to last 10
     if len(snaps) > 10:
         old = snaps[:-10]
         for rm in old:
             try:
-                os.remove(rm)
+                os.remove(os.path.join(directory, rm))
+                remove_index(os.path.join(directory, rm))
                 log(f"Removed old snapshot: {rm}")
             except Exception as e:
                 log(f"Failed to remove {rm}: {e}")
@@ -118,185 +220,322 @@ def trim_snapshots_keep_last_10():
         old_leg = legacy[:-2]
         for rm in old_leg:
             try:
-                os.remove(rm)
+                os.remove(os.path.join(directory, rm))
+                remove_index(os.path.join(directory, rm))
                 log(f"Removed old legacy snapshot: {rm}")
             except Exception as e:
                 log(f"Failed to remove legacy {rm}: {e}")
 
     # Count after trimming
-    count = len([f for f in os.listdir('.') if (f.startswith(SNAP_PREFIX) or f.startswith('baseline_')) and f.endswith('.json')])
+    count = len([f for f in os.listdir(directory) if (f.startswith(SNAP_PREFIX) or f.startswith('baseline_')) and f.endswith('.json')])
     log(f"Snapshot count (after trim): {count}")
 
 
-def main():
-    log(f"Starting realtime monitor (every {SLEEP_SECONDS}s)")
-
-    prev = newest_snapshot_name()
-    if prev:
-        log(f"Using existing snapshot as previous: {prev}")
-
-    if os.path.exists(BASELINE_FILE):
-        log(f"Found canonical baseline: {BASELINE_FILE}")
-
-    try:
-        while True:
-            fname, rc, sout, serr = run_enumerate()
-            if rc != 0:
-                log(f"enumerate_baseline.py failed (rc={rc}). stderr: {serr.strip()}")
-                time.sleep(SLEEP_SECONDS)
-                continue
-
-            if not fname:
-                log("Could not determine new snapshot filename; skipping compare")
-                time.sleep(SLEEP_SECONDS)
-                continue
-
-            log(f"Captured snapshot: {fname}")
-
-            # Prefer Baseline.json when available, otherwise previous snapshot
-            compare_target = BASELINE_FILE if os.path.exists(BASELINE_FILE) else prev
-            if not compare_target:
-                log("No baseline or previous snapshot yet; skipping compare.")
-                prev = fname
-                trim_snapshots_keep_last_10()
-                time.sleep(SLEEP_SECONDS)
-                continue
-
-            rc2, sout2, serr2 = run_compare(compare_target, fname)
-            if rc2 != 0:
-                log(f"compare_baseline.py returned rc={rc2}. stderr: {serr2.strip()}")
-
-            if sout2 and sout2.strip():
-                log(f"Drift detected between {compare_target} and {fname}:")
+class Monitor:
+    """Fixed-rate, overlap-safe drift monitor for one or more accounts (AWS profiles)."""
+
+    def __init__(self, profiles=None, interval: float = SLEEP_SECONDS, jitter: float = JITTER_SECONDS,
+                 tracer: Optional[tracing.CycleTracer] = None, leases: Optional[LeaseManager] = None,
+                 worker: bool = False):
+        self.profiles = list(profiles or [None])
+        self.interval = interval
+        self.jitter = jitter
+        self.tracer = tracer or tracing.CycleTracer()
+        # Worker mode: only accounts whose lease we hold are cycled (None = all of them)
+        self.leases = leases
+        self.worker = worker
+        self.owned: Optional[Set[str]] = set() if worker else None
+        self.costs: Dict[str, float] = {}
+        self.stop: Optional[asyncio.Event] = None
+        self.locks: Dict[Optional[str], asyncio.Lock] = {}
+        self.prev: Dict[Optional[str], Optional[str]] = {}
+        self.tasks: Set[asyncio.Task] = set()
+
+    def _setup(self):
+        # Created inside the running loop (asyncio primitives bind to a loop on 3.9)
+        self.stop = asyncio.Event()
+        self.locks = {p: asyncio.Lock() for p in self.profiles}
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def cycle(self, profile: Optional[str]):
+        """Collect + compare one account. Enrichment, history and export are handed off so the next collection isn't delayed."""
+        name = profile or "default"
+        directory = account_dir(profile)
+        try:
+            with metrics.timer(metrics.CYCLE_PHASE_SECONDS, phase="enumerate", account=name):
+                fname, snapshot = await asyncio.to_thread(tracing.call, run_enumerate, profile, directory)
+        except Exception as e:
+            log(f"[{name}] enumerate failed: {e}")
+            return
+        log(f"[{name}] Captured snapshot: {fname}" if profile else f"Captured snapshot: {fname}",
+            event="snapshot", account=name, snapshot=fname)
+
+        prev = self.prev.get(profile)
+        baseline = os.path.normpath(os.path.join(directory, BASELINE_FILE))
+        # Prefer Baseline.json when available, otherwise previous snapshot
+        compare_target = baseline if os.path.exists(baseline) else (prev and os.path.normpath(os.path.join(directory, prev)))
+        new_path = os.path.normpath(os.path.join(directory, fname))
+        self.prev[profile] = fname
+        if not compare_target:
+            log("No baseline or previous snapshot yet; skipping compare.")
+            self._spawn(self.archive(snapshot, fname, name))
+            await asyncio.to_thread(trim_snapshots_keep_last_10, directory)
+            return
+
+        try:
+            with metrics.timer(metrics.CYCLE_PHASE_SECONDS, phase="compare", account=name):
+                # The baseline stays parsed and indexed across cycles (reloaded when the file changes)
+                indexed = baseline_index.get(baseline) if compare_target == baseline else None
+                diff, report, old_snap, new_snap = await asyncio.to_thread(
+                    tracing.call, run_compare, compare_target, new_path, indexed)
+            metrics.DIFF_CHANGES.observe(len(diff["changes"]), account=name)
+        except Exception as e:
+            log(f"Compare failed for {compare_target} vs {new_path}: {e}")
+            diff = None
+
+        if diff is not None and compare_target == baseline:
+            # Against the baseline, drift persists until fixed or promoted: only
+            # report (and enrich) state transitions, not the same diff every cycle.
+            # Transitions (resolved ones included) are recorded as a comparison; every
+            # compare updates the account's heartbeat, so the dashboard follows the open
+            # drift as it clears without a row per cycle.
+            try:
+                transitions = await asyncio.to_thread(track_drift, diff["changes"], profile or "default")
+            except Exception as e:
+                log(f"Drift state update failed: {e}")
+                transitions = [dict(c, transition="opened") for c in diff["changes"]]
+            fresh = [t for t in transitions if t["transition"] != "resolved"]
+            for t in transitions:
+                log(describe(t), event="drift", account=name, transition=t["transition"], section=t["section"],
+                    resource=t["resource"], field=t.get("field"), first_seen=t.get("first_seen"))
+            cid = None
+            if transitions:
+                cid = await asyncio.to_thread(record_drift, compare_target, new_path, dict(diff, changes=transitions),
+                                              name, new_snap)
+            await asyncio.to_thread(record_heartbeat, compare_target, new_path, name, new_snap, diff["account_mismatch"])
+            if fresh or diff["account_mismatch"]:
+                diff = dict(diff, changes=fresh)
+                log(f"Drift detected between {compare_target} and {new_path}:")
                 log("--- compare stdout begin ---")
-
-                # Collect candidate keywords for CloudTrail search
-                compare_text = sout2
-                keywords = set()
-                # security group ids
-                for m in re.findall(r"sg-[0-9a-fA-F]+", compare_text):
-                    keywords.add(m)
-                # bucket names / s3 policy hints
-                for line in compare_text.splitlines():
-                    for token in line.split():
-                        if 'bucket' in token.lower() or token.startswith('arn:aws:s3'):
-                            kw = token.strip('[],()"')
-                            keywords.add(kw)
-                # rough usernames / tokens
-                for m in re.findall(r"[A-Za-z0-9_\-]+", compare_text):
-                    if len(m) > 2 and m.lower() not in ('added','removed','was','now','sg','bucket','s3','iam','ec2','aws'):
-                        keywords.add(m)
-
-                for line in sout2.splitlines():
+                for line in render_report(diff).splitlines():
                     log("  " + line)
                 log("--- compare stdout end ---")
-
-                if serr2 and serr2.strip():
-                    log("--- compare stderr begin ---")
-                    for line in serr2.splitlines():
-                        log("  " + line)
-                    log("--- compare stderr end ---")
-
-                # CloudTrail enrichment (optional)
-                if find_events_for_keywords:
-                    try:
-                        end_t = datetime.now(UTC)
-                        start_t = end_t - timedelta(minutes=10)
-                        kws = [k for k in keywords if k]
-                        if kws:
-                            preview = ", ".join(sorted(kws)[:10])
-                            log(f"Searching CloudTrail for keywords: {preview}...")
-                            events = find_events_for_keywords(kws, start_t, end_t)
-                            if events:
-                                log(f"Found {len(events)} CloudTrail event(s) related to the drift:")
-                                for ev in events[:10]:
-                                    u = ev.get('userIdentity') or {}
-                                    uname = (u.get('userName') or u.get('arn') or str(u))
-                                    ip = ev.get('sourceIPAddress')
-                                    en = ev.get('eventName')
-                                    et = ev.get('eventTime')
-                                    log(f"  - {et} {en} by {uname} from {ip}")
-                            else:
-                                log("No matching CloudTrail events found in the recent window")
-                    except Exception as e:
-                        log(f"CloudTrail lookup failed: {e}")
+                if correlate and fresh:
+                    self._spawn(self.enrich(diff, old_snap, new_snap, cid, name))
+            elif diff["changes"]:
+                log(f"No new drift between {compare_target} and {new_path} ({len(diff['changes'])} item(s) still open)")
             else:
-                log(f"No drift detected between {compare_target} and {fname}")
-
-            # Update previous snapshot pointer
-            prev = fname
-
-            # Keep only the last 10 snapshots
-            trim_snapshots_keep_last_10()
-
-            # -------- Optional interactive baseline update (unchanged) --------
+                log(f"No drift detected between {compare_target} and {new_path}")
+        elif diff and (diff["changes"] or diff["account_mismatch"]):
+            log(f"Drift detected between {compare_target} and {new_path}:")
+            log("--- compare stdout begin ---")
+            for line in report.splitlines():
+                log("  " + line)
+            log("--- compare stdout end ---")
+            cid = await asyncio.to_thread(record_drift, compare_target, new_path, diff, name, new_snap)
+            if correlate:
+                self._spawn(self.enrich(diff, old_snap, new_snap, cid, name))
+        elif diff is not None:
+            log(f"No drift detected between {compare_target} and {new_path}")
+
+        # History / export run after compare, like enrichment, so they delay neither it nor the next collection
+        self._spawn(self.archive(snapshot, fname, name))
+        # Keep only the last 10 snapshots
+        await asyncio.to_thread(trim_snapshots_keep_last_10, directory)
+
+    async def archive(self, snapshot, fname: str, account: str = "default"):
+        with metrics.timer(metrics.CYCLE_PHASE_SECONDS, phase="archive", account=account):
+            await asyncio.to_thread(tracing.call, run_archive, snapshot, fname, account)
+
+    async def enrich(self, diff, old_snap, new_snap, comparison_id: Optional[int] = None, account: str = "default"):
+        """CloudTrail enrichment: only the drifted resources and the API calls that can cause each change."""
+        with metrics.timer(metrics.CYCLE_PHASE_SECONDS, phase="enrich", account=account):
+            await self._enrich(diff, old_snap, new_snap, comparison_id)
+
+    async def _enrich(self, diff, old_snap, new_snap, comparison_id):
+        try:
+            start_t, end_t = capture_window(old_snap, new_snap)
+            tgts = targets(diff["changes"])
+            if not tgts:
+                return
+            preview = ", ".join(sorted(tgts)[:10])
+            log(f"Searching CloudTrail for changes to: {preview}...")
+            events = await asyncio.to_thread(correlate, diff["changes"], start_t, end_t)
+            if events and comparison_id is not None:
+                await asyncio.to_thread(record_enrichment, comparison_id, events)
+            if events:
+                log(f"Found {len(events)} CloudTrail event(s) related to the drift:")
+                for ev in events[:10]:
+                    log(f"  - {format_event(ev)}", event="cloudtrail", event_id=ev.get("eventID"),
+                        event_name=ev.get("eventName"), resource=ev.get("resource"))
+            else:
+                log("No matching CloudTrail events found in the capture window")
+        except Exception as e:
+            log(f"CloudTrail lookup failed: {e}")
+
+    async def _guarded(self, profile: Optional[str]):
+        name = profile or "default"
+        async with self.locks[profile]:
+            if self.owned is not None and name not in self.owned:
+                return
+            loop = asyncio.get_running_loop()
+            t0 = loop.time()
+            with metrics.timer(metrics.CYCLE_SECONDS, account=name), self.tracer.cycle(name):
+                await self.cycle(profile)
+            # Cost sample for lease balancing; written by the coordinator
+            self.costs[name] = loop.time() - t0
+
+    async def coordinate(self):
+        """
+        Lease upkeep, every TTL/3: in worker mode rebalance account leases by
+        observed cycle cost; otherwise keep holding the single-monitor lease.
+        """
+        names = [p or "default" for p in self.profiles]
+        while True:
             try:
-                if sys.stdin.isatty():
-                    print(f"Update '{BASELINE_FILE}' to '{fname}'? [y/N]: ", end='', flush=True)
-                    rlist, _, _ = select.select([sys.stdin], [], [], SLEEP_SECONDS)
-                    if rlist:
-                        resp = sys.stdin.readline().strip().lower()
-                        if resp in ("y", "yes"):
-                            try:
-                                with open(fname, 'r', encoding='utf-8') as fnew:
-                                    new_snap = json.load(fnew)
-
-                                baseline = {}
-                                if os.path.exists(BASELINE_FILE):
-                                    with open(BASELINE_FILE, 'r', encoding='utf-8') as fb:
-                                        try:
-                                            baseline = json.load(fb)
-                                        except Exception:
-                                            baseline = {}
-
-                                avail = sorted(list(new_snap.keys()))
-                                print("\nAvailable categories in the new snapshot:")
-                                for k in avail:
-                                    print(f"  - {k}")
-                                print("Enter comma-separated categories to copy, or 'all' to replace the baseline.")
-                                print(f"Waiting up to {SLEEP_SECONDS}s for selection: ", end='', flush=True)
-                                rlist2, _, _ = select.select([sys.stdin], [], [], SLEEP_SECONDS)
-                                if not rlist2:
-                                    log(f"No category selection within {SLEEP_SECONDS}s; baseline unchanged")
-                                else:
-                                    cats = sys.stdin.readline().strip()
-                                    if not cats:
-                                        log("Empty category selection; baseline unchanged")
-                                    else:
-                                        if cats.strip().lower() == 'all':
-                                            with open(BASELINE_FILE, 'w', encoding='utf-8') as fbw:
-                                                json.dump(new_snap, fbw, indent=2, sort_keys=True)
-                                            log(f"Replaced entire baseline with snapshot: {fname}")
-                                        else:
-                                            selected = [c.strip() for c in cats.split(',') if c.strip()]
-                                            updated = []
-                                            for c in selected:
-                                                if c in new_snap:
-                                                    baseline[c] = new_snap[c]
-                                                    updated.append(c)
-                                                else:
-                                                    log(f"Category not found in snapshot: {c}")
-                                            if updated:
-                                                with open(BASELINE_FILE, 'w', encoding='utf-8') as fbw:
-                                                    json.dump(baseline, fbw, indent=2, sort_keys=True)
-                                                log(f"Updated baseline categories: {', '.join(updated)} from {fname}")
-                                            else:
-                                                log("No valid categories selected; baseline unchanged")
-                            except Exception as e:
-                                log(f"Failed to update baseline: {e}")
-                        else:
-                            log("Baseline unchanged by user choice")
-                    else:
-                        log(f"No response within {SLEEP_SECONDS}s; baseline unchanged")
-                else:
-                    # Non-interactive: normal sleep between cycles
-                    time.sleep(SLEEP_SECONDS)
+                if self.worker:
+                    costs, self.costs = self.costs, {}
+                    for a, secs in costs.items():
+                        await asyncio.to_thread(self.leases.record_cost, a, secs)
+                    owned = set(await asyncio.to_thread(self.leases.rebalance, names))
+                    for a in sorted(owned - self.owned):
+                        log(f"[{a}] lease acquired by {self.leases.worker_id}", event="lease", account=a, action="acquired")
+                    for a in sorted(self.owned - owned):
+                        log(f"[{a}] lease released by {self.leases.worker_id}", event="lease", account=a, action="released")
+                    self.owned = owned
+                elif not await asyncio.to_thread(self.leases.acquire, SINGLETON):
+                    log("Lost the single-monitor lease to another process; stopping")
+                    self.stop.set()
             except Exception as e:
-                log(f"Error during baseline update prompt: {e}")
-                time.sleep(SLEEP_SECONDS)
+                log(f"Lease update failed: {e}")
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=self.leases.ttl / 3)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def schedule(self, profile: Optional[str]):
+        """Fire cycles at start + k*interval (+/- jitter), skipping ticks while the previous cycle runs."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while not self.stop.is_set():
+            if self.owned is not None and (profile or "default") not in self.owned:
+                pass
+            elif self.locks[profile].locked():
+                log(f"[{profile or 'default'}] previous cycle still running; skipping tick")
+                metrics.CYCLES_SKIPPED.inc(account=profile or "default")
+            else:
+                self._spawn(self._guarded(profile))
+            next_tick += self.interval
+            delay = max(0.0, next_tick + random.uniform(-self.jitter, self.jitter) - loop.time())
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self):
+        self._setup()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop.set)
+            except (NotImplementedError, RuntimeError):
+                # Windows: no loop signal handlers
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(self.stop.set))
+
+        if self.worker:
+            self.owned = set(await asyncio.to_thread(self.leases.rebalance, [p or "default" for p in self.profiles]))
+            log(f"Worker {self.leases.worker_id} starts with {len(self.owned)} account(s): "
+                f"{', '.join(sorted(self.owned)[:10])}")
+        schedulers = [asyncio.ensure_future(self.schedule(p)) for p in self.profiles]
+        if self.leases:
+            schedulers.append(asyncio.ensure_future(self.coordinate()))
+        await self.stop.wait()
+        log("Stopping realtime monitor; waiting for in-flight cycles")
+        await asyncio.gather(*schedulers, return_exceptions=True)
+        if self.tasks:
+            _done, pending = await asyncio.wait(set(self.tasks), timeout=SHUTDOWN_GRACE_SECONDS)
+            for t in pending:
+                t.cancel()
+        if self.leases:
+            # Hand our accounts (or the singleton) straight to the other workers
+            await asyncio.to_thread(self.leases.release_all)
+
+    async def run_once(self):
+        self._setup()
+        await asyncio.gather(*(self._guarded(p) for p in self.profiles))
+        if self.tasks:
+            await asyncio.wait(set(self.tasks))
+
 
+def main():
+    ap = argparse.ArgumentParser(description="Realtime drift monitor")
+    ap.add_argument("--interval", type=float, default=SLEEP_SECONDS, help="seconds between cycle starts")
+    ap.add_argument("--jitter", type=float, default=JITTER_SECONDS, help="random +/- offset per tick")
+    ap.add_argument("--account", action="append", dest="accounts", metavar="PROFILE",
+                    help="AWS profile to monitor (repeatable; default credentials if omitted)")
+    ap.add_argument("--accounts-file", help="file with one AWS profile per line (added to --account)")
+    ap.add_argument("--once", action="store_true", help="run a single cycle per account and exit")
+    ap.add_argument("--worker", action="store_true",
+                    help="share the accounts with other --worker processes via leases in the drift DB")
+    ap.add_argument("--trace", action="store_true",
+                    help=f"write a Chrome trace (JSON) per cycle to {tracing.TRACE_DIR}/")
+    ap.add_argument("--profile-every", type=int, default=0, metavar="N",
+                    help=f"run every Nth cycle under cProfile and dump a .pstats file to {tracing.TRACE_DIR}/")
+    ap.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                    help="serve Prometheus metrics on 127.0.0.1:PORT/metrics (0 disables; "
+                         "give each worker its own port)")
+    args = ap.parse_args()
+    if args.accounts_file:
+        with open(args.accounts_file, "r", encoding="utf-8") as f:
+            args.accounts = (args.accounts or []) + [
+                ln.strip() for ln in f if ln.strip() and not ln.lstrip().startswith("#")]
+
+    leases = None
+    if not args.once:
+        leases = LeaseManager()
+        if not args.worker and not leases.acquire(SINGLETON):
+            print(f"Another realtime monitor is already running ({(holder() or {}).get('owner')}); exiting.")
+            sys.exit(1)
+
+    log(f"Starting realtime monitor (every {args.interval:g}s)")
+    # CloudTrail lookups (correlate / event_store) go through the default session
+    metrics.instrument_default_session()
+    if args.metrics_port:
+        try:
+            metrics.start_http_server(args.metrics_port)
+            log(f"Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+        except OSError as e:
+            log(f"Metrics endpoint disabled: {e}")
+    for p in args.accounts or [None]:
+        d = account_dir(p)
+        prev = newest_snapshot_name(d)
+        if prev:
+            log(f"Using existing snapshot as previous: {prev}")
+        baseline = os.path.normpath(os.path.join(d, BASELINE_FILE))
+        if os.path.exists(baseline):
+            log(f"Found canonical baseline: {baseline}")
+
+    monitor = Monitor(args.accounts, interval=args.interval, jitter=args.jitter,
+                      tracer=tracing.CycleTracer(args.trace, args.profile_every),
+                      leases=leases, worker=args.worker and not args.once)
+    if monitor.worker:
+        log(f"Worker {leases.worker_id}: sharing {len(monitor.profiles)} account(s) via leases")
+    if monitor.tracer.enabled:
+        log(f"Tracing enabled (trace={args.trace}, profile every {args.profile_every or '-'} cycle(s)); "
+            f"output in {tracing.TRACE_DIR}/")
+    for p in monitor.profiles:
+        monitor.prev[p] = newest_snapshot_name(account_dir(p))
+    try:
+        asyncio.run(monitor.run_once() if args.once else monitor.run())
     except KeyboardInterrupt:
-        log("Realtime monitor stopped by user")
+        pass
+    log("Realtime monitor stopped")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Per-resource change history.
+
+Every snapshot is folded into an index as it is captured: for each resource
+(IAM user name, S3 bucket name, security group id) we keep the hash of its
+current record, and append a history row whenever that hash changes - with
+the top-level fields that changed. Snapshots are rotated away after a few
+cycles; the history is not.
+
+A resource's timeline is one indexed lookup, joined with the CloudTrail
+events that were correlated with the comparison of the same snapshot:
+
+  python resource_history.py index [--dir accounts/prod --account prod]
+  python resource_history.py show sg-05d8840964f1070c1 [--account prod] [--json]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from db import connect
+from drift_store import SCHEMA as STORE_SCHEMA
+
+# ----------------- CONFIG -----------------
+SNAP_GLOBS = ("baseline_*.json", "snapshot_*.json")
+# section -> (list key inside the snapshot section, id field of each record)
+RECORDS = {
+    "iam": ("Users", "UserName"),
+    "s3": ("Buckets", "Name"),
+    "ec2": ("SecurityGroups", "GroupId"),
+}
+# ------------------------------------------
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history_snapshots (
+    account     TEXT NOT NULL,
+    snapshot    TEXT NOT NULL,
+    captured_at TEXT,
+    indexed_at  REAL NOT NULL,
+    PRIMARY KEY (account, snapshot)
+);
+CREATE TABLE IF NOT EXISTS resource_state (
+    account  TEXT NOT NULL,
+    section  TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    hash     TEXT NOT NULL,
+    record   TEXT NOT NULL,
+    PRIMARY KEY (account, section, resource)
+);
+CREATE TABLE IF NOT EXISTS resource_history (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    account     TEXT NOT NULL,
+    section     TEXT NOT NULL,
+    resource    TEXT NOT NULL,
+    snapshot    TEXT NOT NULL,
+    captured_at TEXT,
+    kind        TEXT NOT NULL,
+    hash        TEXT,
+    fields      TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_resource_history_resource ON resource_history(resource, account, id);
+"""
+
+
+def _canonical(record: Any) -> str:
+    return json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def records(snapshot: Dict[str, Any]) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+    """(section, resource id, record) for every tracked resource in a snapshot."""
+    for section, (key, id_field) in RECORDS.items():
+        for rec in (snapshot.get(section) or {}).get(key, []):
+            if rec.get(id_field):
+                yield section, rec[id_field], rec
+
+
+def changed_fields(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    return sorted(k for k in set(old) | set(new) if _canonical(old.get(k)) != _canonical(new.get(k)))
+
+
+class HistoryIndex:
+    def __init__(self, path=None):
+        self.conn = connect(path)
+        self.conn.executescript(STORE_SCHEMA)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def latest_captured(self, account: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT MAX(captured_at) FROM history_snapshots WHERE account = ?", (account,)).fetchone()
+        return row[0]
+
+    def add(self, snapshot: Dict[str, Any], name: str, account: str = "default") -> Optional[int]:
+        """
+        Fold one snapshot into the index; returns the number of history rows
+        written, or None if it was already indexed or is older than the newest
+        indexed snapshot for the account (history only moves forward).
+        """
+        captured = (snapshot.get("meta") or {}).get("captured_at_utc")
+        if self.conn.execute("SELECT 1 FROM history_snapshots WHERE account = ? AND snapshot = ?",
+                             (account, name)).fetchone():
+            return None
+        newest = self.latest_captured(account)
+        if captured and newest and captured < newest:
+            return None
+
+        # Hashes only: the stored record is read back just for resources that changed
+        state = {(r["section"], r["resource"]): r["hash"] for r in self.conn.execute(
+            "SELECT section, resource, hash FROM resource_state WHERE account = ?", (account,))}
+        rows, upserts, seen = [], [], set()
+        for section, rid, rec in records(snapshot):
+            key = (section, rid)
+            seen.add(key)
+            text = _canonical(rec)
+            digest = hashlib.sha256(text.encode()).hexdigest()
+            prev = state.get(key)
+            if prev == digest:
+                continue
+            if prev:
+                old = self.conn.execute(
+                    "SELECT record FROM resource_state WHERE account = ? AND section = ? AND resource = ?",
+                    (account, section, rid)).fetchone()[0]
+                kind, fields = "modified", changed_fields(json.loads(old), rec)
+            else:
+                kind, fields = "added", []
+            rows.append((account, section, rid, name, captured, kind, digest, json.dumps(fields)))
+            upserts.append((account, section, rid, digest, text))
+        gone = [k for k in state if k not in seen]
+        rows += [(account, s, r, name, captured, "removed", None, "[]") for s, r in gone]
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO resource_history(account, section, resource, snapshot, captured_at, kind, hash, fields) "
+                "VALUES(?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.conn.executemany(
+                "INSERT INTO resource_state(account, section, resource, hash, record) VALUES(?, ?, ?, ?, ?) "
+                "ON CONFLICT(account, section, resource) DO UPDATE SET hash = excluded.hash, record = excluded.record",
+                upserts)
+            self.conn.executemany(
+                "DELETE FROM resource_state WHERE account = ? AND section = ? AND resource = ?",
+                [(account, s, r) for s, r in gone])
+            self.conn.execute(
+                "INSERT INTO history_snapshots(account, snapshot, captured_at, indexed_at) VALUES(?, ?, ?, ?)",
+                (account, name, captured, time.time()))
+        return len(rows)
+
+    def index_dir(self, directory: str = ".", account: str = "default") -> Dict[str, Optional[int]]:
+        """Index every snapshot file in a directory not seen yet, oldest first (by the timestamp in the name)."""
+        paths = [p for pattern in SNAP_GLOBS for p in glob.glob(os.path.join(directory, pattern))]
+        done = {}
+        for path in sorted(paths, key=lambda p: os.path.basename(p).split("_", 1)[-1]):
+            with open(path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            done[os.path.basename(path)] = self.add(snap, os.path.basename(path), account)
+        return done
+
+    def timeline(self, resource: str, account: str = None) -> List[Dict[str, Any]]:
+        """
+        History rows for a resource, oldest first, each with "events": the
+        CloudTrail events correlated with comparisons of that snapshot.
+        """
+        sql = (
+            "SELECT h.*, e.event_id, e.event_time, e.event_name, e.principal, e.source_ip "
+            "FROM resource_history h "
+            "LEFT JOIN comparisons c ON c.snapshot = h.snapshot AND c.account = h.account "
+            "LEFT JOIN enrichments e ON e.comparison_id = c.id AND e.resource = h.resource "
+            "WHERE h.resource = ?"
+        )
+        args: List[Any] = [resource]
+        if account:
+            sql += " AND h.account = ?"
+            args.append(account)
+        out: Dict[int, Dict[str, Any]] = {}
+        seen = set()
+        for r in self.conn.execute(sql + " ORDER BY h.id", args):
+            entry = out.get(r["id"])
+            if entry is None:
+                entry = out[r["id"]] = {
+                    k: r[k] for k in ("id", "account", "section", "resource", "snapshot", "captured_at", "kind", "hash")
+                }
+                entry["fields"] = json.loads(r["fields"] or "[]")
+                entry["events"] = []
+            # A snapshot compared more than once (monitor + manual) joins the same event twice
+            key = (r["id"], r["event_id"] or (r["event_time"], r["event_name"]))
+            if r["event_name"] and key not in seen:
+                seen.add(key)
+                entry["events"].append({k: r[k] for k in ("event_id", "event_time", "event_name", "principal", "source_ip")})
+        return list(out.values())
+
+
+def index_snapshot(snapshot: Dict[str, Any], name: str, account: str = "default") -> Optional[int]:
+    """Fold a freshly captured snapshot into the shared index (called by the monitor and the app)."""
+    index = HistoryIndex()
+    try:
+        return index.add(snapshot, name, account)
+    finally:
+        index.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-resource change history")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("index", help="index snapshot files not seen yet")
+    p.add_argument("--dir", default=".")
+    p.add_argument("--account", default="default")
+    p = sub.add_parser("show", help="print a resource's timeline")
+    p.add_argument("resource")
+    p.add_argument("--account")
+    p.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    index = HistoryIndex()
+    try:
+        if args.cmd == "index":
+            for name, n in index.index_dir(args.dir, args.account).items():
+                print(f"{name}: {'skipped' if n is None else f'{n} change(s)'}")
+        elif args.cmd == "show":
+            rows = index.timeline(args.resource, args.account)
+            if args.json:
+                print(json.dumps(rows, indent=2))
+                return
+            if not rows:
+                print(f"No history for {args.resource}")
+            for r in rows:
+                fields = f" ({', '.join(r['fields'])})" if r["fields"] else ""
+                print(f"{r['captured_at'] or '?':<22} {r['account']:<12} {r['kind']:<9}{fields}  [{r['snapshot']}]")
+                for e in r["events"]:
+                    print(f"    {e['event_time']} {e['event_name']} by {e['principal']} from {e['source_ip']}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Sidecar offset index for snapshot files, and lazy section-addressable loading.
+
+Most consumers need one section of a snapshot (the S3 panel, an SG-only
+compare) or a single resource (the API's ?resource=), yet json.load parses
+the whole file. Next to each snapshot we keep `<name>.idx`, recording:
+
+  - byte spans of every top-level section ("iam", "s3", "meta", ...)
+  - byte spans of every record in the tracked lists (resource_history.RECORDS:
+    iam.Users by UserName, s3.Buckets by Name, ec2.SecurityGroups by GroupId),
+    in file order
+
+so `LazySnapshot` can seek and parse just the section, record, or page of
+records a request touches. The snapshot file itself is unchanged (plain
+JSON, any formatting). An index is stamped with the file's size and mtime;
+if the file changed (upload, promote) it is rebuilt on first use, with
+one full parse.
+
+Usage:
+  python snapshot_index.py build [baseline_*.json ...]
+  python snapshot_index.py get Baseline.json s3 [--resource my-bucket]
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from resource_history import RECORDS, SNAP_GLOBS
+
+# ----------------- CONFIG -----------------
+INDEX_SUFFIX = ".idx"
+INDEX_KEEP = 16                      # parsed indexes kept in memory (LRU by path + size + mtime)
+INDEX_VERSION = 1
+# ------------------------------------------
+
+_WS = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+_INDEXES: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+_INDEXES_LOCK = threading.Lock()
+
+
+def index_path(path: str) -> str:
+    return str(path) + INDEX_SUFFIX
+
+
+def _skip(text: str, pos: int) -> int:
+    return _WS.match(text, pos).end()
+
+
+def _members(text: str, pos: int, on_value) -> int:
+    """
+    Walk the object starting at text[pos] == "{", calling on_value(key, start)
+    for each member; it returns the end of the value it consumed. Returns
+    the position just past the closing brace.
+    """
+    if text[pos] != "{":
+        raise ValueError(f"expected an object at offset {pos}")
+    pos = _skip(text, pos + 1)
+    if text[pos] == "}":
+        return pos + 1
+    while True:
+        key, pos = _DECODER.raw_decode(text, pos)
+        pos = _skip(text, pos)
+        if text[pos] != ":":
+            raise ValueError(f"expected ':' at offset {pos}")
+        pos = _skip(text, on_value(key, _skip(text, pos + 1)))
+        if text[pos] == "}":
+            return pos + 1
+        if text[pos] != ",":
+            raise ValueError(f"expected ',' or '}}' at offset {pos}")
+        pos = _skip(text, pos + 1)
+
+
+def _elements(text: str, pos: int, spans: List[Tuple[Any, int, int]]) -> int:
+    """Walk the array at text[pos] == "[", appending (value, start, end) for each element."""
+    if text[pos] != "[":
+        return _DECODER.raw_decode(text, pos)[1]
+    pos = _skip(text, pos + 1)
+    if text[pos] == "]":
+        return pos + 1
+    while True:
+        value, end = _DECODER.raw_decode(text, pos)
+        spans.append((value, pos, end))
+        pos = _skip(text, end)
+        if text[pos] == "]":
+            return pos + 1
+        if text[pos] != ",":
+            raise ValueError(f"expected ',' or ']' at offset {pos}")
+        pos = _skip(text, pos + 1)
+
+
+def _byte_offsets(text: str, offsets: List[int]) -> Dict[int, int]:
+    """Character offsets -> byte offsets in the UTF-8 encoding of text (identity for ASCII)."""
+    if text.isascii():
+        return {o: o for o in offsets}
+    out, char_at, byte_at = {}, 0, 0
+    for o in sorted(set(offsets)):
+        byte_at += len(text[char_at:o].encode("utf-8"))
+        char_at = o
+        out[o] = byte_at
+    return out
+
+
+def build_index(text: str) -> Dict[str, Any]:
+    """Offsets of the sections and tracked records of a serialized snapshot (one full parse)."""
+    sections: Dict[str, Tuple[int, int]] = {}
+    record_spans: Dict[str, List[Tuple[Any, int, int]]] = {}
+
+    def section(name, start):
+        if name not in RECORDS or text[start] != "{":
+            end = _DECODER.raw_decode(text, start)[1]
+        else:
+            key = RECORDS[name][0]
+            spans = record_spans[name] = []
+            end = _members(text, start, lambda k, s: _elements(text, s, spans) if k == key
+                           else _DECODER.raw_decode(text, s)[1])
+        sections[name] = (start, end)
+        return end
+
+    _members(text, _skip(text, 0), section)
+    to_bytes = _byte_offsets(text, [o for span in sections.values() for o in span]
+                             + [o for spans in record_spans.values() for _, s, e in spans for o in (s, e)])
+    records = {}
+    for name, spans in record_spans.items():
+        id_field = RECORDS[name][1]
+        records[name] = [[rec.get(id_field) if isinstance(rec, dict) else None, to_bytes[s], to_bytes[e]]
+                         for rec, s, e in spans]
+    return {
+        "version": INDEX_VERSION,
+        "sections": {name: [to_bytes[s], to_bytes[e]] for name, (s, e) in sections.items()},
+        "records": records,
+    }
+
+
+def write_index(path: str, text: str = None) -> Dict[str, Any]:
+    """(Re)build the sidecar for a snapshot file; pass text when the caller just serialized it."""
+    if text is None:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    index = build_index(text)
+    st = os.stat(path)
+    index.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+    tmp = index_path(path) + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp, index_path(path))
+    except OSError:
+        pass                                   # read-only directory: still usable from memory
+    return index
+
+
+def remove_index(path: str):
+    try:
+        os.remove(index_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def load_index(path: str) -> Dict[str, Any]:
+    """The index for a snapshot file, rebuilt if missing or stale."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _INDEXES_LOCK:
+        if key in _INDEXES:
+            _INDEXES.move_to_end(key)
+            return _INDEXES[key]
+    index = None
+    try:
+        with open(index_path(path), "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        pass
+    if not index or index.get("version") != INDEX_VERSION or \
+            (index.get("size"), index.get("mtime_ns")) != (st.st_size, st.st_mtime_ns):
+        index = write_index(path)
+    with _INDEXES_LOCK:
+        _INDEXES[key] = index
+        while len(_INDEXES) > INDEX_KEEP:
+            _INDEXES.popitem(last=False)
+    return index
+
+
+class _Stale(Exception):
+    pass
+
+
+class LazySnapshot(Mapping):
+    """
+    Read-only mapping over a snapshot file: a section is parsed on first
+    access and kept; record()/records() parse only the records asked for.
+    Passes anywhere a loaded snapshot dict is read (snapshot.get("s3", {})).
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.index = load_index(self.path)
+        self._sections: Dict[str, Any] = {}
+        self._ids: Dict[str, Dict[Any, Tuple[int, int]]] = {}
+
+    def _read(self, start: int, end: int) -> bytes:
+        with open(self.path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if (st.st_size, st.st_mtime_ns) != (self.index["size"], self.index["mtime_ns"]):
+                # Replaced under us (upload / promote): re-index, the caller retries once
+                self.index = load_index(self.path)
+                self._sections.clear()
+                self._ids.clear()
+                raise _Stale()
+            f.seek(start)
+            return f.read(end - start)
+
+    def _retry(self, fn):
+        try:
+            return fn()
+        except _Stale:
+            return fn()
+
+    def __getitem__(self, section: str) -> Any:
+        if section not in self._sections:
+            if section not in self.index["sections"]:
+                raise KeyError(section)
+            self._sections[section] = self._retry(lambda: json.loads(self._read(*self.index["sections"][section])))
+        return self._sections[section]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index["sections"])
+
+    def __len__(self) -> int:
+        return len(self.index["sections"])
+
+    def count(self, section: str) -> int:
+        """Number of tracked records in a section, without parsing any of them."""
+        return len(self.index["records"].get(section, []))
+
+    def record(self, section: str, resource: str) -> Optional[Dict[str, Any]]:
+        """One tracked record by id (parsing only that record), or None."""
+        if section in self._sections:
+            key, id_field = RECORDS[section]
+            return next((r for r in self._sections[section].get(key, []) if r.get(id_field) == resource), None)
+        def read():
+            # Inside the retry: a stale read re-indexes and clears _ids, so the span is looked up again
+            if section not in self._ids:
+                ids = self._ids[section] = {}
+                for rid, s, e in self.index["records"].get(section, []):
+                    ids.setdefault(rid, (s, e))
+            span = self._ids[section].get(resource)
+            return json.loads(self._read(*span)) if span else None
+        return self._retry(read)
+
+    def records(self, section: str, start: int = 0, stop: int = None) -> List[Dict[str, Any]]:
+        """Tracked records [start:stop] in file order, parsing only those."""
+        if section in self._sections:
+            return self._sections[section].get(RECORDS[section][0], [])[start:stop]
+        def read():
+            spans = self.index["records"].get(section, [])[start:stop]
+            if not spans:
+                return []
+            # One read covering the page, then parse each record out of it
+            lo = spans[0][1]
+            buf = self._read(lo, spans[-1][2])
+            return [json.loads(buf[s - lo:e - lo]) for _, s, e in spans]
+        return self._retry(read)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: self[k] for k in self}
+
+
+def open_snapshot(path: str) -> LazySnapshot:
+    return LazySnapshot(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Snapshot sidecar offset index")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("build", help="(re)build sidecars (default: every snapshot in the current dir)")
+    p.add_argument("files", nargs="*")
+    p = sub.add_parser("get", help="print one section or one resource without loading the rest")
+    p.add_argument("file")
+    p.add_argument("section")
+    p.add_argument("--resource")
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        files = args.files or sorted({p for pattern in SNAP_GLOBS + ("Baseline.json",) for p in glob.glob(pattern)})
+        for path in files:
+            index = write_index(path)
+            n = sum(len(v) for v in index["records"].values())
+            print(f"{path}: {len(index['sections'])} section(s), {n} record(s)")
+    elif args.cmd == "get":
+        snap = open_snapshot(args.file)
+        value = snap.record(args.section, args.resource) if args.resource else snap.get(args.section)
+        if value is None:
+            raise SystemExit(f"not found: {args.section}{'/' + args.resource if args.resource else ''}")
+        print(json.dumps(value, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Live events for the dashboard over Server-Sent Events.
+
+One producer thread per app process polls the drift store, the snapshot
+directory and the monitor lease, and publishes what changed into a shared
+`Broadcaster`. The broadcaster keeps a ring buffer of recent events; every
+connected client just follows that buffer, so adding clients adds no polling.
+
+Event ids increase monotonically (and start at the current time in ms, so they
+keep increasing across app restarts). A client that reconnects with
+Last-Event-ID gets everything after that id that is still in the ring, or a
+"reset" event if it has fallen too far behind.
+
+Event types: drift, snapshot, monitor, reset.
+"""
+import json
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from drift_store import DriftStore
+from leases import holder, live_workers
+
+# ----------------- CONFIG -----------------
+RING_SIZE = 1000                      # events kept for Last-Event-ID resume
+POLL_SECONDS = 1.0                    # producer poll period
+KEEPALIVE_SECONDS = 15                # comment line sent to idle clients
+SNAP_GLOBS = ("baseline_*.json", "snapshot_*.json")
+# ------------------------------------------
+
+
+class Broadcaster:
+    """Fan-out of published events to any number of subscribers via a shared ring buffer."""
+
+    def __init__(self, size: int = RING_SIZE):
+        self.ring: deque = deque(maxlen=size)
+        self.cond = threading.Condition()
+        self.last_id = int(time.time() * 1000)
+
+    def publish(self, event: str, data: Any) -> int:
+        with self.cond:
+            self.last_id += 1
+            self.ring.append((self.last_id, event, json.dumps(data, default=str)))
+            self.cond.notify_all()
+            return self.last_id
+
+    def _since(self, last_id: int):
+        """Events after last_id still in the ring; None if some were already dropped."""
+        floor = self.ring[0][0] - 1 if self.ring else self.last_id
+        if last_id < floor:
+            return None
+        return [e for e in self.ring if e[0] > last_id]
+
+    def subscribe(self, last_id: Optional[int] = None, keepalive: float = KEEPALIVE_SECONDS,
+                  initial: Optional[Tuple[str, Any]] = None) -> Iterator[str]:
+        """
+        Yield SSE-formatted messages forever, starting after last_id (default: only new events).
+        initial (event, data) is sent first, without an id: current state the client
+        needs even though the event that announced it is older than last_id.
+        """
+        with self.cond:
+            if last_id is None or last_id > self.last_id:
+                last_id = self.last_id
+        yield "retry: 3000\n\n"
+        if initial:
+            yield f"event: {initial[0]}\ndata: {json.dumps(initial[1], default=str)}\n\n"
+        while True:
+            with self.cond:
+                pending = self._since(last_id)
+                if pending == []:
+                    self.cond.wait(timeout=keepalive)
+                    pending = self._since(last_id)
+            if pending is None:
+                # Fell behind the ring: tell the client to reload, then continue live
+                with self.cond:
+                    last_id = self.last_id
+                yield f"id: {last_id}\nevent: reset\ndata: {{}}\n\n"
+                continue
+            if not pending:
+                yield ": keepalive\n\n"
+                continue
+            for eid, event, data in pending:
+                yield f"id: {eid}\nevent: {event}\ndata: {data}\n\n"
+                last_id = eid
+
+
+class Producer:
+    """Polls the shared state and publishes changes; started once per process on first use."""
+
+    def __init__(self, broadcaster: Broadcaster, snap_dir: Path, interval: float = POLL_SECONDS):
+        self.broadcaster = broadcaster
+        self.snap_dir = snap_dir
+        self.interval = interval
+        self.item_id: Optional[int] = None
+        self.snapshots: Optional[Set[str]] = None
+        self.monitor: Optional[Dict[str, Any]] = None
+        self.thread: Optional[threading.Thread] = None
+        self.lock = threading.Lock()
+
+    def ensure_started(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="sse-producer", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        store = DriftStore()
+        try:
+            while True:
+                try:
+                    self.poll(store)
+                except Exception as e:
+                    print(f"SSE producer poll failed: {e}")
+                time.sleep(self.interval)
+        finally:
+            store.close()
+
+    def poll(self, store: DriftStore):
+        b = self.broadcaster
+        # New drift items
+        if self.item_id is None:
+            latest = store.items(limit=1)
+            self.item_id = latest[0]["id"] if latest else 0
+        for it in store.items(after=self.item_id, limit=500):
+            b.publish("drift", {k: it[k] for k in ("id", "comparison_id", "created_at", "account", "snapshot",
+                                                    "section", "resource", "field", "kind", "transition", "text")})
+            self.item_id = it["id"]
+
+        # Newly captured snapshots
+        names = {p.name for g in SNAP_GLOBS for p in self.snap_dir.glob(g)}
+        if self.snapshots is not None:
+            for name in sorted(names - self.snapshots):
+                b.publish("snapshot", {"name": name})
+        self.snapshots = names
+
+        # Monitor up / down (single monitor lease or worker-mode processes)
+        held = holder()
+        workers = live_workers()
+        status = {
+            "running": bool(held or workers),
+            "owner": held and held["owner"],
+            "pid": held and held["pid"],
+            "workers": len(workers),
+        }
+        if status != self.monitor:
+            b.publish("monitor", status)
+            self.monitor = status
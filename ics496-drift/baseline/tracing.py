@@ -0,0 +1,219 @@
+"""
+Opt-in per-cycle tracing and profiling.
+
+`span(name, **args)` marks a timed region. With no trace active (the default)
+it returns a shared no-op context manager, so instrumented code pays one
+ContextVar lookup per span. The monitor activates a trace per cycle
+(`CycleTracer.cycle`); spans from the cycle's coroutine and from the worker
+threads it starts (asyncio.to_thread copies the context) are collected and
+written as a Chrome trace file (open in chrome://tracing or ui.perfetto.dev).
+
+Every Nth cycle can also be run under cProfile; blocking steps wrapped with
+`call()` are profiled in their worker thread and merged into one .pstats file:
+  python -m pstats traces/profile_default_<ts>.pstats
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+UTC = timezone.utc
+
+# ----------------- CONFIG -----------------
+TRACE_DIR = "traces"
+TRACE_KEEP = 50                       # trace / pstats files kept (oldest pruned)
+# ------------------------------------------
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("drift_trace", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "args", "t0")
+
+    def __init__(self, trace: "Trace", name: str, args: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, self.t0, time.perf_counter_ns(), self.args)
+        return False
+
+
+def span(name: str, **args):
+    """Timed region recorded into the active trace; a no-op when tracing is off."""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, args)
+
+
+class Trace:
+    """Spans (Chrome 'complete' events) and cProfile results for one cycle."""
+
+    def __init__(self, name: str, profile: bool = False):
+        self.name = name
+        self.profile = profile
+        self.t0 = time.perf_counter_ns()
+        self.events: List[Dict[str, Any]] = []
+        self.profiles: List[cProfile.Profile] = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def add(self, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]):
+        if self.closed:
+            # e.g. enrichment spawned by the cycle that outlives it
+            return
+        ev = {
+            "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": (start_ns - self.t0) / 1000, "dur": (end_ns - start_ns) / 1000,
+        }
+        if args:
+            ev["args"] = {k: str(v) for k, v in args.items()}
+        with self.lock:
+            self.events.append(ev)
+
+    def add_profile(self, prof: cProfile.Profile):
+        with self.lock:
+            self.profiles.append(prof)
+
+    def write(self, path: str):
+        threads = {ev["tid"] for ev in self.events}
+        meta = [{"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": f"cycle {self.name}"}}]
+        meta += [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": t,
+                  "args": {"name": "event loop" if t == threading.main_thread().ident else f"worker {t}"}}
+                 for t in threads]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": meta + self.events, "displayTimeUnit": "ms"}, f)
+
+    def dump_stats(self, path: str) -> bool:
+        if not self.profiles:
+            return False
+        stats = pstats.Stats(self.profiles[0])
+        for p in self.profiles[1:]:
+            stats.add(p)
+        stats.dump_stats(path)
+        return True
+
+
+def call(fn, *args, **kwargs):
+    """
+    Run a blocking step (in its worker thread) under the active trace: a span
+    named after fn, and a cProfile of the call when the cycle is being profiled.
+    """
+    trace = _current.get()
+    if trace is None:
+        return fn(*args, **kwargs)
+    with span(fn.__name__):
+        if not trace.profile:
+            return fn(*args, **kwargs)
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # Only one profiler may be active at a time (Python 3.12+); another account's cycle has it
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            prof.disable()
+            trace.add_profile(prof)
+
+
+def _api_start(context=None, **kwargs):
+    if context is not None and _current.get() is not None:
+        context["_trace_t0"] = time.perf_counter_ns()
+
+
+def _api_end(event_name=None, context=None, **kwargs):
+    trace = _current.get()
+    t0 = (context or {}).get("_trace_t0")
+    if trace is not None and t0 is not None:
+        # "after-call.s3.GetBucketPolicy" -> "s3.GetBucketPolicy"
+        trace.add(event_name.split(".", 1)[-1], t0, time.perf_counter_ns(), {})
+
+
+def instrument_session(session):
+    """Record every AWS API call made through this boto3 session as a span (when tracing)."""
+    events = session.events
+    events.register("before-call", _api_start, unique_id="drift-trace-before")
+    events.register("after-call", _api_end, unique_id="drift-trace-after")
+    events.register("after-call-error", _api_end, unique_id="drift-trace-after-error")
+    return session
+
+
+class CycleTracer:
+    """Decides per cycle whether to trace and/or profile, and writes the results."""
+
+    def __init__(self, trace: bool = False, profile_every: int = 0, directory: str = TRACE_DIR, keep: int = TRACE_KEEP):
+        self.trace = trace
+        self.profile_every = profile_every
+        self.directory = directory
+        self.keep = keep
+        self.count = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.trace or self.profile_every)
+
+    @contextmanager
+    def cycle(self, name: str):
+        self.count += 1
+        profile = bool(self.profile_every) and self.count % self.profile_every == 0
+        if not (self.trace or profile):
+            yield None
+            return
+        t = Trace(name, profile)
+        token = _current.set(t)
+        try:
+            with span("cycle", account=name):
+                yield t
+        finally:
+            _current.reset(token)
+            t.closed = True
+            self._write(t)
+
+    def _write(self, t: Trace):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(UTC).strftime("%Y-%m-%dT%H-%M-%S.%fZ")
+        safe = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in t.name)
+        if self.trace:
+            t.write(os.path.join(self.directory, f"trace_{safe}_{stamp}.json"))
+        if t.profile:
+            t.dump_stats(os.path.join(self.directory, f"profile_{safe}_{stamp}.pstats"))
+        self.prune()
+
+    def prune(self):
+        for prefix in ("trace_", "profile_"):
+            files = sorted(
+                (f for f in os.listdir(self.directory) if f.startswith(prefix)),
+                key=lambda f: os.path.getmtime(os.path.join(self.directory, f)),
+            )
+            for f in files[:-self.keep] if self.keep else []:
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except OSError:
+                    pass